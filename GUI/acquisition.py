@@ -0,0 +1,159 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import json
+from functools import partial
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal
+
+from scripts import thumbnails
+from GUI import workers
+
+SCAN_DELAY = 500 # ms, the rig writes a file in several steps
+MAX_RETRIES = 5
+
+class AcquisitionWatcher(QObject):
+    """Watch the data folder and the extrinsics file of a running acquisition
+    New calibrated images get their thumbnail in the background and are sent to the viewer
+    """
+
+    images_ready = Signal(object)
+
+    def __init__(self, directory : str, thumbnails_folder : str, thumbnail_size : tuple, extrinsics_file : str, known_extrinsics : dict):
+        super(AcquisitionWatcher, self).__init__()
+        self.directory = directory
+        self.thumbnails = thumbnails_folder
+        self.thumbnail_size = thumbnail_size
+        self.extrinsics_file = extrinsics_file
+
+        # image -> matrix already in the project
+        self.known = {image: known_extrinsics[image]["matrix"] for image in known_extrinsics}
+        # images with a thumbnail being created
+        self.pending = set()
+        # image -> number of failed thumbnails
+        self.failures = dict()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(SCAN_DELAY)
+        self.timer.timeout.connect(self.scan)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.addPath(self.directory)
+        if os.path.exists(self.extrinsics_file):
+            self.watcher.addPath(self.extrinsics_file)
+        self.watcher.directoryChanged.connect(self.schedule_scan)
+        self.watcher.fileChanged.connect(self.schedule_scan)
+
+        self.running = True
+        self.scan()
+
+    def schedule_scan(self, path=None):
+        """Delay the scan until the writes of the rig are done
+        """
+
+        if self.running:
+            self.timer.start()
+
+    def stop(self):
+        """Stop watching the folder, thumbnails being created are ignored
+        """
+
+        self.running = False
+        self.timer.stop()
+        self.watcher.removePaths(self.watcher.files() + self.watcher.directories())
+
+    def read_extrinsics(self):
+        """Read the extrinsics file
+
+        Returns:
+            dict: image -> {"matrix": ...}, None if the file is being written
+        """
+
+        if not os.path.exists(self.extrinsics_file):
+            return None
+        # files replaced by a rename are no longer watched
+        if self.extrinsics_file not in self.watcher.files():
+            self.watcher.addPath(self.extrinsics_file)
+        try:
+            with open(self.extrinsics_file, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError):
+            print(f"Extrinsics not readable yet : {self.extrinsics_file}")
+            return None
+
+    def scan(self):
+        """Compare the data folder and the extrinsics with what is already in the project
+        """
+
+        if not self.running:
+            return
+        extrinsics = self.read_extrinsics()
+        if extrinsics is None:
+            return
+        images_on_disk = set(os.listdir(self.directory))
+
+        updated = dict()
+        for image, values in extrinsics.items():
+            if image in self.pending or image not in images_on_disk or self.failures.get(image, 0) >= MAX_RETRIES:
+                continue
+            if image in self.known:
+                if self.known[image] != values["matrix"]:
+                    # Recalibrated image, its thumbnail already exists
+                    self.known[image] = values["matrix"]
+                    updated[image] = values["matrix"]
+                continue
+            self.pending.add(image)
+            worker = workers.Worker(thumbnails.make_thumbnail, self.directory, self.thumbnails, image, self.thumbnail_size)
+            worker.signals.finished.connect(partial(self.thumbnail_done, image, values["matrix"]))
+            worker.signals.error.connect(partial(self.thumbnail_failed, image))
+            workers.start(worker)
+
+        if len(updated) != 0:
+            self.images_ready.emit(updated)
+
+    def thumbnail_done(self, image, matrix, _):
+        self.pending.discard(image)
+        if not self.running:
+            return
+        self.known[image] = matrix
+        self.images_ready.emit({image: matrix})
+
+    def thumbnail_failed(self, image, _):
+        # The image is probably still being written, it will be retried on the next change
+        self.pending.discard(image)
+        self.failures[image] = self.failures.get(image, 0) + 1
+        if self.failures[image] >= MAX_RETRIES:
+            print(f"Thumbnail of {image} could not be created")
+            return
+        self.schedule_scan()
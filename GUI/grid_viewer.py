@@ -0,0 +1,219 @@
+# Sphaeroptica - 3D Viewer on calibrated pictures
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import math
+import numpy as np
+from PySide6.QtCore import Qt, Signal, QRect, QRectF, QPointF, QThreadPool
+from PySide6.QtGui import QImage, QPainter, QPen, QColor, QCloseEvent, QMouseEvent, QPaintEvent, QWheelEvent
+from PySide6.QtWidgets import QWidget, QLabel, QMainWindow, QGridLayout, QSizePolicy
+
+from scripts import helpers, reconstruction, image_cache
+from GUI import workers
+
+# number of images of the grid
+NBR_VIEWS = 9
+# images decoded at once by the grids
+DECODERS = 4
+# part of the image shown around a landmark (in pixel of the full image)
+FOCUS_SIZE = 1600
+
+_pool = None
+
+def get_pool() -> QThreadPool:
+    """Pool decoding the images of the grids, bounded so the other workers aren't starved
+    """
+
+    global _pool
+    if _pool is None:
+        _pool = QThreadPool()
+        _pool.setMaxThreadCount(DECODERS)
+    return _pool
+
+class QGridTile(QLabel):
+    """Image of the grid, decoded in the background
+    The wheel zooms around the mouse, a left click places the landmark
+    """
+
+    clicked = Signal(object)
+
+    def __init__(self, parent, image : str, size : tuple):
+        super(QGridTile, self).__init__(parent)
+        self.image_name = image
+        # size of the full image
+        self.full_size = size
+        self.image = None
+        self.reduction = image_cache.REDUCTION
+        # part of the full image shown
+        self.view = QRectF(0, 0, size[0], size[1])
+        self.pose = None
+        self.reprojection = None
+        self.color = QColor("blue")
+        self.setMinimumSize(150, 100)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+
+    def set_image(self, image : np.ndarray):
+        height, width, _ = image.shape
+        self.image = QImage(image.data, width, height, 3 * width, QImage.Format.Format_RGB888).copy()
+        self.update()
+
+    def focus(self, pose : helpers.Pose):
+        """Show the part of the image around a pose
+        """
+
+        width = FOCUS_SIZE
+        height = FOCUS_SIZE * self.full_size[1] / self.full_size[0]
+        self.view = QRectF(pose.x - width/2, pose.y - height/2, width, height)
+        self.update()
+
+    def get_target(self) -> QRectF:
+        # rectangle of the widget where the view is drawn (aspect ratio kept)
+        scale = min(self.width() / self.view.width(), self.height() / self.view.height())
+        width, height = self.view.width() * scale, self.view.height() * scale
+        return QRectF((self.width() - width) / 2, (self.height() - height) / 2, width, height)
+
+    def to_image(self, pos : QPointF) -> tuple:
+        target = self.get_target()
+        scale = self.view.width() / target.width()
+        return self.view.x() + (pos.x() - target.x()) * scale, self.view.y() + (pos.y() - target.y()) * scale
+
+    def to_widget(self, x : float, y : float) -> QPointF:
+        target = self.get_target()
+        scale = target.width() / self.view.width()
+        return QPointF(target.x() + (x - self.view.x()) * scale, target.y() + (y - self.view.y()) * scale)
+
+    def paintEvent(self, a0: QPaintEvent) -> None:
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("black"))
+        target = self.get_target()
+        if self.image is None:
+            painter.setPen(QColor("white"))
+            painter.drawText(target, Qt.AlignmentFlag.AlignCenter, "Loading...")
+        else:
+            source = QRectF(self.view.x() / self.reduction, self.view.y() / self.reduction, self.view.width() / self.reduction, self.view.height() / self.reduction)
+            painter.drawImage(target, self.image, source)
+        if self.reprojection is not None:
+            painter.setPen(QPen(self.color, 1))
+            painter.drawEllipse(self.to_widget(self.reprojection.x, self.reprojection.y), 8, 8)
+        if self.pose is not None:
+            painter.setPen(QPen(self.color, 5))
+            painter.drawPoint(self.to_widget(self.pose.x, self.pose.y))
+        painter.setPen(QColor("white"))
+        painter.drawText(QRectF(self.rect()).adjusted(4, 2, -4, -2), Qt.AlignmentFlag.AlignTop | Qt.AlignmentFlag.AlignLeft, self.image_name)
+        painter.end()
+
+    def wheelEvent(self, a0: QWheelEvent) -> None:
+        factor = 0.8 if a0.angleDelta().y() > 0 else 1.25
+        x, y = self.to_image(a0.position())
+        width = min(self.view.width() * factor, self.full_size[0])
+        height = width * self.full_size[1] / self.full_size[0]
+        # the point under the mouse doesn't move
+        self.view = QRectF(x - (x - self.view.x()) * width / self.view.width(), y - (y - self.view.y()) * height / self.view.height(), width, height)
+        self.update()
+
+    def mousePressEvent(self, ev: QMouseEvent) -> None:
+        if ev.button() != Qt.MouseButton.LeftButton:
+            return
+        x, y = self.to_image(ev.position())
+        if 0 <= x < self.full_size[0] and 0 <= y < self.full_size[1]:
+            self.pose = helpers.Pose(x, y)
+            self.update()
+            self.clicked.emit([self.image_name, self.pose])
+
+class QGridViewer(QMainWindow):
+    """Several images of a landmark at once, the landmark is placed on any of them by a click
+    and the reprojections are updated each time it is triangulated again
+    """
+
+    pose_placed = Signal(object)
+
+    def __init__(self, directory : str, images : list, cameras, size : tuple, landmark : dict, init_geometry : QRect = None):
+        """
+        Args:
+            directory (str): directory of the images
+            images (list): images of the grid
+            cameras (project.CameraSet): cameras of the project
+            size (tuple): width and height of the images whose camera model has no size
+            landmark (dict): id, label, color, poses (image -> helpers.Pose) and position of the landmark
+            init_geometry (QRect, optional): geometry of the window
+        """
+
+        super(QGridViewer, self).__init__()
+        if init_geometry is not None:
+            self.setGeometry(init_geometry)
+        self.setWindowTitle(f"Place {landmark['label']}")
+        self.cameras = cameras
+        self.landmark = landmark
+        self.workers = []
+
+        self.tiles = dict()
+        layout = QGridLayout()
+        columns = math.ceil(math.sqrt(len(images)))
+        for index, image in enumerate(images):
+            # images of another camera model can have another size
+            tile = QGridTile(self, image, cameras.get_size(image) if all(cameras.get_size(image)) else size)
+            tile.color = landmark["color"]
+            tile.pose = landmark["poses"].get(image)
+            tile.clicked.connect(self.pose_placed)
+            self.tiles[image] = tile
+            layout.addWidget(tile, index // columns, index % columns)
+        widget = QWidget()
+        widget.setLayout(layout)
+        self.setCentralWidget(widget)
+        self.set_position(landmark["position"])
+        for image, tile in self.tiles.items():
+            focus = tile.pose if tile.pose is not None else tile.reprojection
+            if focus is not None:
+                tile.focus(focus)
+            self.load_tile(f"{directory}/{image}", tile)
+
+    def load_tile(self, path : str, tile : QGridTile):
+        worker = workers.Worker(image_cache.shared.get, path)
+        worker.signals.finished.connect(lambda image: tile.set_image(image) if image is not None else None)
+        self.workers.append(worker)
+        workers.start(worker, get_pool())
+
+    def set_position(self, position):
+        """Update the reprojections of the landmark
+
+        Args:
+            position (tuple): 3D position of the landmark, None if not triangulated
+        """
+
+        for image, tile in self.tiles.items():
+            if position is None:
+                tile.reprojection = None
+            else:
+                pixel = reconstruction.project_points_array([position[0:3]], self.cameras.get_intrinsics(image), self.cameras.get_extrinsics(image), self.cameras.get_dist_coeffs(image))[0]
+                tile.reprojection = helpers.Pose(*pixel)
+            tile.update()
+
+    def closeEvent(self, a0: QCloseEvent) -> None:
+        get_pool().clear()
@@ -31,7 +31,6 @@
 from PySide6.QtCore import Signal, QSettings, QFileInfo
 from PySide6.QtWidgets import (QWidget, QFileDialog, QDialog, QDialogButtonBox, QVBoxLayout, QLineEdit, QHBoxLayout, QLabel, QPushButton, QCheckBox)
 
-from bs4 import BeautifulSoup
 import numpy as np 
 import json
 
@@ -98,6 +97,9 @@ class _IntrinsicsWidget(QWidget):
         self.updated.emit(intrinsics)
 
     def get_intrinsics_values(self, path):
+        # bs4 is only needed when a project is created
+        from bs4 import BeautifulSoup
+
         data = None
         with open(path, 'r') as f:
             data = f.read()
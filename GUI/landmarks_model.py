@@ -0,0 +1,197 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+from scripts import landmarks, reconstruction
+
+from PySide6.QtCore import Qt, QAbstractListModel, QSortFilterProxyModel, QModelIndex, Signal
+from PySide6.QtGui import QColor
+
+class LandmarksModel(QAbstractListModel):
+    """Model of the landmarks of the project, shared by the list of landmarks and the distance selectors
+    The store is changed through the model so the views only update the rows concerned.
+    Edits made in a view are sent as requests, Sphere3D applies them (and records them in the journal)
+    """
+
+    IdRole = Qt.ItemDataRole.UserRole
+    PositionRole = Qt.ItemDataRole.UserRole + 1
+    PendingRole = Qt.ItemDataRole.UserRole + 2
+
+    label_edited = Signal(object) # [id, label]
+    move_requested = Signal(object) # [row, id]
+
+    def __init__(self, parent=None):
+        super(LandmarksModel, self).__init__(parent)
+        self.store = landmarks.LandmarkStore()
+        # landmarks whose position is being computed
+        self.pending = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.store)
+
+    def data(self, index : QModelIndex, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.store):
+            return None
+        id = self.store.order[index.row()]
+        match role:
+            case Qt.ItemDataRole.DisplayRole | Qt.ItemDataRole.EditRole:
+                return self.store.get_label(id)
+            case Qt.ItemDataRole.DecorationRole:
+                return self.store.get_color(id)
+            case LandmarksModel.IdRole:
+                return id
+            case LandmarksModel.PositionRole:
+                return self.store.get_position(id)
+            case LandmarksModel.PendingRole:
+                return id in self.pending
+        return None
+
+    def setData(self, index : QModelIndex, value, role=Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        self.label_edited.emit([index.data(LandmarksModel.IdRole), str(value)])
+        return True
+
+    def flags(self, index : QModelIndex):
+        if not index.isValid():
+            # drop between rows
+            return Qt.ItemFlag.ItemIsDropEnabled
+        return super(LandmarksModel, self).flags(index) | Qt.ItemFlag.ItemIsEditable | Qt.ItemFlag.ItemIsDragEnabled
+
+    def supportedDropActions(self):
+        return Qt.DropAction.MoveAction
+
+    def moveRows(self, sourceParent, sourceRow, count, destinationParent, destinationChild):
+        """Drag and drop in the list, the move is requested to Sphere3D
+        """
+
+        if count != 1 or sourceParent.isValid() or destinationParent.isValid():
+            return False
+        row = destinationChild if destinationChild < sourceRow else destinationChild - 1
+        if row == sourceRow:
+            return False
+        self.move_requested.emit([row, self.store.order[sourceRow]])
+        return True
+
+    def get_index(self, id) -> QModelIndex:
+        return self.index(self.store.rows[id])
+
+    def set_store(self, store : landmarks.LandmarkStore):
+        """Use the landmarks of another project
+
+        Args:
+            store (landmarks.LandmarkStore): landmarks
+        """
+
+        self.beginResetModel()
+        self.store = store
+        self.pending = set()
+        self.endResetModel()
+
+    def add(self, new_landmarks : list[reconstruction.Landmark]):
+        if len(new_landmarks) == 0:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.store), len(self.store) + len(new_landmarks) - 1)
+        self.store.extend(new_landmarks)
+        self.endInsertRows()
+
+    def delete(self, id):
+        row = self.store.rows[id]
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.store.delete(id)
+        self.pending.discard(id)
+        self.endRemoveRows()
+
+    def move(self, id, row : int):
+        old_row = self.store.rows[id]
+        if old_row == row:
+            return
+        # beginMoveRows wants the row before which the landmark is inserted
+        if not self.beginMoveRows(QModelIndex(), old_row, old_row, QModelIndex(), row + 1 if row > old_row else row):
+            return
+        self.store.move(id, row)
+        self.endMoveRows()
+
+    def reset(self, id):
+        self.store.reset(id)
+        self.landmark_changed(id, [LandmarksModel.PositionRole])
+
+    def set_label(self, id, label : str):
+        self.store.set_label(id, label)
+        self.landmark_changed(id, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole])
+
+    def set_color(self, id, color : QColor):
+        self.store.set_color(id, color)
+        self.landmark_changed(id, [Qt.ItemDataRole.DecorationRole])
+
+    def set_pending(self, ids : list, pending : bool):
+        """Mark landmarks whose position is being computed, the position is notified as changed once done
+
+        Args:
+            ids (list): ids of the landmarks
+            pending (bool): being computed
+        """
+
+        if len(ids) == 0:
+            return
+        if pending:
+            self.pending.update(ids)
+        else:
+            self.pending.difference_update(ids)
+        # one notification for the rows of the landmarks
+        rows = [self.store.rows[id] for id in ids]
+        self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)),
+                              [LandmarksModel.PendingRole] if pending else [LandmarksModel.PendingRole, LandmarksModel.PositionRole])
+
+    def landmark_changed(self, id, roles : list = None):
+        """Notify the views that a landmark changed (position or poses changed in the store)
+
+        Args:
+            id (int): id of the landmark
+            roles (list, optional): roles that changed. Defaults to None (all).
+        """
+
+        index = self.get_index(id)
+        self.dataChanged.emit(index, index, roles if roles is not None else [])
+
+class TriangulatedModel(QSortFilterProxyModel):
+    """Landmarks having a position, used to compute distances
+    """
+
+    def __init__(self, model : LandmarksModel, parent=None):
+        super(TriangulatedModel, self).__init__(parent)
+        self.setSourceModel(model)
+        self.setDynamicSortFilter(True)
+        self.setFilterRole(LandmarksModel.PositionRole)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        index = self.sourceModel().index(source_row, 0, source_parent)
+        return index.data(LandmarksModel.PositionRole) is not None
@@ -0,0 +1,168 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+
+from scripts import project, journal, navigation
+
+from PySide6.QtGui import QImage
+
+# Stages of the loading of a project, sent in order with the progress signal
+PROJECT = "project"
+NAVIGATION = "navigation"
+LANDMARKS = "landmarks"
+CACHES = "caches"
+
+def load_project_stages(path : str, angles : tuple, progress, cancelled):
+    """Load a project in stages, to run in a worker
+    The viewer can be used once the navigation is sent, landmarks and caches come afterwards
+
+    Args:
+        path (str): path of the project file
+        angles (tuple(int, int)): position of the virtual camera (in degrees), its image is decoded first
+        progress (function): called with (stage, values) at the end of each stage
+        cancelled (function): returns True if the loading has to stop
+
+    Returns:
+        str: path of the project file, None if cancelled
+    """
+
+    loaded_project = project.load_project(path)
+    if cancelled():
+        return None
+    progress((PROJECT, {"project": loaded_project}))
+
+    thumbnails_dir = f'{loaded_project.directory}/{loaded_project.header["thumbnails"]}'
+    keys, center, longitudes, latitudes, distances, shells = get_positions(loaded_project)
+    images = dict()
+    shell = navigation.get_default_shell(shells)
+    index = None
+    if len(keys) != 0:
+        index = navigation.load_index(path, keys, longitudes, latitudes, shells)
+        first_image = keys[index.get_nearest(shell, *angles)]
+        images[first_image] = QImage(f'{thumbnails_dir}/{first_image}')
+    if cancelled():
+        return None
+    progress((NAVIGATION, {"keys": keys, "center": center, "longitudes": longitudes, "latitudes": latitudes, "distances": distances, "navigation": index, "images": images}))
+
+    landmarks_journal = journal.LandmarkJournal(journal.get_journal_path(loaded_project.get_path()), loaded_project.state, None)
+    landmarks = landmarks_journal.replay()
+    if cancelled():
+        return None
+    progress((LANDMARKS, {"journal": landmarks_journal, "landmarks": landmarks}))
+
+    # images of the shortcut views
+    images = dict()
+    for angles in loaded_project.get_commands().values():
+        if len(keys) == 0 or cancelled():
+            break
+        image = keys[index.get_nearest(shell, *angles)]
+        if image not in images:
+            images[image] = QImage(f'{thumbnails_dir}/{image}')
+    progress((CACHES, {"images": images}))
+    return path
+
+def get_positions(loaded_project : project.Project):
+    """get the images of a project that have a thumbnail, with their positions on the sphere
+
+    Args:
+        loaded_project (project.Project): project
+
+    Returns:
+        list: images (sorted)
+        np.ndarray: (3,1) center of the sphere
+        np.ndarray: longitude of each image (in radian)
+        np.ndarray: latitude of each image (in radian)
+        np.ndarray: distance of each image to the center
+        np.ndarray: shell of each image
+    """
+
+    keys, center, longitudes, latitudes = project.get_image_positions(loaded_project, loaded_project.get_thumbnail_names())
+    distances = navigation.get_distances(loaded_project.cameras, keys, center)
+    return keys, center, longitudes, latitudes, distances, navigation.get_shells(keys, distances)
+
+def make_navigation_snapshot(loaded_project : project.Project) -> dict:
+    """Copy what is needed to save the navigation index of a project, the snapshot can be used in another thread
+
+    Args:
+        loaded_project (project.Project): project
+
+    Returns:
+        dict: path of the project, images with a thumbnail (sorted) and their camera centers,
+            precomputed center and coordinates of the sphere if they were fitted on the same images
+    """
+
+    cameras = loaded_project.cameras
+    keys = sorted(name for name in loaded_project.get_thumbnail_names() if name in cameras)
+    rows = cameras.get_rows(keys)
+    snapshot = {"path": loaded_project.get_path(),
+                "keys": keys,
+                "centers": cameras.centers[rows],
+                "sphere_center": None,
+                "long_lat": None}
+    if project.has_sphere_coordinates(loaded_project, keys):
+        snapshot["sphere_center"] = loaded_project.sphere_center.reshape(3).copy()
+        snapshot["long_lat"] = loaded_project.long_lat[rows]
+    return snapshot
+
+def save_navigation(snapshot : dict):
+    """Cache the navigation index of a project as it will be loaded next time (see load_project_stages), to run in a worker
+
+    Args:
+        snapshot (dict): snapshot of the project (see make_navigation_snapshot)
+    """
+
+    keys = snapshot["keys"]
+    if len(keys) == 0:
+        return
+    centers = snapshot["centers"]
+    if snapshot["long_lat"] is not None:
+        center, long_lat = snapshot["sphere_center"], snapshot["long_lat"]
+    else:
+        center, long_lat = project.get_sphere_coordinates(centers, np.arange(len(keys)))
+    distances = np.linalg.norm(centers - center, axis=1)
+    shells = navigation.get_shells(keys, distances)
+    navigation.load_index(snapshot["path"], keys, long_lat[:, 0], long_lat[:, 1], shells)
+
+def load_thumbnails(directory : str, names : list, progress, cancelled):
+    """Decode thumbnails, to run in a ProgressWorker
+
+    Args:
+        directory (str): directory of the thumbnails
+        names (list): images, in the order they are decoded
+        progress (function): called with (image, QImage) for each decoded thumbnail
+        cancelled (function): returns True if the loading has to stop
+    """
+
+    for name in names:
+        if cancelled():
+            return
+        progress((name, QImage(f'{directory}/{name}')))
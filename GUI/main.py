@@ -30,15 +30,15 @@
 
 
 from PySide6.QtWidgets import (
-    QMainWindow, QStackedLayout, QWidget
+    QMainWindow, QStackedLayout, QWidget, QFileDialog
 )
 from PySide6.QtGui import (
     QAction, QIcon
 )
 from PySide6.QtCore import (
-    QSettings
+    QSettings, QTimer
 )
-from GUI.reconstruction import ReconstructionWidget
+# GUI.reconstruction is imported when the reconstruction widget is first shown
 from GUI.home import HomeWidget
 from scripts.helpers import Indexes
 
@@ -56,10 +56,9 @@ class MainWindow(QMainWindow):
 
         # Stack of the different main widgets
         self.home = HomeWidget(self)
-        self.rec = ReconstructionWidget(self)
+        self._rec = None
 
         self.layout.addWidget(self.home)
-        self.layout.addWidget(self.rec)
 
         self.layout.setCurrentIndex(0)
         widget = QWidget()
@@ -69,7 +68,31 @@ class MainWindow(QMainWindow):
         self._create_actions()
         self._create_menu_bar()
 
+        # once the home page is shown
+        QTimer.singleShot(0, self.warm_start)
+
+    def warm_start(self):
+        """Load the last project in the background while the home page is shown
+        """
+
+        if self._rec is None and QSettings("Sphaeroptica", "reconstruction").value("directory"):
+            self.rec
+
+    @property
+    def rec(self):
+        """Reconstruction widget, built the first time it is needed
+        """
+
+        if self._rec is None:
+            from GUI.reconstruction import ReconstructionWidget
+
+            self._rec = ReconstructionWidget(self)
+            self.layout.insertWidget(Indexes.REC.value, self._rec)
+        return self._rec
+
     def set_widget(self, id : Indexes):
+        if id == Indexes.REC:
+            self.rec
         print(f"{self.layout.currentIndex()} -> {id.value}")
         self.stack_widgets.append(self.layout.currentIndex())
         self.layout.setCurrentIndex(id.value)
@@ -95,17 +118,45 @@ class MainWindow(QMainWindow):
         self.new_action.triggered.connect(self.new_file)
         self.open_action = QAction("Open..", self)
         self.open_action.triggered.connect(self.open_file)
+        self.watch_action = QAction("Watch acquisition..", self)
+        self.watch_action.setCheckable(True)
+        self.watch_action.toggled.connect(self.watch_acquisition)
 
     def open_file(self):
+        self.watch_action.setChecked(False)
         self.rec.reconstruction_settings.setValue("directory", None)
         self.rec.init.open_project()
         self.set_widget(Indexes.REC)
 
     def new_file(self):
+        self.watch_action.setChecked(False)
         self.rec.reconstruction_settings.setValue("directory", None)
         self.rec.init.create_project()
         self.set_widget(Indexes.REC)
 
+    def watch_acquisition(self, checked):
+        """Start or stop the watch of the data folder of the current project
+        """
+
+        viewer = self.rec.viewer
+        if not checked:
+            viewer.stop_acquisition()
+            return
+        if len(viewer.images) == 0:
+            print("No project loaded")
+            self.watch_action.setChecked(False)
+            return
+        extrinsics_file = QFileDialog.getOpenFileName(self, "Select extrinsics written by the rig : ", viewer.directory, "JSON (*.json)")[0]
+        if not extrinsics_file.strip():
+            self.watch_action.setChecked(False)
+            return
+        viewer.start_acquisition(extrinsics_file)
+
+    def closeEvent(self, event):
+        if self._rec is not None:
+            self._rec.close_project()
+        super(MainWindow, self).closeEvent(event)
+
     def _create_menu_bar(self):
         menu = self.menuBar()
         
@@ -113,5 +164,7 @@ class MainWindow(QMainWindow):
         file_menu = menu.addMenu("Reconst.")
         file_menu.addAction(self.new_action)
         file_menu.addAction(self.open_action)
+        file_menu.addSeparator()
+        file_menu.addAction(self.watch_action)
         
 
@@ -28,30 +28,48 @@
 
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import traceback
-
 import math
 import glob
 import numpy as np
-import cv2 as cv
-import pandas as pd
 import os
 import json
-from PIL import Image
-from scripts import helpers, reconstruction, converters
-from GUI import show_picture, import_project
+from scripts import helpers, reconstruction, converters, thumbnails, project, journal, triangulation, curves, epipolar, projections, navigation, scant, landmarks as landmark_store
+# show_picture (OpenCV) and import_project (bs4) are imported when they are first used
+from GUI import acquisition, loading, workers
+from GUI.landmarks_model import LandmarksModel, TriangulatedModel
 from collections import deque
 
 from PySide6.QtWidgets import (
     QLabel, QWidget, QVBoxLayout, QHBoxLayout, QStackedLayout, QGridLayout,
-    QPushButton, QFileDialog, QColorDialog, QSizePolicy, QScrollArea, QLineEdit,
-    QComboBox, QCheckBox, QDialog, QDialogButtonBox
+    QPushButton, QFileDialog, QColorDialog, QSizePolicy, QLineEdit,
+    QComboBox, QCheckBox, QDialog, QDialogButtonBox, QListView, QAbstractItemView,
+    QStyledItemDelegate, QStyle, QListWidget, QListWidgetItem, QSpinBox
 )
 from PySide6.QtGui import (
     QPixmap, QResizeEvent, QMouseEvent, QImage, QPalette, QIcon,
-    QPaintEvent, QPainter, QBrush, QColor, QKeyEvent, QDoubleValidator,
-    QDragEnterEvent, QDropEvent, QDrag)
-from PySide6.QtCore import Qt, QRect, Signal, QSettings, QFileInfo, QEvent, QLocale, QMimeData, QSize
+    QPaintEvent, QPainter, QPen, QBrush, QColor, QKeyEvent, QWheelEvent, QDoubleValidator)
+from PySide6.QtCore import Qt, QRect, Signal, QSettings, QFileInfo, QEvent, QLocale, QSize, QModelIndex, QPointF
+
+# thumbnails decoded around the virtual camera when moving to another shell
+PREFETCH_SIZE = 32
+
+_pixmaps = dict()
+
+def get_pixmap(path : str, size : QSize = None) -> QPixmap:
+    """Load an icon once and share it between the widgets
+
+    Args:
+        path (str): path of the icon
+        size (QSize, optional): size of the pixmap. Defaults to None (original size).
+
+    Returns:
+        QPixmap: the pixmap
+    """
+
+    key = (path, size.width(), size.height()) if size is not None else (path,)
+    if key not in _pixmaps:
+        _pixmaps[key] = QIcon(path).pixmap(size) if size is not None else QPixmap(path)
+    return _pixmaps[key]
 
 class _Sphere(QLabel):
 
@@ -59,12 +77,68 @@ class _Sphere(QLabel):
         super(_Sphere, self).__init__(parent)
         #self.setScaledContents(True)
         self.original_pixmap = None
+        # (x, y, color) of the triangulated landmarks and of the poses of the image on the original pixmap
+        self.overlay = []
+        self.poses = []
 
     def set_image(self, image_pixmap : QPixmap):
         self.original_pixmap = image_pixmap
         pixmap = image_pixmap.scaled(self.width(), self.height(), Qt.AspectRatioMode.KeepAspectRatio)
         self.setPixmap(pixmap)
 
+    def set_text(self, text : str):
+        self.original_pixmap = None
+        self.overlay = []
+        self.poses = []
+        self.setText(text)
+
+    def set_overlay(self, overlay : list, poses : list):
+        self.overlay = overlay
+        self.poses = poses
+        self.update()
+
+    def get_transform(self):
+        # the pixmap is centered in the label
+        pixmap = self.pixmap()
+        scale = pixmap.width() / self.original_pixmap.width()
+        return scale, (self.width() - pixmap.width()) / 2, (self.height() - pixmap.height()) / 2
+
+    def to_pixmap(self, pos : QPointF):
+        """Position of a point of the label on the original pixmap
+
+        Args:
+            pos (QPointF): point of the label
+
+        Returns:
+            tuple(float, float): x and y on the original pixmap, None if outside of the pixmap
+        """
+
+        if self.original_pixmap is None:
+            return None
+        scale, offset_x, offset_y = self.get_transform()
+        x, y = (pos.x() - offset_x) / scale, (pos.y() - offset_y) / scale
+        if 0 <= x < self.original_pixmap.width() and 0 <= y < self.original_pixmap.height():
+            return x, y
+        return None
+
+    def paintEvent(self, a0: QPaintEvent) -> None:
+        super(_Sphere, self).paintEvent(a0)
+        if self.original_pixmap is None or len(self.overlay) + len(self.poses) == 0:
+            return
+        scale, offset_x, offset_y = self.get_transform()
+        painter = QPainter(self)
+        for x, y, color in self.overlay:
+            if 0 <= x < self.original_pixmap.width() and 0 <= y < self.original_pixmap.height():
+                pen = QPen(color, 6)
+                pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+                painter.setPen(pen)
+                painter.drawPoint(QPointF(offset_x + x * scale, offset_y + y * scale))
+        for x, y, color in self.poses:
+            # placed on this image
+            painter.setPen(QPen(color, 1))
+            painter.drawEllipse(QPointF(offset_x + x * scale, offset_y + y * scale), 5, 5)
+        painter.end()
+
     def resizeEvent(self, a0: QResizeEvent) -> None:
         """When resizing the window, resize the image
 
@@ -104,6 +178,10 @@ class _AngleValues(QWidget):
         painter.fillRect(rect, brush)
 
         values = self.parent()._angles_sphere
+        text = f'({values[0]:g},{values[1]:g})'
+        nbr_shells = self.parent().get_nbr_shells()
+        if nbr_shells > 1:
+            text += f'  shell {self.parent().shell + 1}/{nbr_shells}'
 
         pen = painter.pen()
         pen.setColor(self._text_Color)
@@ -114,7 +192,7 @@ class _AngleValues(QWidget):
         font.setPointSize(18)
         painter.setFont(font)
         
-        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, f'({values[0]},{values[1]})')
+        painter.drawText(rect, Qt.AlignmentFlag.AlignCenter, text)
 
     def _trigger_refresh(self):
         self.update()
@@ -150,128 +228,71 @@ class PictureButton(QLabel):
             self.right_clicked.emit(self.key)
             return
 
-class QColorPixmap(QLabel):
-    """Widget that show the referenced color for a landmark
-    """
-
-    color_changed = Signal(object)
-    def __init__(self, size, color : QColor):
-        super(QColorPixmap, self).__init__()
-        self.color = color
-        pixmap = QPixmap(size, size)
-        pixmap.fill(self.color)
-        self.setPixmap(pixmap)
-
-        self.color_dialog = QColorDialog()
-    
-    def mousePressEvent(self, ev: QMouseEvent) -> None:
-        """Show a ColorDialog to select a new color for the landmark
-
-        Args:
-            ev (QMouseEvent): Mouse Event
-        """
-        color = self.color_dialog.getColor(self.color)
-        if color.isValid():
-            self.color_changed.emit(color)
-
-
-class QLandmarkEntry(QWidget):
-    """Entry in the list of landmarks
+class LandmarkDelegate(QStyledItemDelegate):
+    """Draws an entry of the list of landmarks : drag handle, label, color, reset and delete buttons
     """
 
-    delete_landmark = Signal()
-    reset_landmark = Signal()
-    label_changed = Signal(object)
-    color_changed = Signal(object)
-
-    def __init__(self, landmark : reconstruction.Landmark):
-        super(QLandmarkEntry, self).__init__()
-        layout = QHBoxLayout()
-
-        self.drag_button = QLabel()
-        pixmap = QIcon("icons/grid-dot.png").pixmap(QSize(20,20))
-        self.drag_button.setPixmap(pixmap)
-        self.drag_button.setFixedWidth(20)
-        self.drag_button.setBackgroundRole(QPalette.ColorRole.Highlight)
-        layout.addWidget(self.drag_button)
-
-        self.landmark = landmark
-        self.label = QLineEdit(self)
-        self.label.setFixedHeight(helpers.HEIGHT_COMPONENT)
-        self.label.setText(landmark.label)
-        self.label.editingFinished.connect(self.change_label)
-        layout.addWidget(self.label)
-
-        self.color_label = QColorPixmap(self.label.height(), landmark.get_color())
-        layout.addWidget(self.color_label)
-        self.color_label.color_changed.connect(self.change_color)
-
-        self.reset_button = QPushButton()
-        self.reset_button.setIcon(QIcon("icons/arrow-circle-double-135.png"))
-        self.reset_button.clicked.connect(self.reset)
-        self.reset_button.setFixedWidth(20)
-        layout.addWidget(self.reset_button)
-
-        self.delete_button = QPushButton()
-        self.delete_button.setIcon(QIcon("icons/cross.png"))
-        self.delete_button.clicked.connect(self.delete)
-        self.delete_button.setFixedWidth(20)
-        layout.addWidget(self.delete_button)
-        
-        self.id = landmark.id
-        self.setLayout(layout)
-    
-    def delete(self):
-        """Delete Entry
-        TODO : Use a ModelView architecture for landmarks
-        """
-
-        self.delete_landmark.emit()
-    
-    def reset(self):
-        """Remove all landmarks and 3D position 
-        TODO : Use a ModelView architecture for landmarks
-        """
+    color_clicked = Signal(object)
+    reset_clicked = Signal(object)
+    delete_clicked = Signal(object)
 
-        self.reset_landmark.emit()
-    
-    def change_color(self, color):
-        """Change color of landmark
-        TODO : Use a ModelView architecture for landmarks
+    def get_rects(self, rect : QRect):
+        """get the areas of an entry
 
         Args:
-            color (QColor): new color
-        """
-
-        self.color_changed.emit(color)
+            rect (QRect): area of the entry
 
-    def change_label(self):
-        """edit the label of the landmark
-        TODO : Use a ModelView architecture for landmarks
+        Returns:
+            tuple(QRect): drag handle, label, color, reset button and delete button
         """
 
-        self.label.clearFocus()
-        self.label_changed.emit(self.label.text())
-
-    def mouseMoveEvent(self, e):
-        """Drag of QLandmarks
-
-        Args:
-            e (QMouseEvent): event
+        size = rect.height()
+        drag = QRect(rect.left(), rect.top(), 20, size)
+        delete = QRect(rect.right() - 20, rect.top(), 20, size)
+        reset = QRect(delete.left() - 25, rect.top(), 20, size)
+        color = QRect(reset.left() - size, rect.top() + 2, size - 4, size - 4)
+        label = QRect(drag.right() + 5, rect.top(), color.left() - drag.right() - 10, size)
+        return drag, label, color, reset, delete
+
+    def paint(self, painter : QPainter, option, index : QModelIndex):
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+        drag, label, color, reset, delete = self.get_rects(option.rect)
+        for rect, icon in ((drag, "icons/grid-dot.png"), (reset, "icons/arrow-circle-double-135.png"), (delete, "icons/cross.png")):
+            pixmap = get_pixmap(icon, QSize(16,16))
+            painter.drawPixmap(rect.center().x() - 8, rect.center().y() - 8, pixmap)
+        text = index.data()
+        if index.data(LandmarksModel.PendingRole):
+            # position being computed
+            text = f"{text} (pending)"
+            painter.setPen(option.palette.color(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Text))
+        painter.drawText(label, Qt.AlignmentFlag.AlignVCenter | Qt.AlignmentFlag.AlignLeft, text)
+        painter.fillRect(color, index.data(Qt.ItemDataRole.DecorationRole))
+        painter.restore()
+
+    def sizeHint(self, option, index : QModelIndex) -> QSize:
+        return QSize(200, helpers.HEIGHT_COMPONENT)
+
+    def updateEditorGeometry(self, editor, option, index : QModelIndex):
+        editor.setGeometry(self.get_rects(option.rect)[1])
+
+    def editorEvent(self, event, model, option, index : QModelIndex):
+        """Clicks on the buttons of an entry
         """
-        print(f"Drag button {self.id}")
-        if e.buttons() == Qt.MouseButton.LeftButton:
-            drag = QDrag(self)
-            mime = QMimeData()
-            drag.setMimeData(mime)
-
-            pixmap = QPixmap(self.size())
-            self.render(pixmap)
-            drag.setPixmap(pixmap)
-            drag.exec(Qt.DropAction.MoveAction)
 
-class QLandmarks(QScrollArea):
-    """ScrollArea containing the list of QLandmarksEntry
+        if event.type() == QEvent.Type.MouseButtonRelease and event.button() == Qt.MouseButton.LeftButton:
+            _, _, color, reset, delete = self.get_rects(option.rect)
+            pos = event.position().toPoint()
+            for rect, signal in ((color, self.color_clicked), (reset, self.reset_clicked), (delete, self.delete_clicked)):
+                if rect.contains(pos):
+                    signal.emit(index)
+                    return True
+        return super(LandmarkDelegate, self).editorEvent(event, model, option, index)
+
+class QLandmarks(QWidget):
+    """List of landmarks (view of the LandmarksModel of the viewer)
+    Only the visible entries are drawn, the changes of the model only update their rows
     """
     landmark_added = Signal()
     landmark_deleted = Signal(object)
@@ -281,155 +302,196 @@ class QLandmarks(QScrollArea):
 
     def __init__(self, parent):
         super(QLandmarks, self).__init__(parent)
-        self.w = QWidget()
+        self.model = self.window().landmarks_model
+        self.model.label_edited.connect(self.label_changed)
+
         self.add_landmark_btn = QPushButton("Add landmark")
         self.add_landmark_btn.setSizePolicy(QSizePolicy.Policy.Expanding,
             QSizePolicy.Policy.Maximum)
         self.add_landmark_btn.clicked.connect(self.add_landmark)
 
-        self.load_landmarks(self.window().landmarks)
-        self.setBackgroundRole(QPalette.ColorRole.BrightText)
+        self.delegate = LandmarkDelegate(self)
+        self.delegate.delete_clicked.connect(self.delete_landmark)
+        self.delegate.reset_clicked.connect(self.reset_landmark)
+        self.delegate.color_clicked.connect(self.change_color)
+
+        self.view = QListView(self)
+        self.view.setModel(self.model)
+        self.view.setItemDelegate(self.delegate)
+        self.view.setUniformItemSizes(True)
+        self.view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.view.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked | QAbstractItemView.EditTrigger.SelectedClicked)
+        self.view.setDragDropMode(QAbstractItemView.DragDropMode.InternalMove)
+        self.view.setDefaultDropAction(Qt.DropAction.MoveAction)
+        self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.view.setBackgroundRole(QPalette.ColorRole.BrightText)
+        self.view.installEventFilter(self)
+
+        self.vbox = QVBoxLayout()
+        self.vbox.setContentsMargins(0,0,0,0)
+        self.vbox.addWidget(self.view)
+        self.vbox.addWidget(self.add_landmark_btn)
+        self.setLayout(self.vbox)
         self.setSizePolicy(QSizePolicy.Policy.Expanding,
             QSizePolicy.Policy.Expanding)
-        self.installEventFilter(self)
-        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.setWidgetResizable(True)
     
     def eventFilter(self, source, event):
+        # keys are used by the virtual camera
         if event.type() == QEvent.Type.ShortcutOverride or event.type() == QEvent.Type.KeyPress:
             event.ignore()
             return True
 
         return super().eventFilter(source, event)
-
-    def load_landmarks(self, landmarks):
-        """Load each landmarks to the list
-
-        Args:
-            landmarks (list): list of landmarks
-        """
-
-        self.w = QWidget()
-        self.vbox = QVBoxLayout()
-
-        self.landmarks_box = QVBoxLayout()
-        self.buttons = []
-        for landmark in landmarks:
-            button = QLandmarkEntry(landmark)
-            self.buttons.append(button)
-            button.delete_landmark.connect(self.delete_landmark)
-            button.reset_landmark.connect(self.reset_landmark)
-            button.label_changed.connect(self.change_label)
-            button.color_changed.connect(self.change_color)
-            self.landmarks_box.addWidget(button)
-        
-        self.vbox.addLayout(self.landmarks_box)
-        self.vbox.addWidget(self.add_landmark_btn)
-        self.w.setLayout(self.vbox)
-        self.w.setSizePolicy(QSizePolicy.Policy.Expanding,
-            QSizePolicy.Policy.Maximum)
-        self.setWidget(self.w)
-        self.setAcceptDrops(True)
     
-    def delete_landmark(self):
+    def delete_landmark(self, index : QModelIndex):
         """Sends a signal to delete landmark
-        TODO : Use a ModelView architecture for landmarks
         """
 
-        sender_button = self.sender()
-        id = sender_button.id
-        self.landmark_deleted.emit(id)
+        self.landmark_deleted.emit(index.data(LandmarksModel.IdRole))
     
-    def reset_landmark(self):
+    def reset_landmark(self, index : QModelIndex):
         """Sends a signal to reset landmark
-        TODO : Use a ModelView architecture for landmarks
         """
         
-        sender_button = self.sender()
-        id = sender_button.id
-        self.landmark_reset.emit(id)
+        self.landmark_reset.emit(index.data(LandmarksModel.IdRole))
 
     def add_landmark(self):
         """Sends a signal to add a new landmark
-        TODO : Use a ModelView architecture for landmarks
         """
 
         self.landmark_added.emit()
-
-    def change_label(self, text):
-        """Sends a signal to change the label of the landmark
-        TODO : Use a ModelView architecture for landmarks
-        """
-
-        sender_button = self.sender()
-        id = sender_button.id
-        self.label_changed.emit([id, text])
+        self.view.scrollToBottom()
     
-    def change_color(self, color):
-        """Sends a signal to change the color of the landmark
-        TODO : Use a ModelView architecture for landmarks
+    def change_color(self, index : QModelIndex):
+        """Show a ColorDialog and sends a signal to change the color of the landmark
         """
 
-        sender_button = self.sender()
-        id = sender_button.id
-        self.color_changed.emit([id, color])
-    
-    def dragEnterEvent(self, a0: QDragEnterEvent) -> None:
-        """Autorizes drag event
+        color = QColorDialog.getColor(index.data(Qt.ItemDataRole.DecorationRole))
+        if color.isValid():
+            self.color_changed.emit([index.data(LandmarksModel.IdRole), color])
 
-        Args:
-            a0 (QDragEnterEvent): Drag Event
-        """
 
-        self.original_pos = a0.position()
-        a0.accept()
+class QCurves(QWidget):
+    """List of the curves of semi-landmarks, with the number of points of the selected one
+    """
+    curve_added = Signal(object)
+    curve_deleted = Signal(object)
+    label_changed = Signal(object)
+    samples_changed = Signal(object)
+
+    def __init__(self, parent):
+        super(QCurves, self).__init__(parent)
+
+        self.list = QListWidget(self)
+        self.list.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.list.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked | QAbstractItemView.EditTrigger.SelectedClicked)
+        self.list.setMaximumHeight(4*helpers.HEIGHT_COMPONENT)
+        self.list.itemChanged.connect(self.change_label)
+        self.list.currentItemChanged.connect(self.select_curve)
+        self.list.installEventFilter(self)
+
+        self.samples = QSpinBox(self)
+        self.samples.setRange(2, 1000)
+        self.samples.setValue(curves.DEFAULT_SAMPLES)
+        self.samples.setSuffix(" points")
+        self.samples.valueChanged.connect(self.change_samples)
+
+        self.add_curve_btn = QPushButton("Add curve")
+        self.add_curve_btn.clicked.connect(self.add_curve)
+        self.delete_curve_btn = QPushButton("Delete curve")
+        self.delete_curve_btn.clicked.connect(self.delete_curve)
+
+        self.buttons = QHBoxLayout()
+        self.buttons.addWidget(self.samples)
+        self.buttons.addWidget(self.add_curve_btn)
+        self.buttons.addWidget(self.delete_curve_btn)
+
+        self.vbox = QVBoxLayout()
+        self.vbox.setContentsMargins(0,0,0,0)
+        self.vbox.addWidget(self.list)
+        self.vbox.addLayout(self.buttons)
+        self.setLayout(self.vbox)
+
+    def eventFilter(self, source, event):
+        # keys are used by the virtual camera
+        if event.type() == QEvent.Type.ShortcutOverride or event.type() == QEvent.Type.KeyPress:
+            event.ignore()
+            return True
 
+        return super().eventFilter(source, event)
 
-    def dropEvent(self, a0: QDropEvent) -> None:
-        """Authorize drop event and change list of landmarks
-        Add the dragged landmark over the first landmark it isn't under
+    def set_curves(self, curves_list : list):
+        """Show the curves
 
         Args:
-            a0 (QDragEnterEvent): Drag Event
+            curves_list (list): curves of the viewer
         """
 
-        pos = a0.position()
-        widget = a0.source()
+        current = self.get_current_id()
+        self.list.blockSignals(True)
+        self.list.clear()
+        for curve in curves_list:
+            pixmap = QPixmap(helpers.HEIGHT_COMPONENT, helpers.HEIGHT_COMPONENT)
+            pixmap.fill(curve.color)
+            item = QListWidgetItem(QIcon(pixmap), curve.label)
+            item.setData(Qt.ItemDataRole.UserRole, curve.id)
+            item.setData(Qt.ItemDataRole.UserRole+1, curve.samples)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
+            self.list.addItem(item)
+            if curve.id == current:
+                self.list.setCurrentItem(item)
+        self.list.blockSignals(False)
+
+    def get_current_id(self):
+        item = self.list.currentItem()
+        return item.data(Qt.ItemDataRole.UserRole) if item is not None else None
+
+    def select_curve(self, item, previous):
+        if item is None:
+            return
+        self.samples.blockSignals(True)
+        self.samples.setValue(item.data(Qt.ItemDataRole.UserRole+1))
+        self.samples.blockSignals(False)
 
-        desc = pos.y() > self.original_pos.y()
+    def change_label(self, item):
+        self.label_changed.emit([item.data(Qt.ItemDataRole.UserRole), item.text()])
 
-        last = self.landmarks_box.itemAt(self.landmarks_box.count()-1).widget()
-        if pos.y() > last.y() + last.size().height() // 2:
-            # The drag went under the last widget of the list
-            self.window().rec.viewer.move_landmark(self.landmarks_box.count()-1, widget.id)
-        else:
-            for n in range(self.landmarks_box.count()):
-                # Get the widget at each index in turn.
-                w = self.landmarks_box.itemAt(n).widget()
-                print(f"{w.label.text()} : {pos.y()} < {w.y() + w.size().height() // 2}")
-                if pos.y() < w.y() + w.size().height() // 2:
-                    # We didn't drag past this widget.
-                    # insert to the left of it.
-                    self.window().rec.viewer.move_landmark(n-1 if desc else n, widget.id)
-                    break
-        self.window().rec.viewer.update_landmarks()
-        a0.accept()
+    def change_samples(self, samples):
+        id = self.get_current_id()
+        if id is not None:
+            self.samples_changed.emit([id, samples])
+
+    def add_curve(self):
+        """Sends a signal to add a new curve with the number of points shown
+        """
+
+        self.curve_added.emit(self.samples.value())
 
+    def delete_curve(self):
+        id = self.get_current_id()
+        if id is not None:
+            self.curve_deleted.emit(id)
 
 class DistanceWidget(QWidget):
     """Widget that show the distance between two chosen landmarks
     """
 
+    scale_factor_changed = Signal(object)
+
     def __init__(self, parent):
         super(DistanceWidget, self).__init__(parent)
         self.init_settings()
 
         self.full_layout = QVBoxLayout()
         self.selection = QHBoxLayout()
+        # only the landmarks with a position
+        self.model = TriangulatedModel(self.window().landmarks_model, self)
         self.left = QComboBox()
         self.right = QComboBox()
-        self.left.addItem("",0)
-        self.right.addItem("",0)
+        for combo in (self.left, self.right):
+            combo.setModel(self.model)
+            combo.setPlaceholderText(" ")
+            combo.setCurrentIndex(-1)
 
         self.reset_layout = QHBoxLayout()
         self.reset_layout.setAlignment(Qt.AlignmentFlag.AlignRight)
@@ -438,7 +500,6 @@ class DistanceWidget(QWidget):
         self.reset_layout.addWidget(self.reset_button)
         self.full_layout.addLayout(self.reset_layout)
         
-        self.load_landmarks(self.window().landmarks)
         self.selection.addWidget(self.left)
         self.to = QLabel("to")
         self.to.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -470,6 +531,8 @@ class DistanceWidget(QWidget):
         #wait init of all widgets to add the QCombobox listener
         self.left.currentIndexChanged.connect(self.update_dist)
         self.right.currentIndexChanged.connect(self.update_dist)
+        # a chosen landmark may have been triangulated again
+        self.model.dataChanged.connect(self.update_dist)
         self.scale_widget.currentIndexChanged.connect(self.update_dist)
 
         self.full_layout.addLayout(self.selection)
@@ -503,6 +566,7 @@ class DistanceWidget(QWidget):
         self.scale_factor = value * helpers.Scale[str(self.scale_widget.currentText())].value / self.original_value
         self.value.setCursorPosition(0)
         print(f"Scale factor set at {self.scale_factor}")
+        self.scale_factor_changed.emit(self.scale_factor)
     
     def reset_scale_factor(self):
         """Reset scale factor to 1
@@ -511,52 +575,27 @@ class DistanceWidget(QWidget):
         self.scale_factor = 1.0
         print("Scale factor reset")
         self.update_dist()
+        self.scale_factor_changed.emit(self.scale_factor)
 
-    def load_landmarks(self, landmarks : list[reconstruction.Landmark]):
-        """Load each landmark that has a 3D position to the widget
+    def set_scale_factor(self, scale_factor):
+        """Set the scale factor saved with the project
 
         Args:
-            landmarks (list): list of landmarks
+            scale_factor (float): scale factor
         """
 
-        self.landmarks = list[reconstruction.Landmark]()
-        self.landmarks.append(None)
-        left_index = self.left.currentIndex()
-        left_data = self.left.currentData()
-        right_index = self.right.currentIndex()
-        right_data = self.right.currentData()
-
-        self.left.clear()
-        self.right.clear()
-
-        self.left.addItem("",0)
-        self.right.addItem("",0)
-        for landmark in landmarks:
-            if landmark.get_position() is None:
-                continue
-            self.landmarks.append(landmark)
-            self.left.addItem(landmark.get_label(),landmark.get_id())
-            self.right.addItem(landmark.get_label(),landmark.get_id())
-        
-        if left_index is not None and self.left.itemData(left_index) == left_data:
-            self.left.setCurrentIndex(left_index)
-        else:
-            self.left.setCurrentIndex(0)
-        
-        if right_index is not None and self.right.itemData(right_index) == right_data:
-            self.right.setCurrentIndex(right_index)
-        else:
-            self.right.setCurrentIndex(0)
+        self.scale_factor = float(scale_factor)
+        self.update_dist()
 
     def update_dist(self):
         """Computes the distance between two landmarks and updates the widget
         """
 
-        if self.left.currentIndex() <= 0 or self.right.currentIndex() <= 0:
+        if self.left.currentIndex() < 0 or self.right.currentIndex() < 0:
             self.value.setText("0.0")
             self.original_value = 0.0
             return
-        self.original_value = reconstruction.get_distance(self.landmarks[self.left.currentIndex()].get_position(), self.landmarks[self.right.currentIndex()].get_position())
+        self.original_value = reconstruction.get_distance(self.left.currentData(LandmarksModel.PositionRole), self.right.currentData(LandmarksModel.PositionRole))
         self.value.setText(str(self.original_value * self.scale_factor / helpers.Scale[str(self.scale_widget.currentText())].value))
         self.value.setCursorPosition(0)
 
@@ -572,6 +611,8 @@ class CommandsWidget(QWidget):
     change_picture = Signal(object)
     set_picture = Signal(object)
     landmarks_to_import = Signal(object)
+    stereo_requested = Signal()
+    grid_requested = Signal(object)
     export = Signal()
 
     def __init__(self, parent):
@@ -583,12 +624,12 @@ class CommandsWidget(QWidget):
         # Shortcut important pictures
         self.grid_layout = QGridLayout()
 
-        self.frontal = PictureButton(self, helpers.Keys.FRONT, QPixmap.fromImage(QImage("./icons/frontal.jpg")))
-        self.posterior = PictureButton(self, helpers.Keys.POST, QPixmap.fromImage(QImage("./icons/posterior.jpg")))
-        self.inferior = PictureButton(self, helpers.Keys.INFERIOR, QPixmap.fromImage(QImage("./icons/inferior.jpg")))
-        self.superior = PictureButton(self, helpers.Keys.SUPERIOR, QPixmap.fromImage(QImage("./icons/superior.jpg")))
-        self.left = PictureButton(self, helpers.Keys.LEFT, QPixmap.fromImage(QImage("./icons/left.jpg")))
-        self.right = PictureButton(self, helpers.Keys.RIGHT, QPixmap.fromImage(QImage("./icons/right.jpg")))
+        self.frontal = PictureButton(self, helpers.Keys.FRONT, get_pixmap("./icons/frontal.jpg"))
+        self.posterior = PictureButton(self, helpers.Keys.POST, get_pixmap("./icons/posterior.jpg"))
+        self.inferior = PictureButton(self, helpers.Keys.INFERIOR, get_pixmap("./icons/inferior.jpg"))
+        self.superior = PictureButton(self, helpers.Keys.SUPERIOR, get_pixmap("./icons/superior.jpg"))
+        self.left = PictureButton(self, helpers.Keys.LEFT, get_pixmap("./icons/left.jpg"))
+        self.right = PictureButton(self, helpers.Keys.RIGHT, get_pixmap("./icons/right.jpg"))
         
         self.frontal.left_clicked.connect(self.left_clicked)
         self.posterior.left_clicked.connect(self.left_clicked)
@@ -623,11 +664,36 @@ class CommandsWidget(QWidget):
         self.import_landmark_btn = QPushButton("Import Landmarks")
         self.import_landmark_btn.clicked.connect(self.import_landmarks)
         self.right_layout.addWidget(self.import_landmark_btn)
+        self.import_folder_btn = QPushButton("Import Folder")
+        self.import_folder_btn.clicked.connect(self.import_folder)
+        self.right_layout.addWidget(self.import_folder_btn)
         self.v_layout.addLayout(self.right_layout)
 
+        # Propagation of the placed landmarks to the neighbouring images
+        self.settings = QSettings("Sphaeroptica", "reconstruction")
+        self.propagate_box = QCheckBox("Propagate landmarks to neighbouring images")
+        self.propagate_box.setChecked(self.settings.value("propagate", False, type=bool))
+        self.propagate_box.toggled.connect(lambda checked: self.settings.setValue("propagate", checked))
+        self.v_layout.addWidget(self.propagate_box)
+
+        # virtual camera between the images
+        self.blend_box = QCheckBox("Blend the nearest images")
+        self.blend_box.setChecked(self.settings.value("blending", False, type=bool))
+        self.blend_box.toggled.connect(lambda checked: self.settings.setValue("blending", checked))
+        self.v_layout.addWidget(self.blend_box)
+
+        # current image and its nearest image side by side
+        self.stereo_button = QPushButton("Compare with the nearest image")
+        self.stereo_button.clicked.connect(self.stereo_requested)
+        self.v_layout.addWidget(self.stereo_button)
+
+        # selected landmark on several images at once
+        self.grid_button = QPushButton("Place the selected landmark on several images")
+        self.grid_button.clicked.connect(lambda: self.grid_requested.emit(self.get_selected_landmark()))
+        self.v_layout.addWidget(self.grid_button)
+
         # List of Landmarks
         self.landmarks = QLandmarks(self)
-        self.landmarks.setAlignment(Qt.AlignmentFlag.AlignTop)
         self.v_layout.addWidget(self.landmarks)
 
         self.landmarks.landmark_deleted.connect(self.delete_landmark)
@@ -636,6 +702,10 @@ class CommandsWidget(QWidget):
         self.landmarks.color_changed.connect(self.change_color)
         self.landmarks.landmark_added.connect(self.add_landmark)
 
+        # Curves of semi-landmarks
+        self.curves = QCurves(self)
+        self.v_layout.addWidget(self.curves)
+
         # Distance calculator
 
         self.distance_calculator = DistanceWidget(self)
@@ -648,30 +718,55 @@ class CommandsWidget(QWidget):
 
         self.setLayout(self.v_layout)
 
+    def get_selected_landmark(self):
+        """get the landmark selected in the list
+
+        Returns:
+            int: id of the selected landmark, the first one if none is selected, None if there is none
+        """
+
+        id = self.landmarks.view.currentIndex().data(LandmarksModel.IdRole)
+        if id is None and self.landmarks.model.rowCount() != 0:
+            id = self.landmarks.model.index(0, 0).data(LandmarksModel.IdRole)
+        return id
+
     def import_landmarks(self):
-        landmarks = []
-        max_id = max({i.id for i in self.parent().landmarks}, default=(-1))+1
-        try:
-            landmark_file = QFileInfo(QFileDialog.getOpenFileName(self, "Open landmark File", ".", "JSON (*.json)")[0])
-            landmarks_json = None
-            with open(landmark_file.absoluteFilePath(), "+r") as json_data:
-                landmarks_json = json.load(json_data)["landmarks"]
-                for landmark_id in landmarks_json:
-                    print(landmarks_json[landmark_id])
-                    label = landmarks_json[landmark_id]["label"]
-                    color = QColor(landmarks_json[landmark_id]["color"])
-                    position = tuple(landmarks_json[landmark_id]["position"])
-                    poses = {image:helpers.Pose(pose[0], pose[1]) for image, pose in landmarks_json[landmark_id]["poses"].items()}
-                    landmark = reconstruction.Landmark(id=max_id, label=label, color=color, position=position, poses=poses)
-                    landmarks.append(landmark)
-                    max_id += 1
-            
+        """Import the landmarks of one or several exported JSON files
+        """
+
+        file_names = QFileDialog.getOpenFileNames(self, "Open landmark Files", ".", "JSON (*.json)")[0]
+        self.read_landmarks(file_names)
+
+    def import_folder(self):
+        """Import the landmarks of every JSON file of a folder
+        """
+
+        folder = QFileDialog.getExistingDirectory(self, "Open landmark Folder", ".")
+        if folder.strip():
+            self.read_landmarks([folder])
+
+    def read_landmarks(self, paths : list):
+        """Read landmark files in a worker, the landmarks are imported at once when it's done
+
+        Args:
+            paths (list): files and folders
+        """
+
+        if len(paths) == 0:
+            return
+        self.import_landmark_btn.setEnabled(False)
+        self.import_folder_btn.setEnabled(False)
+        worker = workers.Worker(landmark_store.read_landmark_files, paths)
+        worker.signals.finished.connect(self.landmarks_read)
+        worker.signals.error.connect(lambda e: self.landmarks_read([]))
+        workers.start(worker)
+
+    def landmarks_read(self, landmarks : list[reconstruction.Landmark]):
+        self.import_landmark_btn.setEnabled(True)
+        self.import_folder_btn.setEnabled(True)
+        print(f"Landmarks read : {len(landmarks)}")
+        if len(landmarks) != 0:
             self.landmarks_to_import.emit(landmarks)
-        except Exception as e:
-            print("Import Landmarks failed")
-            print(traceback.format_exc())
-      
-        
     
     def left_clicked(self, key : helpers.Keys):
         self.change_picture.emit(key)
@@ -701,6 +796,11 @@ class Sphere3D(QWidget):
     """Left Size of the Window, Virtual Camera + Angle Values
     """
 
+    # stage of the loading of a project (see GUI.loading)
+    stage_loaded = Signal(str)
+    # ids of the landmarks whose triangulation is done
+    positions_changed = Signal(object)
+
     def __init__(self, calibration : QFileInfo):
         super(Sphere3D, self).__init__()
         self.activated = False
@@ -708,7 +808,22 @@ class Sphere3D(QWidget):
         self._angles_sphere = (0,0) #(180,90)
         self._old_angles = (0,0)
 
+        # shared by the list of landmarks and the distance widget
+        self.landmarks_model = LandmarksModel(self)
+        self.landmarks_model.move_requested.connect(lambda index_and_id: self.move_landmark(*index_and_id))
+        # id -> triangulation job computing its position
+        self.pending_landmarks = dict()
+        self.triangulation_job = 0
+        # image -> id -> (pose, confidence) propagated from the neighbouring images
+        self.suggestions = dict()
+        # fundamental matrices of the pairs of images already opened
+        self.fundamentals = epipolar.FundamentalCache()
+        # projections of the landmarks on the thumbnails shown on the sphere
+        self.projections = projections.ProjectionCache()
         self.init_landmarks()
+        # id -> curve of semi-landmarks, and the triangulation job computing its points
+        self.curves = dict()
+        self.pending_curves = dict()
 
         self.setContentsMargins(5,5,5,5)
 
@@ -724,15 +839,36 @@ class Sphere3D(QWidget):
         self.sphere = _Sphere(self)
         self.sphere.setBackgroundRole(QPalette.ColorRole.Dark)
         self.directory = ""
-        self.calibration_dict = {}
+        self.project = None
+        # image -> (longitude, latitude), distance to the center
         self.images = {}
+        self.image_distances = {}
+        self.image_names = []
+        self.image_index = {}
+        self.image_positions = np.zeros((0, 2))
+        # images at the same distance of the center (or the same focus step) form a shell
+        # nearest image (index in image_names) of every position of the virtual camera, for each shell
+        self.shells = np.zeros(0, dtype=np.int64)
+        self.shell = None
+        self.shell_images = np.zeros(0, dtype=np.int64)
+        self.navigation = None
+        self.prefetcher = None
+        # move of the virtual camera (in degrees), adapted to the density of the images of the shell
+        self.step = 1
+        # positions of the rig of a scAnt acquisition, None if the images aren't named by scAnt
+        self.rig = None
+        # blends the images around the virtual camera, built when first used
+        self.blender = None
+        self.virtual_extrinsics = None
         self.calibration_file = ""
         self.thumbnails = ""
         self.current_image = None
-
-        if calibration is not None:
-            #load last calibration file used
-            self.load(calibration)
+        self.acquisition = None
+        self.journal = None
+        self.loader = None
+        self.grid = None
+        # image -> QImage decoded while loading the project
+        self.thumbnail_cache = dict()
         
         self.sphere.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         self.sphere.setAlignment(Qt.AlignmentFlag.AlignCenter)
@@ -754,7 +890,16 @@ class Sphere3D(QWidget):
         self.commands_widget.change_picture.connect(self.change_picture)
         self.commands_widget.set_picture.connect(self.set_picture)
         self.commands_widget.landmarks_to_import.connect(self.import_landmarks)
+        self.commands_widget.stereo_requested.connect(self.open_stereo_pair)
+        self.commands_widget.grid_requested.connect(self.open_grid)
+        self.commands_widget.blend_box.toggled.connect(lambda checked: self.next_image())
+        self.positions_changed.connect(self.grid_positions_changed)
         self.commands_widget.export.connect(self.export)
+        self.commands_widget.distance_calculator.scale_factor_changed.connect(self.save_scale_factor)
+        self.commands_widget.curves.curve_added.connect(self.add_curve)
+        self.commands_widget.curves.curve_deleted.connect(self.delete_curve)
+        self.commands_widget.curves.label_changed.connect(self.change_curve_label)
+        self.commands_widget.curves.samples_changed.connect(self.change_curve_samples)
 
         self.commands_widget.setSizePolicy(QSizePolicy.Policy.Maximum,QSizePolicy.Policy.MinimumExpanding)
         self.commands_widget.setContentsMargins(0,0,0,0)
@@ -769,167 +914,407 @@ class Sphere3D(QWidget):
         self.setLayout(self.h_layout)
 
         self.setContentsMargins(0,0,0,0)
+
+        if calibration is not None:
+            #load last calibration file used
+            self.load(calibration)
     
     def init_landmarks(self):
         """Creates the first landmark when we open the app
         """
          
-        # Landmark.id -> Landmark
-        self.landmarks = list[reconstruction.Landmark]()
-        self.landmarks.append(reconstruction.Landmark(0, 'Point_0', QColor('blue')))
-        QColor('blue').value()
+        self.landmarks = landmark_store.LandmarkStore()
+        self.landmarks.add(reconstruction.Landmark(0, 'Point_0', QColor('blue')))
+        self.update_landmarks()
     
     def import_landmarks(self, landmarks : list[reconstruction.Landmark]):
-        self.landmarks.extend(landmarks)
-        self.update_landmarks()
+        """Add imported landmarks, the ones whose label is already used are skipped
+
+        Args:
+            landmarks (list): landmarks, they get new ids
+        """
+
+        labels = set(self.landmarks.get_labels())
+        landmarks = [landmark for landmark in landmarks if landmark.label not in labels]
+        next_id = self.landmarks.next_id()
+        for landmark in landmarks:
+            landmark.id = next_id
+            next_id += 1
+        self.landmarks_model.add(landmarks)
+        for landmark in landmarks:
+            self.record(journal.ADD, **landmark.to_dict())
+        # landmarks merged from several files are triangulated with all their poses
+        self.start_triangulation([landmark.id for landmark in landmarks if landmark.position is None and len(landmark.poses) >= 2])
+        self.update_overlay()
+        print(f"Landmarks imported : {len(landmarks)}")
+
+    def load_landmarks(self, landmarks_journal : journal.LandmarkJournal, landmarks : list):
+        """Use the landmarks of the project rebuilt from its snapshot and its journal
+
+        Args:
+            landmarks_journal (journal.LandmarkJournal): journal of the project
+            landmarks (list): landmarks as dicts, None if nothing was ever recorded
+        """
+
+        self.journal = landmarks_journal
+        self.journal.get_snapshot = self.get_landmarks_snapshot
+        if landmarks is None:
+            # New project
+            self.init_landmarks()
+            self.record(journal.ADD, **self.landmarks.get(0).to_dict())
+        else:
+            self.landmarks = landmark_store.LandmarkStore.from_dicts(landmarks)
+            self.update_landmarks()
+            print(f"Landmarks restored : {len(self.landmarks)}")
+        self.update_overlay()
+
+    def get_landmarks_snapshot(self):
+        return self.landmarks.to_dicts()
+
+    def record(self, op, **values):
+        """Record an operation on the landmarks in the journal of the project
+
+        Args:
+            op (str): operation (see scripts.journal)
+        """
+
+        if self.journal is not None:
+            self.journal.append(op, **values)
     
     def load(self, calibration : QFileInfo):
         """load a calibration file into the project
+        The project is loaded in stages in a worker, see load_stage
 
         Args:
             calibration (QFileInfo): calibration file
         """
 
         print("LOAD")
+        self.close_project()
+        self.project = None
+        self.directory = ""
         self.images = {}
-        self.directory = calibration.absolutePath()
-        self.calibration_file = calibration.fileName()
+        self.image_distances = {}
+        self.image_names = []
+        self.image_index = {}
+        self.shells = np.zeros(0, dtype=np.int64)
+        self.shell = None
+        self.navigation = None
+        self.rig = None
+        self.blender = None
         self.current_image = None
-        images_thumbnails = None
-
-        #Load the calibration file as a dict
-        with open(f'{self.directory}/{self.calibration_file}', "r") as f:
-            self.calibration_dict = json.load(f)
-            self.thumbnails = self.calibration_dict["thumbnails"]
-            images_thumbnails = glob.glob(f'{self.directory}/{self.thumbnails}/*')
-        image_calibration = {}
-        intrinsics = np.matrix(self.calibration_dict["intrinsics"]["camera matrix"]["matrix"])
-        distCoeffs = np.matrix(self.calibration_dict["intrinsics"]["distortion matrix"]["matrix"])
-
-        self.w = int(self.calibration_dict["intrinsics"]["width"])
-        self.h = int(self.calibration_dict["intrinsics"]["height"])
-        self.thumb_w = int(self.calibration_dict["thumbnails_width"])
-        self.thumb_h = int(self.calibration_dict["thumbnails_height"])
-        factor = self.thumb_w /  self.w
-        second_factor = self.thumb_h /  self.h
-
-        factor_mat = np.matrix([[factor, 0, 0],[0, second_factor, 0],[0,0,1]])
-        self.intrinsics_thumbnails = factor_mat @ np.matrix(self.calibration_dict["intrinsics"]["camera matrix"]["matrix"])
-        
-        #Compute an approximately estimated center of the sphere of images
-        cx, cy = intrinsics.item(0,2), intrinsics.item(1,2)
-        image_sorted = sorted(images_thumbnails)
-
-        #centers = []
-        directions = []
-        centers_x = []
-        centers_y = []
-        centers_z = [] #centers,  x_y_z
-        for path in image_sorted:
-            file_name = os.path.basename(path)
-            if file_name not in self.calibration_dict["extrinsics"]:
-                #checks if it's an image and if it's calibrated
-                continue
-            mat = np.matrix(self.calibration_dict["extrinsics"][file_name]["matrix"])
-            rotation = mat[0:3, 0:3]
-            trans = mat[0:3, 3]
-            C = converters.get_camera_world_coordinates(rotation, trans)
-            #centers.append(C)
-            directions.append(rotation[2]) # Add Z axis as direction
-            centers_x.append(C.item(0)) # x
-            centers_y.append(C.item(1)) # y
-            centers_z.append(C.item(2)) # z
-            image_calibration[file_name] = C
-
-        _, self.center = reconstruction.sphereFit(centers_x, centers_y, centers_z)
-        #intersect = reconstruction.intersectRays(centers, directions)s
-
-        keys = sorted(image_calibration.keys())
-
-        nbr_img = 0
+        self.thumbnail_cache = dict()
+        self.curves = dict()
+        self.pending_curves = dict()
+        self.suggestions = dict()
+        self.fundamentals.clear()
+        self.projections.clear()
+        self.update_curves()
         self.lowest_lat = float('inf')
         self.highest_lat = -float('inf')
-        for file_name in keys:
-            extrinsics = np.matrix(self.calibration_dict["extrinsics"][file_name]["matrix"])[0:3, 0:4]                   
-            nbr_img += 1
-
-            # compute geographic coordinates and use them as key for the virtual camera
-            C = image_calibration[file_name]
-            vec = C - self.center
-            longitude, latitude = converters.get_long_lat(vec)
-            key = (longitude, latitude) 
-            lat_deg = int(converters.rad2degrees(latitude))+1
-            if lat_deg < self.lowest_lat :
-                self.lowest_lat = lat_deg
-            if lat_deg > self.highest_lat :
-                self.highest_lat = lat_deg
-            self.images[key] = file_name
-
-            rotation = extrinsics[0:3,0:3]
-        
-        print(f"Lowest = {self.lowest_lat}; Highest = {self.highest_lat}")
-        print(f"Number images = {nbr_img}")
+        # landmarks can be changed once they are restored
+        self.commands_widget.setEnabled(False)
+        self.sphere.set_text("Loading...")
+
+        self.loader = workers.ProgressWorker(loading.load_project_stages, calibration.absoluteFilePath(), self._angles_sphere)
+        loader = self.loader
+        self.loader.signals.progress.connect(lambda stage: self.load_stage(loader, stage))
+        self.loader.signals.error.connect(lambda e: self.load_failed(loader, e))
+        workers.start(self.loader)
+
+    def load_stage(self, loader : workers.ProgressWorker, stage : tuple):
+        """Use a stage of the loading of the project
+
+        Args:
+            loader (workers.ProgressWorker): worker that loaded the stage
+            stage (tuple(str, dict)): name of the stage and its values
+        """
+
+        if loader is not self.loader:
+            # another project has been opened since
+            return
+        name, values = stage
+        match name:
+            case loading.PROJECT:
+                self.load_project(values["project"])
+            case loading.NAVIGATION:
+                self.thumbnail_cache.update(values["images"])
+                self.center = values["center"]
+                self.index_images(values["keys"], values["longitudes"], values["latitudes"], values["distances"], values["navigation"])
+                print(f"Lowest = {self.lowest_lat}; Highest = {self.highest_lat}")
+                print(f"Number images = {len(values['keys'])}")
+                self.next_image()
+                print(f"Current image loaded : {self.current_image} wih pos {self._angles_sphere}")
+            case loading.LANDMARKS:
+                self.load_landmarks(values["journal"], values["landmarks"])
+                self.commands_widget.setEnabled(True)
+            case loading.CACHES:
+                self.thumbnail_cache.update(values["images"])
+                self.loader = None
+        print(f"Stage loaded : {name}")
+        self.stage_loaded.emit(name)
+
+    def load_failed(self, loader : workers.ProgressWorker, error : Exception):
+        if loader is not self.loader:
+            return
+        self.loader = None
+        self.sphere.set_text(f"Could not load the project : {error}")
 
+    def load_project(self, loaded_project : project.Project):
+        """Use the project file, before its images are indexed
+
+        Args:
+            loaded_project (project.Project): project
+        """
+
+        self.project = loaded_project
+        self.directory = self.project.directory
+        self.calibration_file = self.project.file_name
+        self.thumbnails = self.project.header["thumbnails"]
+        cameras = self.project.cameras
+
+        self.w = int(self.project.header["intrinsics"]["width"])
+        self.h = int(self.project.header["intrinsics"]["height"])
+        self.thumb_w = int(self.project.header["thumbnails_width"])
+        self.thumb_h = int(self.project.header["thumbnails_height"])
+        # thumbnails of the camera model of the project, the other models have their own (see get_scaled_intrinsics)
+        self.intrinsics_thumbnails = cameras.get_scaled_intrinsics(None, (self.thumb_w, self.thumb_h))
+        self.commands_widget.distance_calculator.set_scale_factor(self.project.get_setting("scale_factor", 1.0))
+        self.curves = {curve.id: curve for curve in map(curves.Curve.from_dict, self.project.get_curves())}
+        self.update_curves()
+
+    def close_project(self):
+        """Stop what is running on the current project and write its pending changes
+        """
+
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+        self.stop_acquisition()
+        if self.grid is not None:
+            self.grid.close()
+            self.grid = None
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.project is not None:
+            self.project.close()
+
+    def save_scale_factor(self, scale_factor):
+        if self.project is not None:
+            self.project.set_setting("scale_factor", scale_factor)
+
+    def index_images(self, file_names, longitudes, latitudes, distances, index=None):
+        """Add images to the virtual camera
+
+        Args:
+            file_names (list): images
+            longitudes (np.ndarray): longitude of each image (in radian)
+            latitudes (np.ndarray): latitude of each image (in radian)
+            distances (np.ndarray): distance of each image to the center of the sphere
+            index (navigation.NavigationIndex, optional): navigation index of the images if they are the only ones. Defaults to None (computed).
+        """
+
+        if len(file_names) == 0:
+            return
+        # geographic coordinates are used as key for the virtual camera
+        lat_deg = np.trunc(np.round(np.degrees(latitudes), 10)).astype(int)+1
+        self.lowest_lat = min(self.lowest_lat, int(lat_deg.min()))
+        self.highest_lat = max(self.highest_lat, int(lat_deg.max()))
+        self.images.update(zip(file_names, zip(np.asarray(longitudes).tolist(), np.asarray(latitudes).tolist())))
+        self.image_distances.update(zip(file_names, np.asarray(distances).tolist()))
+
+        # nearest image of every position of the virtual camera
+        self.image_names = list(self.images.keys())
+        self.image_index = {name: i for i, name in enumerate(self.image_names)}
+        self.image_positions = np.array(list(self.images.values()), dtype=np.float64)
+        previous_shells = self.shells
+        self.shells = navigation.get_shells(self.image_names, np.array([self.image_distances[name] for name in self.image_names]))
+        if index is None or len(self.image_names) != len(file_names):
+            # only the shells with new or moved images are built again
+            index = navigation.build_index(self.image_positions[:, 0], self.image_positions[:, 1], self.shells,
+                                           self.navigation, previous_shells, [self.image_index[name] for name in file_names])
+        self.navigation = index
+        if self.current_image in self.image_index:
+            # new images can come between the shells
+            self.shell = int(self.shells[self.image_index[self.current_image]])
+        else:
+            self.shell = navigation.get_default_shell(self.shells)
+        self.index_shell()
+
+    def index_shell(self):
+        """Index the images of the current shell for the moves on the rig and the blending
+        """
+
+        self.shell_images = np.flatnonzero(self.shells == self.shell)
+        self.step = self.navigation.get_step(self.shell)
+        # the blended frames and the virtual camera depend on the distance of the shell
+        self.blender = None
+        self.virtual_extrinsics = None
+        self.rig = scant.GridIndex.from_names([self.image_names[i] for i in self.shell_images])
+        if self.rig is not None:
+            self.rig.reconcile(self.image_positions[self.shell_images, 0], self.image_positions[self.shell_images, 1])
+
+    def get_nbr_shells(self) -> int:
+        return self.navigation.get_nbr_shells() if self.navigation is not None else 0
+
+    def set_shell(self, shell : int):
+        """Move the virtual camera to another shell of images, keeping its direction
+
+        Args:
+            shell (int): shell, 0 is the nearest to the center
+        """
+
+        shell = max(0, min(shell, self.get_nbr_shells() - 1))
+        if self.shell is None or shell == self.shell:
+            return
+        self.shell = shell
+        self.index_shell()
+        # only the thumbnails of the current shell are kept
+        self.thumbnail_cache = {name: image for name, image in self.thumbnail_cache.items() if name in self.image_index and self.shells[self.image_index[name]] == shell}
+        self.prefetch_thumbnails()
+        self._sphere_values._trigger_refresh()
         self.next_image()
 
-        print(f"Current image loaded : {self.current_image} wih pos {self._angles_sphere}")
+    def prefetch_thumbnails(self):
+        """Decode the thumbnails of the current shell around the virtual camera, in the background
+        """
 
-        self.init_landmarks()
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        closest = navigation.get_closest(self.image_positions[self.shell_images, 0], self.image_positions[self.shell_images, 1],
+                                         *self._angles_sphere, PREFETCH_SIZE)
+        names = [self.image_names[self.shell_images[i]] for i in closest if self.image_names[self.shell_images[i]] not in self.thumbnail_cache]
+        self.prefetcher = workers.ProgressWorker(loading.load_thumbnails, f"{self.directory}/{self.thumbnails}", names)
+        prefetcher, shell = self.prefetcher, self.shell
+        self.prefetcher.signals.progress.connect(lambda thumbnail: self.thumbnail_prefetched(prefetcher, shell, *thumbnail))
+        workers.start(self.prefetcher)
+
+    def thumbnail_prefetched(self, prefetcher : workers.ProgressWorker, shell : int, name : str, image : QImage):
+        if prefetcher is not self.prefetcher or shell != self.shell:
+            return
+        self.thumbnail_cache[name] = image
+
+    def wheelEvent(self, event: QWheelEvent) -> None:
+        if self.get_nbr_shells() <= 1:
+            return super(Sphere3D, self).wheelEvent(event)
+        # zoom in : nearer shell
+        delta = event.angleDelta().y()
+        if delta != 0:
+            self.set_shell(self.shell - 1 if delta > 0 else self.shell + 1)
+        event.accept()
+
+    def add_images(self, extrinsics : dict):
+        """Add new or recalibrated images to the project without reloading it
+        The center of the sphere is kept
+
+        Args:
+            extrinsics (dict): image -> extrinsic matrix
+        """
+
+        cameras = self.project.cameras
+        for file_name, matrix in extrinsics.items():
+            # a recalibrated image replaces its old position
+            cameras.set_extrinsics(file_name, matrix)
+            self.projections.pixels.pop(file_name, None)
+            print(f"Image added : {file_name}")
+        self.fundamentals.clear()
+        file_names = list(extrinsics.keys())
+        centers = np.array([cameras.get_center(file_name) for file_name in file_names])
+        longitudes, latitudes = converters.get_long_lat_array(centers - self.center.reshape(3))
+        self.index_images(file_names, longitudes, latitudes, np.linalg.norm(centers - self.center.reshape(3), axis=1))
+        self.next_image()
+
+    def start_acquisition(self, extrinsics_file : str):
+        """Watch the data folder of a running acquisition
+
+        Args:
+            extrinsics_file (str): extrinsics file written by the rig
+        """
+
+        self.stop_acquisition()
+        self.acquisition = acquisition.AcquisitionWatcher(self.directory, self.thumbnails, (self.thumb_w, self.thumb_h), extrinsics_file, self.project.cameras.to_dict())
+        self.acquisition.images_ready.connect(self.add_images)
+
+    def stop_acquisition(self):
+        """Stop watching the data folder and save the images added to the project
+        """
+
+        if self.acquisition is None:
+            return
+        self.acquisition.stop()
+        self.acquisition = None
+        self.save_project()
+        # the next opening reads the index of the new images from its cache
+        workers.start(workers.Worker(loading.save_navigation, loading.make_navigation_snapshot(self.project)))
+
+    def save_project(self):
+        """Save the project file
+        """
+
+        self.project.save()
 
     def delete_landmark(self, id):
         """Deletes landmark
-        TODO : Use a ModelView architecture for landmarks
+
         Args:
             id (int): Id of the landmark to delete
         """
-        print(self.landmarks)
-        print(id)
-        print(self.landmarks[1].id)
-        self.landmarks.remove(id)
-        self.update_landmarks()
+
+        self.pending_landmarks.pop(id, None)
+        self.discard_suggestions(id)
+        self.landmarks_model.delete(id)
+        self.record(journal.DELETE, id=id)
+        self.projections.invalidate([id])
+        self.update_overlay()
     
     def reset_landmark(self, id):
         """Resets landmark
-        TODO : Use a ModelView architecture for landmarks
+
         Args:
             id (int): Id of the landmark to delete
         """
 
-        index = self.landmarks.index(id)
-        self.landmarks[index].reset_landmark()
-        self.update_landmarks()
+        if self.pending_landmarks.pop(id, None) is not None:
+            self.landmarks_model.set_pending([id], False)
+        self.discard_suggestions(id)
+        self.landmarks_model.reset(id)
+        self.record(journal.RESET, id=id)
+        self.projections.invalidate([id])
+        self.update_overlay()
     
     def change_label(self, id_and_text):
         """Change the label of the landmark
-        TODO : Use a ModelView architecture for landmarks
+
         Args:
             id_and_text (tuple(int, string)): id, new label
         """
 
         id, text = id_and_text[0], id_and_text[1]
-        index = self.landmarks.index(id)
-        self.landmarks[index].set_label(text)
+        self.landmarks_model.set_label(id, text)
+        self.record(journal.LABEL, id=id, label=text)
     
     def change_color(self, id_and_color):
         """Change the coloe of the landmark
-        TODO : Use a ModelView architecture for landmarks
+
         Args:
             id_and_text (tuple(int, Qcolor)): id, new coloe
         """
 
         id, color = id_and_color[0], id_and_color[1]
-        index = self.landmarks.index(id)
-        self.landmarks[index].set_color(color)
-        self.update_landmarks()
+        self.landmarks_model.set_color(id, color)
+        self.record(journal.COLOR, id=id, color=color.name())
     
     def add_landmark(self):
         """Add new landmark to the list
-        TODO : Use a ModelView architecture for landmarks
         """
 
-        max_id = max({i.id for i in self.landmarks}, default=(-1))+1
-        self.landmarks.append(reconstruction.Landmark(max_id, f'Point_{max_id}'))
-        self.update_landmarks()
+        max_id = self.landmarks.next_id()
+        self.landmarks_model.add([reconstruction.Landmark(max_id, f'Point_{max_id}')])
+        self.record(journal.ADD, **self.landmarks.get(max_id).to_dict())
     
     def move_landmark(self, index, id):
         """move landmark to new index 
@@ -939,50 +1324,125 @@ class Sphere3D(QWidget):
             id (int): id of landmark
         """
 
-        old_index = self.landmarks.index(id)
-        
-        landmark = self.landmarks.pop(old_index)
-        self.landmarks.insert(index, landmark)
+        self.landmarks_model.move(id, index)
+        self.record(journal.MOVE, id=id, index=index)
         
 
     def update_landmarks(self):
-        """Update QLandmarksWidget and DistanceWidget
+        """Show the landmarks of the store in the views (the whole list is reset)
+        """
+
+        self.pending_landmarks = dict()
+        self.landmarks_model.set_store(self.landmarks)
+        self.projections.clear()
+    
+    def update_curves(self):
+        self.commands_widget.curves.set_curves(list(self.curves.values()))
+
+    def save_curves(self):
+        """Show the curves and keep them in the state of the project
+        """
+
+        self.update_curves()
+        if self.project is not None:
+            self.project.set_curves([curve.to_dict() for curve in self.curves.values()])
+
+    def add_curve(self, samples : int):
+        """Add a curve of semi-landmarks
+
+        Args:
+            samples (int): number of points of the curve
+        """
+
+        id = max(self.curves, default=-1) + 1
+        self.curves[id] = curves.Curve(id, f"Curve_{id}", samples=samples)
+        self.save_curves()
+
+    def delete_curve(self, id):
+        if id in self.curves:
+            del self.curves[id]
+            self.pending_curves.pop(id, None)
+            self.save_curves()
+
+    def change_curve_label(self, id_and_text):
+        id, text = id_and_text
+        if id in self.curves:
+            self.curves[id].label = text
+            self.save_curves()
+
+    def change_curve_samples(self, id_and_samples):
+        id, samples = id_and_samples
+        if id in self.curves and self.curves[id].samples != samples:
+            self.curves[id].samples = samples
+            self.save_curves()
+            self.triangulate_curves([id])
+
+    def triangulate_curves(self, ids : list):
+        """Triangulate curves in a worker, a newer job makes the results outdated
+
+        Args:
+            ids (list): ids of the curves
+        """
+
+        self.triangulation_job += 1
+        job = self.triangulation_job
+        snapshot = curves.make_snapshot(self.project.cameras, [self.curves[id] for id in ids])
+        for id in ids:
+            self.pending_curves[id] = job
+
+        worker = workers.Worker(curves.triangulate_snapshot, snapshot)
+        worker.signals.finished.connect(lambda results: self.curves_triangulated(job, results))
+        worker.signals.error.connect(lambda e: self.curves_triangulated(job, dict()))
+        workers.start(worker)
+
+    def curves_triangulated(self, job : int, results : dict):
+        """Use the points computed by a triangulation worker
+
+        Args:
+            job (int): job of the worker
+            results (dict): id -> (points, mean reprojection error on each image)
         """
 
-        self.commands_widget.landmarks.load_landmarks(self.landmarks)
-        self.commands_widget.distance_calculator.load_landmarks(self.landmarks)
+        for id, (points, errors) in results.items():
+            if self.pending_curves.get(id) != job or id not in self.curves:
+                # outdated or deleted
+                continue
+            del self.pending_curves[id]
+            self.curves[id].points = points
+            if len(errors) != 0:
+                print(f"{self.curves[id].label} error: {sum(errors)/len(errors)}")
+        self.save_curves()
     
     def get_nearest_image(self, pos):
-        """gets the 
+        """gets the nearest image of a position of the virtual camera
 
         Args:
-            pos (np.array): the position of the virtual camera (longitude and latitude)
+            pos (tuple(float, float)): the position of the virtual camera (longitude and latitude in degrees)
 
         Returns:
             string: the image path
         """
 
-        best_angle = float('inf')
-        best_pos = None
-        rad_pos = (converters.degrees2rad(pos[0]), converters.degrees2rad(pos[1]))
-        for img_pos in self.images.keys():
-            sinus = math.sin(img_pos[1]) * math.sin(rad_pos[1])
-            cosinus = math.cos(img_pos[1]) * math.cos(rad_pos[1])* math.cos(abs(img_pos[0]-rad_pos[0]))
-            cent_angle = math.acos(sinus + cosinus)
-            if cent_angle < best_angle:
-                best_angle = cent_angle
-                best_pos = img_pos
-        return self.images[best_pos]
-    
-    def next_image(self):
+        return self.image_names[self.navigation.get_nearest(self.shell, pos[0], pos[1])]
+
+    def next_image(self, image : str = None):
         """Updates the image on the sphere
+
+        Args:
+            image (str, optional): image to show. Defaults to None (the nearest image of the virtual camera).
         """
 
-        self.current_image = self.get_nearest_image(self._angles_sphere)
+        if len(self.images) == 0:
+            # not loaded yet
+            return
+        self.current_image = image if image is not None else self.get_nearest_image(self._angles_sphere)
+        self.virtual_extrinsics = None
+        if self.commands_widget.blend_box.isChecked() and self.show_blended_image():
+            return
         
         '''
         # DEPRECATED Computes the homography matrix for the virtual camera
-        extrinsics = np.matrix(self.calibration_dict["extrinsics"][self.current_image]["matrix"])[0:3, 0:4]
+        extrinsics = self.project.cameras.get_extrinsics(self.current_image)
         extrinsics_dst = self.virtual_camera_extrinsics(extrinsics)
         homography_image = self.homography(extrinsics, extrinsics_dst)
 
@@ -998,8 +1458,52 @@ class Sphere3D(QWidget):
 
         pixmap = QPixmap.fromImage(qImg)'''
 
-        pixmap = QPixmap(f'{self.directory}/{self.thumbnails}/{self.current_image}')
+        if self.current_image in self.thumbnail_cache:
+            pixmap = QPixmap.fromImage(self.thumbnail_cache[self.current_image])
+        else:
+            pixmap = QPixmap(f'{self.directory}/{self.thumbnails}/{self.current_image}')
         self.sphere.set_image(pixmap)
+        self.update_overlay()
+
+    def show_blended_image(self) -> bool:
+        """Show the images around the virtual camera blended
+
+        Returns:
+            bool: False if the virtual camera is in a hole of the sphere of images
+        """
+
+        if self.blender is None:
+            from scripts import blending
+            self.blender = blending.ViewBlender([self.image_names[i] for i in self.shell_images], self.image_positions[self.shell_images, 0], self.image_positions[self.shell_images, 1], self.project.cameras, self.intrinsics_thumbnails,
+                                                (self.thumb_w, self.thumb_h), self.center, f"{self.directory}/{self.thumbnails}")
+        result = self.blender.render(*self._angles_sphere)
+        if result is None:
+            return False
+        frame, self.virtual_extrinsics = result
+        height, width, _ = frame.shape
+        self.sphere.set_image(QPixmap.fromImage(QImage(frame.data, width, height, 3 * width, QImage.Format.Format_RGB888)))
+        self.update_overlay()
+        return True
+
+    def update_overlay(self):
+        """Show the triangulated landmarks on the current thumbnail
+        """
+
+        if self.project is None or self.current_image is None:
+            return
+        if self.virtual_extrinsics is not None:
+            # blended view, the poses of the nearest image aren't shown
+            # the views change with every move, they are projected without cache
+            ids, positions = self.landmarks.get_positions()
+            pixels = reconstruction.project_points_array(positions, self.intrinsics_thumbnails, self.virtual_extrinsics).tolist() if len(ids) != 0 else []
+            self.sphere.set_overlay([(x, y, self.landmarks.get_color(id)) for id, (x, y) in zip(ids, pixels)], [])
+            return
+        cameras = self.project.cameras
+        pixels = self.projections.get(cameras, cameras.get_scaled_intrinsics(self.current_image, (self.thumb_w, self.thumb_h)), self.current_image, self.landmarks)
+        factor_x, factor_y = cameras.get_scale(self.current_image, (self.thumb_w, self.thumb_h))
+        poses = self.landmarks.get_image_poses(self.current_image)
+        self.sphere.set_overlay([(x, y, self.landmarks.get_color(id)) for id, (x, y) in pixels.items()],
+                                [(pose.x * factor_x, pose.y * factor_y, self.landmarks.get_color(id)) for id, pose in poses.items()])
 
     def virtual_camera_extrinsics(self, extrinsics):
         """Deprecated Computes the virtual camera extrinsics
@@ -1093,6 +1597,20 @@ class Sphere3D(QWidget):
         difference = max - min
         return ((difference + old_angle-min - move) % difference) + min
 
+    def snap_angle(self, angle : float):
+        """Round an angle to the step of the virtual camera
+
+        Args:
+            angle (float): angle (in degrees)
+
+        Returns:
+            int | float: multiple of the step, an integer when the step is one degree
+        """
+
+        if self.step >= 1:
+            return int(round(angle))
+        return round(round(angle / self.step) * self.step, 6)
+
     def get_new_angle(self, new_pos):
         """Compute new postion of the virtual camera
 
@@ -1100,26 +1618,38 @@ class Sphere3D(QWidget):
             new_pos (QPoint): position of the mouse
 
         Returns:
-            tuple(int, int): new longitude and latitude angles
+            tuple(float, float): new longitude and latitude angles
         """
         
         #horizontal -180 -> 179, vertical -90 -> 90
-        x = self.get_next_angle(self._old_angles[0], int((new_pos.x() - self.last_pos.x())/2), -180, 180)
+        x = self.snap_angle(self.get_next_angle(self._old_angles[0], self.snap_angle((new_pos.x() - self.last_pos.x())/2), -180, 180))
         # ((360 + self._old_angles[0]+180 + int((self.last_pos.x()-new_pos.x())/2)) % 360) - 180 # +180 to go back to 0-359 and -180 at the end
-        y = max(self.lowest_lat, min(self._old_angles[1] + int((new_pos.y() - self.last_pos.y())/2), self.highest_lat))
+        y = self.snap_angle(max(self.lowest_lat, min(self._old_angles[1] + self.snap_angle((new_pos.y() - self.last_pos.y())/2), self.highest_lat)))
         
         return (x,y)
         
-    def move_arrow(self, key: helpers.Arrows):
+    def move_arrow(self, key: helpers.Arrows, rig : bool = False):
         """Move the virtual camera by using your key arrows
 
         Args:
             key (helpers.Arrows): key that has been pressed + the corresponding move
+            rig (bool, optional): move to the next position of the rig (scAnt acquisitions). Defaults to False (one step).
         """
 
         move = self.move_from_arrow[key.value]
-        x = self.get_next_angle(self._old_angles[0], move[0], -180, 180)
-        y = max(self.lowest_lat, min((self._old_angles[1] + move[1]), self.highest_lat))
+        if rig and self.rig is not None and self.current_image is not None:
+            # same directions as the moves of one degree
+            image = self.rig.get_neighbour(self.current_image, -move[0], move[1])
+            if image is None:
+                return
+            longitude, latitude = np.degrees(self.image_positions[self.image_index[image]])
+            self._angles_sphere = (self.snap_angle(longitude), self.snap_angle(latitude))
+            self._sphere_values._trigger_refresh()
+            self.next_image(image)
+            self._old_angles = (self._angles_sphere[0], self._angles_sphere[1])
+            return
+        x = self.snap_angle(self.get_next_angle(self._old_angles[0], move[0] * self.step, -180, 180))
+        y = self.snap_angle(max(self.lowest_lat, min((self._old_angles[1] + move[1] * self.step), self.highest_lat)))
         self._angles_sphere = (x, y)
         self._sphere_values._trigger_refresh()
         self.next_image()
@@ -1132,9 +1662,7 @@ class Sphere3D(QWidget):
             key (helpers.Keys): key pressed
         """
 
-        self.calibration_dict["commands"][key.name] = self._angles_sphere
-        with open(f"{self.directory}/{self.calibration_file}", "w") as f_to_write:
-            json.dump(self.calibration_dict, f_to_write)
+        self.project.set_command(key.name, self._angles_sphere)
 
     def change_picture(self, key: helpers.Keys):
         """Move to the shortcut picture asked
@@ -1143,7 +1671,7 @@ class Sphere3D(QWidget):
             key (helpers.Keys): key pressed
         """
 
-        self._angles_sphere = self.calibration_dict["commands"][key.name]
+        self._angles_sphere = self.project.get_commands()[key.name]
         self._sphere_values._trigger_refresh()
         self.next_image()
         self._old_angles = (self._angles_sphere[0], self._angles_sphere[1])
@@ -1168,6 +1696,9 @@ class Sphere3D(QWidget):
             ev (QMouseEvent): event
         """
 
+        if ev.button() == Qt.MouseButton.LeftButton and ev.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            self.place_on_sphere(ev.position())
+            return
         self.activated = True
         self.last_pos = ev.pos()
         self._old_angles = (self._angles_sphere[0], self._angles_sphere[1])
@@ -1183,6 +1714,60 @@ class Sphere3D(QWidget):
         self.last_pos = None
         self._old_angles = (self._angles_sphere[0], self._angles_sphere[1])
 
+    def place_on_sphere(self, pos : QPointF):
+        """Place the selected landmark on the current image where the thumbnail was clicked
+        The pose is refined in the background on the full image if a refinement is chosen
+
+        Args:
+            pos (QPointF): click on the sphere widget
+        """
+
+        if self.journal is None or self.current_image is None:
+            return
+        if self.virtual_extrinsics is not None:
+            print("Landmarks can't be placed on blended images")
+            return
+        pixel = self.sphere.to_pixmap(self.sphere.mapFrom(self, pos))
+        id = self.commands_widget.get_selected_landmark()
+        if pixel is None or id is None:
+            return
+        image = self.current_image
+        # thumbnail -> full image
+        factor_x, factor_y = self.project.cameras.get_scale(image, (self.thumb_w, self.thumb_h))
+        pose = helpers.Pose(pixel[0] / factor_x, pixel[1] / factor_y)
+        self.triangulate_landmarks([{"id": id, "pose": pose}], image)
+        self.update_overlay()
+
+        from scripts import refinement
+        method = self.commands_widget.settings.value("refinement", refinement.NONE)
+        if method not in refinement.METHODS or method == refinement.NONE:
+            return
+        # the window covers at least one pixel of the thumbnail
+        radius = max(refinement.RADIUS, math.ceil(1 / factor_x))
+        worker = workers.Worker(refinement.refine_file, f"{self.directory}/{image}", pose.x, pose.y, method, radius)
+        worker.signals.finished.connect(lambda result: self.pose_refined(id, image, pose, result))
+        worker.signals.error.connect(lambda e: print(f"Refinement failed : {e}"))
+        workers.start(worker)
+
+    def pose_refined(self, id, image : str, pose : helpers.Pose, result : tuple):
+        """Use a pose refined on the full image, unless the pose was changed in the meantime
+
+        Args:
+            id (int): id of the landmark
+            image (str): image of the pose
+            pose (helpers.Pose): pose placed on the thumbnail
+            result (tuple): refined x, y and quality
+        """
+
+        x, y, quality = result
+        current = self.landmarks.get_pose(id, image) if id in self.landmarks else None
+        if quality is None or current is None or current.to_array() != pose.to_array() or (x, y) == (pose.x, pose.y):
+            return
+        print(f"Pose refined on {image} : ({x:.2f}, {y:.2f}), quality {quality:.2f}")
+        self.triangulate_landmarks([{"id": id, "pose": helpers.Pose(x, y)}], image)
+        if image == self.current_image:
+            self.update_overlay()
+
     def export(self):
         """Export landmarks
         """
@@ -1210,22 +1795,22 @@ class Sphere3D(QWidget):
 
         json_dict = dict()
         
-        centroid_x = []
-        centroid_y = []
-        centroid_z = []
         scale_factor = self.commands_widget.distance_calculator.scale_factor
         
         json_dict["scale_factor"] = scale_factor
         json_dict["landmarks"] = dict()
 
-        landmarks_with_pos = [landmark for landmark in self.landmarks if landmark.get_position() is not None]
+        ids, _ = self.landmarks.get_positions()
+        landmarks_with_pos = [self.landmarks.get(id) for id in ids]
+
+        curves_with_points = [curve for curve in self.curves.values() if curve.points is not None]
 
-        if len(landmarks_with_pos) == 0:
+        if len(landmarks_with_pos) == 0 and len(curves_with_points) == 0:
             print("Export cancelled")
             return
 
         # QDialog to get list of landmarks use to compute the centroid
-        list_landmarks_centroid = self.get_list_landmarks_for_centroid(landmarks_with_pos)
+        list_landmarks_centroid = self.get_list_landmarks_for_centroid(landmarks_with_pos) if len(landmarks_with_pos) != 0 else set()
 
         if list_landmarks_centroid is None:
             return
@@ -1241,20 +1826,25 @@ class Sphere3D(QWidget):
                 "poses": dict()
             }
             
-            if landmark.id in list_landmarks_centroid :
-                centroid_x.append(pos[0])
-                centroid_y.append(pos[1])
-                centroid_z.append(pos[2])
-            
             for image, pose in landmark.get_poses().items():
                 if pose is not None:
                     json_dict["landmarks"][landmark.get_id()]["poses"][image] = pose.to_array()
-        if len(centroid_x) > 0:
-            center_x, center_y, center_z = sum(centroid_x)/len(centroid_x), sum(centroid_y)/len(centroid_y), sum(centroid_z)/len(centroid_z)
+        centroid = self.landmarks.get_centroid(list_landmarks_centroid)
+        if centroid is not None:
             json_dict["centroid"] = {
                 "label": "centroid",
                 "color": "#000000", 
-                "position": [center_x, center_y, center_z],
+                "position": centroid.tolist(),
+            }
+
+        # semi-landmarks of the curves, in order along each curve
+        json_dict["curves"] = dict()
+        for curve in curves_with_points:
+            json_dict["curves"][curve.id] = {
+                "label": curve.label,
+                "color": curve.color.name(),
+                "points": curve.points.tolist(),
+                "polylines": {image: [pose.to_array() for pose in polyline] for image, polyline in curve.polylines.items()}
             }
         
         if len(file_name.strip()) != 0:
@@ -1265,21 +1855,23 @@ class Sphere3D(QWidget):
         """Export points into a csv
         """
 
+        import pandas as pd
+
         df = pd.DataFrame(columns=["Color", "X", "Y", "Z", "X_adjusted", "Y_adjusted", "Z_adjusted"])
         df.rename_axis("Label")
-        centroid_x = []
-        centroid_y = []
-        centroid_z = []
         scale_factor = self.commands_widget.distance_calculator.scale_factor
 
-        landmarks_with_pos = [landmark for landmark in self.landmarks if landmark.get_position() is not None]
+        ids, _ = self.landmarks.get_positions()
+        landmarks_with_pos = [self.landmarks.get(id) for id in ids]
+
+        curves_with_points = [curve for curve in self.curves.values() if curve.points is not None]
 
-        if len(landmarks_with_pos) == 0:
+        if len(landmarks_with_pos) == 0 and len(curves_with_points) == 0:
             print("Export cancelled")
             return
 
         # QDialog to get list of points use to compute the centroid
-        list_landmarks_centroid = self.get_list_landmarks_for_centroid(landmarks_with_pos)
+        list_landmarks_centroid = self.get_list_landmarks_for_centroid(landmarks_with_pos) if len(landmarks_with_pos) != 0 else set()
 
         if list_landmarks_centroid is None:
             return
@@ -1288,13 +1880,15 @@ class Sphere3D(QWidget):
             pos = landmark.get_position()
             
             df.loc[landmark.get_label()] = [landmark.get_color().name(), pos[0], pos[1], pos[2], pos[0]*scale_factor, pos[1]*scale_factor, pos[2]*scale_factor]
-            if landmark.id in list_landmarks_centroid :
-                centroid_x.append(pos[0])
-                centroid_y.append(pos[1])
-                centroid_z.append(pos[2])
-        if len(centroid_x) > 0:
-            center_x, center_y, center_z = sum(centroid_x)/len(centroid_x), sum(centroid_y)/len(centroid_y), sum(centroid_z)/len(centroid_z)
+        centroid = self.landmarks.get_centroid(list_landmarks_centroid)
+        if centroid is not None:
+            center_x, center_y, center_z = centroid.tolist()
             df.loc["centroid"] = ["#000000", center_x, center_y, center_z, center_x*scale_factor, center_y*scale_factor, center_z*scale_factor]
+
+        # semi-landmarks of the curves, labelled with their index along the curve
+        for curve in curves_with_points:
+            for index, (x, y, z) in enumerate(curve.points.tolist()):
+                df.loc[f"{curve.label}_{index}"] = [curve.color.name(), x, y, z, x*scale_factor, y*scale_factor, z*scale_factor]
         
         
         if len(file_name.strip()) != 0:
@@ -1331,94 +1925,313 @@ class Sphere3D(QWidget):
         """Shows picture and allows to put landmarks on it
         """
 
-        intrinsics = np.matrix(self.calibration_dict["intrinsics"]["camera matrix"]["matrix"])
-        distCoeffs = np.matrix(self.calibration_dict["intrinsics"]["distortion matrix"]["matrix"])
-        extrinsics = np.matrix(self.calibration_dict["extrinsics"][self.current_image]["matrix"])
-        extrinsics = extrinsics[0:3, 0:4]
+        if self.journal is None:
+            # landmarks not restored yet
+            return
+        intrinsics = self.project.cameras.get_intrinsics(self.current_image)
+        distCoeffs = self.project.cameras.get_dist_coeffs(self.current_image)
+        extrinsics = self.project.cameras.get_extrinsics(self.current_image)
+
+        # reprojection of all the triangulated landmarks at once
+        ids, positions = self.landmarks.get_positions()
+        reprojections = dict(zip(ids, reconstruction.project_points_array(positions, intrinsics, extrinsics, distCoeffs).tolist())) if len(ids) != 0 else dict()
+        image_poses = self.landmarks.get_image_poses(self.current_image)
+        landmarks = [{"id": id,
+                      "label": self.landmarks.get_label(id),
+                      "pose": image_poses.get(id),
+                      "color": self.landmarks.get_color(id),
+                      "position": helpers.Pose(*reprojections[id]) if id in reprojections else None} for id in self.landmarks.get_ids()]
+        # propagated poses are suggested with their confidence, they become poses once accepted
+        suggestions = self.suggestions.get(self.current_image, {})
+        for landmark in landmarks:
+            if landmark["pose"] is None and landmark["id"] in suggestions:
+                landmark["suggestion"] = suggestions[landmark["id"]]
+        self.add_epipolar_curves(landmarks)
+        # curves are clicked as polylines
+        for curve in self.curves.values():
+            reprojection = reconstruction.project_points_array(curve.points, intrinsics, extrinsics, distCoeffs).tolist() if curve.points is not None else None
+            landmarks.append({"id": curve.id,
+                              "label": curve.label,
+                              "pose": None,
+                              "color": curve.color,
+                              "position": None,
+                              "polyline": list(curve.get_polyline(self.current_image)),
+                              "reprojection": [helpers.Pose(*point) for point in reprojection] if reprojection is not None else None})
+        from GUI import show_picture
 
-        landmarks = [landmark.to_tuple(self.current_image, intrinsics, extrinsics, distCoeffs) for landmark in self.landmarks]
         self.win = show_picture.QImageViewer(f'{self.directory}/{self.current_image}', landmarks, self.window().geometry())
         self.win.setWindowModality(Qt.WindowModality.ApplicationModal)
         self.win.show()
         self.win.closeSignal.connect(self.triangulate_landmarks)
     
-    def triangulate_landmarks(self, landmarks):
-        """Executed when show_picture is closed
-        Triangulate all the possible landmarks and get their positions
+    def add_epipolar_curves(self, landmarks : list):
+        """Add the epipolar curves of the poses of the landmarks not triangulated yet to the entries of the picture viewer
 
         Args:
-            landmarks (_type_): _description_
+            landmarks (list): entries of the landmarks in the picture viewer
         """
 
-        nbr_img = 0
-        mean_error = 0
-        intrinsics = np.matrix(self.calibration_dict["intrinsics"]["camera matrix"]["matrix"])
-        distCoeffs = np.matrix(self.calibration_dict["intrinsics"]["distortion matrix"]["matrix"])
-
+        entries = []
+        sources = []
+        points = []
         for landmark in landmarks:
-            index = self.landmarks.index(landmark["id"])
-            self.landmarks[index].add_pose(self.current_image, landmark["pose"])
-            pos = self.estimate_position(self.landmarks[index])
-            if pos is not None:
-                self.landmarks[index].set_position(pos)
-            if self.landmarks[index].get_position() is not None:
-                poses = self.landmarks[index].get_poses()
-
-                for image in poses:
-                    #Computation of the reprojection error
-                    if poses[image] is None:
-                        continue
-                    position = np.matrix([list(self.landmarks[index].position)])
-                    pose = np.matrix([poses[image].to_array()])
-
-                    extrinsics = np.matrix(self.calibration_dict["extrinsics"][image]["matrix"])
-                    extrinsics = extrinsics[0:3, 0:4]
-                    
-                    projections = reconstruction.project_points(position, intrinsics, extrinsics, distCoeffs).reshape((1,2))
-                    error = cv.norm(pose, projections, cv.NORM_L2)/len(projections)
-                    mean_error += error
-                    nbr_img += 1
-        if nbr_img != 0:
-            print(f"total error: {mean_error/nbr_img}")
-        
-        self.update_landmarks()
+            if landmark["pose"] is not None or landmark["position"] is not None:
+                continue
+            for image, pose in self.landmarks.get_poses(landmark["id"]).items():
+                if pose is not None and image != self.current_image:
+                    entries.append(landmark)
+                    sources.append(image)
+                    points.append(pose.to_array())
+        if len(entries) == 0:
+            return
 
-        
-    
-    def estimate_position(self, landmark: reconstruction.Landmark):
-        """Triangulate a landmark
+        cameras = self.project.cameras
+        fundamentals = self.fundamentals.get(cameras, sources, self.current_image)
+        intrinsics_src, distortion_src = cameras.gather(sources)
+        epipolar_curves = epipolar.get_epipolar_curves(np.array([fundamentals[image] for image in sources]), np.array(points), intrinsics_src, distortion_src,
+                                                       cameras.get_intrinsics(self.current_image), cameras.get_dist_coeffs(self.current_image), *self.get_image_size(self.current_image))
+        for landmark, curve in zip(entries, epipolar_curves):
+            if len(curve) >= 2:
+                landmark.setdefault("epipolar", []).append([helpers.Pose(x, y) for x, y in curve.tolist()])
+
+    def get_image_size(self, image) -> tuple:
+        """get the size of an image from its camera model, the size of the project if the model does not give it
 
         Args:
-            landmark (reconstruction.Landmark): 3d landmark with all the poses
+            image (str): image
 
         Returns:
-            np.ndarray: the 3D position of the landmark
+            tuple(int, int): width and height
         """
-        poses_no_None = {k:v for (k,v) in landmark.poses.items() if v is not None}
 
-        if len(poses_no_None) <2 :
-            # We need at least 2 landmarks to triangulate
-            return None
-        intrinsics = np.matrix(self.calibration_dict["intrinsics"]["camera matrix"]["matrix"])
-        dist_coeffs = np.matrix(self.calibration_dict["intrinsics"]["distortion matrix"]["matrix"])
-        poses = list(poses_no_None.items())
-        w = int(self.calibration_dict["intrinsics"]["width"])
-        h = int(self.calibration_dict["intrinsics"]["height"])
-        
-        proj_points = []
-        for pose in poses:
-            #  For each landmark, we need to compute the undistorted position on the image
-            image_ext = np.matrix(self.calibration_dict["extrinsics"][pose[0]]["matrix"])
-            image_ext = image_ext[0:3, 0:4]
-            proj_mat = np.matmul(intrinsics, image_ext)
-            img_point = np.matrix([pose[1].to_array()]).T
-            img_point_undistort = reconstruction.undistort_iter(np.array([img_point]).reshape((1,1,2)), intrinsics, dist_coeffs)
-            proj_point = helpers.ProjPoint(proj_mat, img_point_undistort)
-            proj_points.append(proj_point)
-        
-        # Triangulation computation with all the undistorted landmarks
-        landmark_pos = reconstruction.triangulate_point(proj_points)
-        return tuple(landmark_pos)
+        width, height = self.project.cameras.get_size(image)
+        return (width, height) if width > 0 and height > 0 else (self.w, self.h)
+
+    def open_stereo_pair(self):
+        """Shows the current image and its nearest image rectified side by side, landmarks can be placed on both
+        """
+
+        if self.journal is None or self.current_image is None:
+            return
+        from scripts import propagation
+        from GUI import stereo_viewer
+
+        neighbours = propagation.get_nearest_images(self.project.cameras, self.center, self.current_image, 1)
+        if len(neighbours) == 0:
+            return
+        images = [self.current_image, neighbours[0]]
+        landmarks = {image: [{"id": id,
+                              "label": self.landmarks.get_label(id),
+                              "color": self.landmarks.get_color(id),
+                              "pose": self.landmarks.get_pose(id, image)} for id in self.landmarks.get_ids()] for image in images}
+
+        self.stereo = stereo_viewer.QStereoViewer(self.directory, images, self.project.cameras, *self.get_image_size(self.current_image), self.center, landmarks, self.window().geometry())
+        self.stereo.setWindowModality(Qt.WindowModality.ApplicationModal)
+        self.stereo.show()
+        self.stereo.closeSignal.connect(self.stereo_closed)
+
+    def stereo_closed(self, landmarks : dict):
+        """Saves the poses placed in the stereo viewer
+
+        Args:
+            landmarks (dict): image -> id and pose of each landmark
+        """
+
+        for image, entries in landmarks.items():
+            self.triangulate_landmarks(entries, image)
+
+    def open_grid(self, id):
+        """Shows a landmark on the current image and its nearest images at once,
+        each click on an image places the landmark and triangulates it again
+
+        Args:
+            id (int): id of the landmark
+        """
+
+        if self.journal is None or self.current_image is None:
+            return
+        if id is None:
+            return
+        from scripts import propagation
+        from GUI import grid_viewer
+
+        images = [self.current_image] + propagation.get_nearest_images(self.project.cameras, self.center, self.current_image, grid_viewer.NBR_VIEWS - 1)
+        landmark = {"id": id,
+                    "label": self.landmarks.get_label(id),
+                    "color": self.landmarks.get_color(id),
+                    "poses": self.landmarks.get_poses(id),
+                    "position": self.landmarks.get_position(id)}
+
+        if self.grid is not None:
+            self.grid.close()
+        self.grid = grid_viewer.QGridViewer(self.directory, images, self.project.cameras, (self.w, self.h), landmark, self.window().geometry())
+        self.grid.pose_placed.connect(lambda image_and_pose: self.triangulate_landmarks([{"id": id, "pose": image_and_pose[1]}], image_and_pose[0]))
+        self.grid.show()
+
+    def grid_positions_changed(self, ids : list):
+        if self.grid is None or not self.grid.isVisible():
+            return
+        id = self.grid.landmark["id"]
+        if id in ids and id in self.landmarks:
+            self.grid.set_position(self.landmarks.get_position(id))
+
+    def triangulate_landmarks(self, landmarks, image=None):
+        """Executed when show_picture is closed
+        Saves the poses of the image and triangulates the landmarks that changed in a worker
+
+        Args:
+            landmarks (list): id and pose of each landmark on the image
+            image (str, optional): image of the poses. Defaults to the current image.
+        """
+
+        if image is None:
+            image = self.current_image
+        self.update_curves_polylines([landmark for landmark in landmarks if landmark.get("polyline") is not None])
+        changed = []
+        # poses placed by the user (not accepted propagated ones)
+        placed = dict()
+        for landmark in landmarks:
+            if landmark.get("polyline") is not None:
+                continue
+            id = landmark["id"]
+            if id not in self.landmarks:
+                continue
+            if landmark.get("suggestion") is None:
+                # the suggestion was accepted, rejected or replaced by a pose of the user
+                self.suggestions.get(image, {}).pop(id, None)
+            old_pose = self.landmarks.get_pose(id, image)
+            self.landmarks.set_pose(id, image, landmark["pose"])
+            new_pose = landmark["pose"].to_array() if landmark["pose"] is not None else None
+            if new_pose != (old_pose.to_array() if old_pose is not None else None):
+                self.record(journal.POSE, id=id, image=image, pose=new_pose)
+                changed.append(id)
+                if new_pose is not None and landmark.get("confidence") is None:
+                    placed[id] = landmark["pose"]
+        if len(self.suggestions.get(image, {})) == 0:
+            self.suggestions.pop(image, None)
+        if len(placed) != 0 and self.commands_widget.propagate_box.isChecked():
+            self.propagate_landmarks(placed, image)
+        self.start_triangulation(changed)
+
+    def start_triangulation(self, changed : list):
+        """Triangulate landmarks from their poses in a worker
+
+        Args:
+            changed (list): ids of the landmarks
+        """
+
+        if len(changed) == 0:
+            return
+
+        # the worker gets a copy of the poses, a newer job makes its results outdated
+        self.triangulation_job += 1
+        job = self.triangulation_job
+        snapshot = triangulation.make_snapshot(self.project.cameras, {id: self.landmarks.get_poses(id) for id in changed})
+        for id in changed:
+            self.pending_landmarks[id] = job
+        self.landmarks_model.set_pending(changed, True)
+
+        worker = workers.Worker(triangulation.triangulate_snapshot, snapshot)
+        worker.signals.finished.connect(lambda results: self.triangulation_done(job, results))
+        worker.signals.error.connect(lambda e: self.triangulation_done(job, dict()))
+        workers.start(worker)
+
+    def propagate_landmarks(self, poses : dict, image : str):
+        """Track poses of an image into its nearest images in workers (one by image),
+        the tracked poses are suggested when these images are opened
+
+        Args:
+            poses (dict): id -> helpers.Pose on the image
+            image (str): image of the poses
+        """
+
+        from scripts import propagation
+
+        targets = dict()
+        for target in propagation.get_nearest_images(self.project.cameras, self.center, image):
+            ids = [id for id in poses if self.landmarks.get_pose(id, target) is None]
+            if len(ids) != 0:
+                targets[target] = ids
+        for job in propagation.make_jobs(self.project.cameras, self.center, self.directory, image, poses, targets):
+            worker = workers.Worker(propagation.track_poses, job)
+            worker.signals.finished.connect(lambda results, image=job["image"]: self.poses_propagated(image, results))
+            worker.signals.error.connect(lambda e: print(f"Propagation failed : {e}"))
+            workers.start(worker)
+
+    def poses_propagated(self, image : str, results : dict):
+        """Keep the poses tracked into an image as suggestions
+
+        Args:
+            image (str): image
+            results (dict): id -> (helpers.Pose, confidence)
+        """
+
+        from scripts import propagation
+
+        suggestions = self.suggestions.setdefault(image, dict())
+        for id, (pose, confidence) in results.items():
+            if id in self.landmarks and self.landmarks.get_pose(id, image) is None and confidence >= propagation.MIN_CONFIDENCE:
+                suggestions[id] = (pose, confidence)
+        print(f"Poses propagated to {image} : {len(suggestions)}")
+
+    def discard_suggestions(self, id):
+        for suggestions in self.suggestions.values():
+            suggestions.pop(id, None)
+
+    def update_curves_polylines(self, entries : list):
+        """Saves the polylines of the curves on the current image and triangulates the curves that changed
+
+        Args:
+            entries (list): id and polyline of each curve on the current image
+        """
+
+        changed = []
+        for entry in entries:
+            id = entry["id"]
+            if id not in self.curves:
+                continue
+            curve = self.curves[id]
+            if [pose.to_array() for pose in entry["polyline"]] != [pose.to_array() for pose in curve.get_polyline(self.current_image)]:
+                curve.set_polyline(self.current_image, entry["polyline"])
+                changed.append(id)
+        if len(changed) == 0:
+            return
+        self.save_curves()
+        self.triangulate_curves(changed)
+
+    def triangulation_done(self, job : int, results : dict):
+        """Use the positions computed by a triangulation worker
+
+        Args:
+            job (int): job of the worker
+            results (dict): id -> (position, reprojection errors)
+        """
+
+        errors = []
+        done = []
+        moved = []
+        for id, job_of_landmark in list(self.pending_landmarks.items()):
+            if job_of_landmark != job:
+                # outdated or not part of this job
+                continue
+            del self.pending_landmarks[id]
+            done.append(id)
+            if id not in results or id not in self.landmarks:
+                continue
+            pos, landmark_errors = results[id]
+            if pos is not None:
+                if pos != self.landmarks.get_position(id):
+                    self.record(journal.POSITION, id=id, position=[float(x) for x in pos])
+                    moved.append(id)
+                self.landmarks.set_position(id, pos)
+            errors.extend(landmark_errors)
+        self.landmarks_model.set_pending([id for id in done if id in self.landmarks], False)
+        self.positions_changed.emit(done)
+        if len(moved) != 0:
+            self.projections.invalidate(moved)
+            self.update_overlay()
+        if len(errors) != 0:
+            print(f"total error: {sum(errors)/len(errors)}")
 
 class CentroidMessage(QDialog):
     """Dialog with checkboxes to select landmarks needed for centroid
@@ -1482,6 +2295,8 @@ class CentroidMessage(QDialog):
                 return True
         return False
 
+PROJECT_FILTERS = ["Json Files (*.json)", "Binary Project (*.json)"]
+
 class InitWidget(QWidget):
     """Wiget when a calibration file is not loaded
 
@@ -1517,7 +2332,11 @@ class InitWidget(QWidget):
     def open_project(self):
         """Open a project file
         """
-        dir_ = QFileInfo(QFileDialog.getOpenFileName(self, "Open project File", ".", "JSON (*.json)")[0])
+        file_name = QFileDialog.getOpenFileName(self, "Open project File", ".", "JSON (*.json)")[0]
+        if not file_name.strip():
+            # canceled, keep the current project
+            return
+        dir_ = QFileInfo(file_name)
         self.parent().load_dir(dir_)
         self.parent().stacked_layout.setCurrentIndex(1)
 
@@ -1531,12 +2350,14 @@ class InitWidget(QWidget):
             - a Json file containing the extrinsics
             - the folder containing the thumbnails if it exists
         """
+        from GUI import import_project
+
         dlg = import_project.QImportProject()
         dlg.setWindowModality(Qt.WindowModality.NonModal)
         if dlg.exec():
             self.dir = dlg.dir_image
             self.calib = dlg.calib
-            self.calib_file_name = QFileDialog.getSaveFileName(self, "Save Project File", self.dir+"/.json","Json Files (*.json)")[0]
+            self.calib_file_name, selected_filter = QFileDialog.getSaveFileName(self, "Save Project File", self.dir+"/.json", ";;".join(PROJECT_FILTERS))
             
             if not self.calib_file_name.strip():
                 # canceled
@@ -1551,29 +2372,28 @@ class InitWidget(QWidget):
 
             queue_img_to_make = deque()
             
-            thumb_w = thumb_h = 1000
+            thumb_w = thumb_h = thumbnails.DEFAULT_THUMBNAIL_SIZE
             #sauver les thumbnails
             for key in self.calib["extrinsics"]:
-                if f'{self.dir}/{self.calib["thumbnails"]}/{key}' not in images_thumbnails:
+                if thumbnails.get_thumbnail_path(self.dir, self.calib["thumbnails"], key) not in images_thumbnails:
                     queue_img_to_make.append(key)
                 else:
                     #get dimensions
-                    with Image.open(f'{self.dir}/{self.calib["thumbnails"]}/{key}') as im:
-                        thumb_w = im.width
-                        thumb_h = im.height
+                    thumb_w, thumb_h = thumbnails.get_thumbnail_size(thumbnails.get_thumbnail_path(self.dir, self.calib["thumbnails"], key))
             
             while len(queue_img_to_make) != 0:
                 # TODO : Make a progress bar
                 img = queue_img_to_make.pop()
-                with Image.open(f'{self.dir}/{img}') as im_basic:
-                    im_basic.thumbnail((thumb_w, thumb_h), Image.LANCZOS)
-                    im_basic.save(f'{self.dir}/{self.calib["thumbnails"]}/{img}')
-                    print(f"Saved thumbnail : {img} : {im_basic.width}:{im_basic.height}")
+                thumbnails.make_thumbnail(self.dir, self.calib["thumbnails"], img, (thumb_w, thumb_h))
 
             self.calib["thumbnails_width"] = thumb_w
             self.calib["thumbnails_height"] = thumb_h
-            with open(self.calib_file_name, "w") as f_to_write:
-                json.dump(self.calib, f_to_write)
+            if selected_filter == PROJECT_FILTERS[1]:
+                # Binary project : JSON header + arrays
+                project.save_binary(project.from_json_dict(self.calib_file_name, self.calib), self.calib_file_name)
+            else:
+                with open(self.calib_file_name, "w") as f_to_write:
+                    json.dump(self.calib, f_to_write)
             
             self.parent().load_dir(QFileInfo(self.calib_file_name))
             self.parent().stacked_layout.setCurrentIndex(1)
@@ -1585,20 +2405,19 @@ class ReconstructionWidget(QWidget):
         super(ReconstructionWidget, self).__init__(parent)
 
         self.init_settings()
-        self.dir_images = None
+        # last project, loaded in the background when the widget is built (warm start)
+        self.dir_images = self.get_last_project()
 
         self.parent = parent
         self.setWindowTitle("3D reconstruction")
 
         # import or create json file
         self.init = InitWidget(self)
-        # viewer
-        self.viewer = Sphere3D(self.dir_images)
-        self.viewer.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+        # viewer, built when a project is loaded
+        self._viewer = None
 
         self.stacked_layout = QStackedLayout()
         self.stacked_layout.addWidget(self.init)
-        self.stacked_layout.addWidget(self.viewer)
         self.stacked_layout.setContentsMargins(0,0,0,0)
         # TODO : limit size of viewer to not crash if too big
         #self.setMaximumSize()
@@ -1609,14 +2428,41 @@ class ReconstructionWidget(QWidget):
             self.stacked_layout.setCurrentIndex(0)
         else:
             # Display Sphere
+            self.viewer
             self.stacked_layout.setCurrentIndex(1)
     
+    @property
+    def viewer(self) -> Sphere3D:
+        """Virtual camera, built the first time it is needed
+        """
+
+        if self._viewer is None:
+            self._viewer = Sphere3D(self.dir_images)
+            self._viewer.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+            self.stacked_layout.insertWidget(1, self._viewer)
+        return self._viewer
+
+    def close_project(self):
+        if self._viewer is not None:
+            self._viewer.close_project()
+
     def init_settings(self):
         self.reconstruction_settings = QSettings("Sphaeroptica", "reconstruction")
+
+    def get_last_project(self) -> QFileInfo:
+        """get the last project opened if it still exists
+
+        Returns:
+            QFileInfo: project file, None if there is none
+        """
+
+        directory = self.reconstruction_settings.value("directory")
+        if not directory or not os.path.isfile(directory):
+            return None
+        return QFileInfo(directory)
     
     def load_dir(self, dir : QFileInfo):
         self.viewer.load(dir)
-        self.viewer.update_landmarks()
         self.reconstruction_settings.setValue("directory", dir.absoluteFilePath())
     
     def keyPressEvent(self, keys_pressed: QKeyEvent) -> None:
@@ -1626,12 +2472,12 @@ class ReconstructionWidget(QWidget):
         else:
             # depending on the key pressed, it will throw an exception and ignore it
             self.change_picture(keys_pressed.key())
-            self.move_sphere(keys_pressed.key())
+            self.move_sphere(keys_pressed.key(), bool(modifiers & Qt.KeyboardModifier.ShiftModifier))
     
-    def move_sphere(self, key):
+    def move_sphere(self, key, rig=False):
         try:
             key = helpers.Arrows(key)
-            self.viewer.move_arrow(key)
+            self.viewer.move_arrow(key, rig)
         except Exception as e:
             pass
     
@@ -29,13 +29,14 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
 
+import math
 import cv2 as cv
-from PySide6.QtCore import Qt, Signal, QSettings, QRectF, QRect, QSize
+from PySide6.QtCore import Qt, Signal, QSettings, QRectF, QRect, QSize, QPointF
 from PySide6.QtGui import QImage, QPixmap, QPalette, QPainter, QAction, QMouseEvent, QCloseEvent, QPen, QColor, QKeyEvent
 from PySide6.QtWidgets import (QWidget, QLabel, QSizePolicy, QScrollArea, QMessageBox, QMainWindow, QMenu, QApplication, QScrollBar, QHBoxLayout, 
-                             QVBoxLayout, QPushButton, QSpinBox, QScroller)
+                             QVBoxLayout, QPushButton, QSpinBox, QScroller, QComboBox)
 
-from scripts import helpers
+from scripts import helpers, refinement
 
 INIT_MARKER_WIDTH = 3
 class QImageLabel(QLabel):
@@ -71,7 +72,15 @@ class QImageLabel(QLabel):
             return
         pos = ev.pos()
         pose = helpers.Pose(float(pos.x()), float(pos.y()))
-        self.landmarks[self.window().landmark]["pose"] = pose.scaled(1/self.scaleFactor)
+        landmark = self.landmarks[self.window().landmark]
+        if landmark.get("polyline") is not None:
+            # curve : each click adds a point to its polyline
+            landmark["polyline"].append(pose.scaled(1/self.scaleFactor))
+        else:
+            landmark["pose"] = self.window().refine_pose(pose, self.scaleFactor)
+            # placed by the user, not a propagated pose anymore
+            landmark.pop("confidence", None)
+            landmark.pop("suggestion", None)
         self.set_visible_landmark(self.window().landmark, True)
         self.show_landmark.emit(self.window().landmark)
         self.paint_markers()
@@ -88,7 +97,16 @@ class QImageLabel(QLabel):
             landmark = self.landmarks[index]
             pen.setColor(landmark['color'])
             painter.setPen(pen)
+            if landmark.get("polyline") is not None:
+                self.paint_curve(painter, pen, landmark)
+                continue
             if(landmark["pose"] is None):
+                if landmark.get("suggestion") is not None:
+                    # pose propagated from another image, kept only if accepted (Enter)
+                    self.paint_suggestion(painter, *landmark["suggestion"])
+                    continue
+                if landmark.get("epipolar") is not None:
+                    self.paint_epipolar(painter, pen, landmark["epipolar"])
                 if landmark["position"] is not None:
                     point = landmark["position"].scaled(self.scaleFactor)
                     painter.drawArc(QRectF(point.x, point.y,float(self.marker_scale)/3,float(self.marker_scale)/3), 0, 16*360)
@@ -100,6 +118,62 @@ class QImageLabel(QLabel):
         painter.end()
         self.setPixmap(canvas)
 
+    def paint_suggestion(self, painter : QPainter, pose : helpers.Pose, confidence : float):
+        """Paint a propagated pose, circled with the confidence of the tracking
+
+        Args:
+            painter (QPainter): painter of the canvas
+            pose (helpers.Pose): propagated pose
+            confidence (float): confidence of the tracking
+        """
+
+        point = pose.scaled(self.scaleFactor)
+        painter.drawPoint(int(point.x), int(point.y))
+        radius = 3*self.marker_scale
+        painter.drawEllipse(QRectF(point.x-radius, point.y-radius, 2*radius, 2*radius))
+        painter.drawText(int(point.x+radius), int(point.y-radius), f"{int(100*confidence)}%")
+
+    def paint_epipolar(self, painter : QPainter, pen : QPen, epipolar_curves : list):
+        """Paint the epipolar curves of a landmark placed on other images, it is somewhere on them
+
+        Args:
+            painter (QPainter): painter of the canvas
+            pen (QPen): pen with the color of the landmark
+            epipolar_curves (list): points of each curve
+        """
+
+        line_pen = QPen(pen)
+        line_pen.setWidth(1)
+        line_pen.setStyle(Qt.PenStyle.DashLine)
+        painter.setPen(line_pen)
+        for curve in epipolar_curves:
+            painter.drawPolyline([QPointF(pose.x*self.scaleFactor, pose.y*self.scaleFactor) for pose in curve])
+        painter.setPen(pen)
+
+    def paint_curve(self, painter : QPainter, pen : QPen, curve : dict):
+        """Paint the polyline clicked for a curve, or its reprojection if there is none
+
+        Args:
+            painter (QPainter): painter of the canvas
+            pen (QPen): pen with the color of the curve
+            curve (dict): curve with its polyline and its reprojection
+        """
+
+        polyline = [pose.scaled(self.scaleFactor) for pose in curve["polyline"]]
+        if len(polyline) == 0:
+            if curve.get("reprojection") is not None:
+                points = [pose.scaled(self.scaleFactor) for pose in curve["reprojection"]]
+                for point in points:
+                    painter.drawArc(QRectF(point.x, point.y,float(self.marker_scale)/3,float(self.marker_scale)/3), 0, 16*360)
+            return
+        line_pen = QPen(pen)
+        line_pen.setWidth(max(1, self.marker_scale // 3))
+        painter.setPen(line_pen)
+        painter.drawPolyline([QPointF(point.x, point.y) for point in polyline])
+        painter.setPen(pen)
+        for point in polyline:
+            painter.drawPoint(int(point.x), int(point.y))
+
     def normalSize(self):
         scaled_image = self.image.scaled(self.window().image_area.size() - QSize(2,2), Qt.AspectRatioMode.KeepAspectRatio)
         self.setPixmap(scaled_image)
@@ -275,6 +349,36 @@ class QScaleMarker(QWidget):
     def init_settings(self):
         self.settings = QSettings("Sphaeroptica", "reconstruction") 
 
+class QRefinement(QWidget):
+    """Choice of the refinement of the clicks
+    """
+
+    def __init__(self, parent):
+        super(QRefinement, self).__init__(parent)
+
+        self.init_settings()
+        full_layout = QHBoxLayout()
+
+        self.label = QLabel("Refinement: ", self)
+        self.methods = QComboBox(self)
+        self.methods.addItems(refinement.METHODS)
+        method = self.settings.value("refinement", refinement.NONE)
+        self.methods.setCurrentIndex(refinement.METHODS.index(method) if method in refinement.METHODS else 0)
+        self.methods.currentTextChanged.connect(self.save_value)
+        full_layout.addWidget(self.label)
+        full_layout.addWidget(self.methods)
+        self.setLayout(full_layout)
+        self.setMaximumWidth(250)
+
+    def save_value(self, method):
+        self.settings.setValue("refinement", method)
+
+    def get_value(self):
+        return self.methods.currentText()
+
+    def init_settings(self):
+        self.settings = QSettings("Sphaeroptica", "reconstruction")
+
 class QHideAll(QWidget):
     visibleChanged = Signal(object)
     def __init__(self, parent):
@@ -329,6 +433,8 @@ class QImageViewer(QMainWindow):
         height, width, channel = img.shape
         bytesPerLine = 4 * width
         image = QImage(img.data, width, height, bytesPerLine, QImage.Format.Format_RGBA8888)
+        # full resolution used to refine the clicks
+        self.gray = cv.cvtColor(img, cv.COLOR_RGBA2GRAY)
         if image.isNull():
             QMessageBox.information(self, "Image Viewer", "Cannot load %s." % path_name)
             self.close()
@@ -371,6 +477,8 @@ class QImageViewer(QMainWindow):
         self.scale_point = QScaleMarker(self)
         self.scale_point.valChanged.connect(self.changeScalePoint)
 
+        self.refinement = QRefinement(self)
+
         self.hide_all_button = QHideAll(self)
         self.hide_all_button.visibleChanged.connect(self.changeVisibility)
 
@@ -380,6 +488,7 @@ class QImageViewer(QMainWindow):
         self.points.hidden.connect(self.hide_point)
 
         self.side_bar.addWidget(self.scale_point)
+        self.side_bar.addWidget(self.refinement)
         self.side_bar.addWidget(self.hide_all_button)
         self.side_bar.addWidget(self.points)
 
@@ -392,6 +501,26 @@ class QImageViewer(QMainWindow):
 
         self.normalSize()
 
+    def refine_pose(self, pose : helpers.Pose, scale_factor : float) -> helpers.Pose:
+        """Pose on the full image of a click, refined to sub-pixel precision if a refinement is chosen
+
+        Args:
+            pose (helpers.Pose): click on the scaled image
+            scale_factor (float): scale of the image
+
+        Returns:
+            helpers.Pose: pose on the full image
+        """
+
+        method = self.refinement.get_value()
+        if method == refinement.NONE:
+            return pose.scaled(1/scale_factor)
+        # the window covers at least one pixel of the scaled image
+        radius = max(refinement.RADIUS, math.ceil(1/scale_factor))
+        x, y, quality = refinement.refine(self.gray, pose.x/scale_factor, pose.y/scale_factor, method, radius)
+        self.statusBar().showMessage(f"{method} : ({x:.2f}, {y:.2f}), quality {quality:.2f}")
+        return helpers.Pose(x, y)
+
     def landmark_to_visible(self, val):
         self.points.buttons[val].visible = True
         self.points.buttons[val].hide_button.setText("hide")
@@ -419,7 +548,13 @@ class QImageViewer(QMainWindow):
         self.image_label.paint_markers()
 
     def delete_point(self, index):
-        self.image_label.landmarks[index]["pose"] = None
+        if self.image_label.landmarks[index].get("polyline") is not None:
+            self.image_label.landmarks[index]["polyline"] = []
+        else:
+            self.image_label.landmarks[index]["pose"] = None
+            self.image_label.landmarks[index].pop("confidence", None)
+            # a rejected suggestion
+            self.image_label.landmarks[index].pop("suggestion", None)
         self.image_label.paint_markers()
     
     def update(self):
@@ -514,6 +649,21 @@ class QImageViewer(QMainWindow):
         self.closeSignal.emit(self.image_label.landmarks)
 
     def keyPressEvent(self, ev: QKeyEvent) -> None:
+        if ev.key() in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+            # accept the propagated pose of the selected landmark
+            landmark = self.image_label.landmarks[self.landmark]
+            if landmark.get("suggestion") is not None:
+                landmark["pose"], landmark["confidence"] = landmark.pop("suggestion")
+                self.landmark_to_visible(self.landmark)
+                self.image_label.paint_markers()
+            return
+        if ev.key() == Qt.Key.Key_Backspace:
+            # remove the last point of the polyline of a curve
+            polyline = self.image_label.landmarks[self.landmark].get("polyline")
+            if polyline:
+                polyline.pop()
+                self.image_label.paint_markers()
+            return
         try:
             self.switchPoint(helpers.switch[ev.key()])
         except:
@@ -0,0 +1,254 @@
+# Sphaeroptica - 3D Viewer on calibrated pictures
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import numpy as np
+from PySide6.QtCore import Qt, Signal, QRect, QRectF, QPointF
+from PySide6.QtGui import QImage, QPainter, QPen, QColor, QKeyEvent, QCloseEvent, QMouseEvent, QPaintEvent
+from PySide6.QtWidgets import QWidget, QLabel, QMainWindow, QHBoxLayout, QVBoxLayout, QComboBox, QSizePolicy
+
+from scripts import helpers, rectification
+from GUI import workers
+
+def load_pair(directory : str, images : list, intrinsics, dist_coeffs, extrinsics : list, width : int, height : int, center, progress=None, cancelled=None):
+    """Load the rectification of a pair of images, then rectify them by tiles
+
+    Args:
+        progress (function, optional): gets ("rectification", Rectification) then ("tile", (index, first row, RGB tile))
+        cancelled (function, optional): returns True if the viewer has been closed
+    """
+
+    pair = rectification.load_rectification(directory, images, intrinsics, dist_coeffs, extrinsics, width, height, center)
+    progress(("rectification", pair))
+    rectification.rectify_tiles(pair, directory, lambda tile: progress(("tile", tile)), cancelled)
+
+class QRectifiedPane(QLabel):
+    """Rectified image of a pair, drawn as its tiles arrive, with the landmarks and the epipolar line under the mouse
+    """
+
+    clicked = Signal(object)
+    hovered = Signal(object)
+
+    def __init__(self, parent, index : int):
+        super(QRectifiedPane, self).__init__(parent)
+        self.index = index
+        self.canvas = None
+        self.vertical = False
+        # (color, x, y, selected) on the rectified image
+        self.markers = []
+        self.guide = None
+        self.setMouseTracking(True)
+        self.setMinimumSize(200, 200)
+        self.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
+
+    def set_size(self, size : tuple, vertical : bool):
+        self.canvas = QImage(size[0], size[1], QImage.Format.Format_RGB888)
+        self.canvas.fill(QColor("black"))
+        self.vertical = vertical
+        self.update()
+
+    def set_tile(self, top : int, tile : np.ndarray):
+        """Draw a rectified tile
+
+        Args:
+            top (int): first row of the tile
+            tile (np.ndarray): RGB tile
+        """
+
+        height, width, _ = tile.shape
+        image = QImage(tile.data, width, height, 3 * width, QImage.Format.Format_RGB888)
+        painter = QPainter(self.canvas)
+        painter.drawImage(0, top, image)
+        painter.end()
+        self.update()
+
+    def get_target(self) -> QRectF:
+        # rectangle of the widget where the canvas is drawn (aspect ratio kept)
+        scale = min(self.width() / self.canvas.width(), self.height() / self.canvas.height())
+        width, height = self.canvas.width() * scale, self.canvas.height() * scale
+        return QRectF((self.width() - width) / 2, (self.height() - height) / 2, width, height)
+
+    def to_canvas(self, pos : QPointF):
+        target = self.get_target()
+        scale = target.width() / self.canvas.width()
+        return (pos.x() - target.x()) / scale, (pos.y() - target.y()) / scale
+
+    def paintEvent(self, a0: QPaintEvent) -> None:
+        if self.canvas is None:
+            return super().paintEvent(a0)
+        painter = QPainter(self)
+        target = self.get_target()
+        painter.drawImage(target, self.canvas)
+        scale = target.width() / self.canvas.width()
+        if self.guide is not None:
+            painter.setPen(QPen(QColor("yellow"), 1, Qt.PenStyle.DashLine))
+            if self.vertical:
+                x = target.x() + self.guide * scale
+                painter.drawLine(QPointF(x, target.top()), QPointF(x, target.bottom()))
+            else:
+                y = target.y() + self.guide * scale
+                painter.drawLine(QPointF(target.left(), y), QPointF(target.right(), y))
+        for color, x, y, selected in self.markers:
+            painter.setPen(QPen(color, 3 if selected else 2))
+            radius = 6 if selected else 4
+            painter.drawEllipse(QPointF(target.x() + x * scale, target.y() + y * scale), radius, radius)
+        painter.end()
+
+    def mousePressEvent(self, ev: QMouseEvent) -> None:
+        if self.canvas is None or ev.button() != Qt.MouseButton.LeftButton:
+            return
+        x, y = self.to_canvas(ev.position())
+        if 0 <= x < self.canvas.width() and 0 <= y < self.canvas.height():
+            self.clicked.emit([self.index, x, y])
+
+    def mouseMoveEvent(self, ev: QMouseEvent) -> None:
+        if self.canvas is None:
+            return
+        x, y = self.to_canvas(ev.position())
+        self.hovered.emit([self.index, x, y])
+
+class QStereoViewer(QMainWindow):
+    """Two rectified images side by side, a landmark is on the same row (or column) of both
+    """
+
+    closeSignal = Signal(object)
+
+    def __init__(self, directory : str, images : list, cameras, width : int, height : int, center, landmarks : dict, init_geometry : QRect = None):
+        """
+        Args:
+            directory (str): directory of the images
+            images (list): the 2 images
+            cameras (project.CameraSet): cameras of the project
+            width (int): width of the first image
+            height (int): height of the first image
+            center (np.ndarray): center of the sphere
+            landmarks (dict): image -> entries (id, label, color, pose) of the landmarks
+            init_geometry (QRect, optional): geometry of the window
+        """
+
+        super(QStereoViewer, self).__init__()
+        if init_geometry is not None:
+            self.setGeometry(init_geometry)
+        self.setWindowTitle(f"{images[0]} / {images[1]}")
+        self.images = list(images)
+        self.landmarks = landmarks
+        # camera model of each image
+        self.intrinsics = [np.asarray(cameras.get_intrinsics(image)) for image in self.images]
+        self.dist_coeffs = [np.asarray(cameras.get_dist_coeffs(image)) for image in self.images]
+        self.rectification = None
+        self.landmark = 0
+
+        self.panes = [QRectifiedPane(self, index) for index in range(2)]
+        panes_layout = QHBoxLayout()
+        for pane in self.panes:
+            pane.clicked.connect(self.place_landmark)
+            pane.hovered.connect(self.show_guide)
+            panes_layout.addWidget(pane)
+
+        self.choice = QComboBox(self)
+        self.choice.addItems([landmark["label"] for landmark in self.landmarks[self.images[0]]])
+        self.choice.currentIndexChanged.connect(self.select_landmark)
+        self.choice.setFocusPolicy(Qt.FocusPolicy.NoFocus)
+
+        full_layout = QVBoxLayout()
+        full_layout.addWidget(self.choice)
+        full_layout.addLayout(panes_layout)
+        widget = QWidget()
+        widget.setLayout(full_layout)
+        self.setCentralWidget(widget)
+        self.statusBar().showMessage("Rectifying...")
+
+        self.loader = workers.ProgressWorker(load_pair, directory, self.images, self.intrinsics, self.dist_coeffs,
+                                             [np.asarray(cameras.get_extrinsics(image)) for image in self.images], width, height, np.asarray(center))
+        self.loader.signals.progress.connect(self.loaded)
+        self.loader.signals.finished.connect(lambda result: self.statusBar().showMessage(""))
+        self.loader.signals.error.connect(lambda e: self.statusBar().showMessage(f"Could not rectify the images : {e}"))
+        workers.start(self.loader)
+
+    def loaded(self, stage : tuple):
+        name, value = stage
+        if name == "rectification":
+            self.rectification = value
+            for pane in self.panes:
+                pane.set_size(value.size, value.vertical)
+            self.update_markers()
+            return
+        index, top, tile = value
+        self.panes[index].set_tile(top, tile)
+
+    def update_markers(self):
+        """Draw the poses of the landmarks on the rectified images
+        """
+
+        if self.rectification is None:
+            return
+        for index, image in enumerate(self.images):
+            entries = [landmark for landmark in self.landmarks[image] if landmark["pose"] is not None]
+            markers = []
+            if len(entries) != 0:
+                points = self.rectification.to_rectified(index, [landmark["pose"].to_array() for landmark in entries], self.intrinsics[index], self.dist_coeffs[index])
+                for landmark, (x, y) in zip(entries, points.tolist()):
+                    markers.append((landmark["color"], x, y, landmark is self.landmarks[image][self.landmark]))
+            self.panes[index].markers = markers
+            self.panes[index].update()
+
+    def select_landmark(self, index : int):
+        self.landmark = index
+        self.update_markers()
+
+    def place_landmark(self, index_and_pos):
+        """Set the pose of the selected landmark on the image clicked
+
+        Args:
+            index_and_pos (list): index of the image, x and y on its rectified image
+        """
+
+        index, x, y = index_and_pos
+        if self.rectification is None or len(self.landmarks[self.images[index]]) == 0:
+            return
+        self.landmarks[self.images[index]][self.landmark]["pose"] = helpers.Pose(*self.rectification.from_rectified(index, x, y))
+        self.update_markers()
+
+    def show_guide(self, index_and_pos):
+        # the epipolar line under the mouse, on both images
+        _, x, y = index_and_pos
+        for pane in self.panes:
+            pane.guide = x if pane.vertical else y
+            pane.update()
+
+    def keyPressEvent(self, ev: QKeyEvent) -> None:
+        try:
+            self.choice.setCurrentIndex(min(max(self.landmark + helpers.switch[ev.key()], 0), self.choice.count() - 1))
+        except KeyError:
+            pass
+
+    def closeEvent(self, a0: QCloseEvent) -> None:
+        self.loader.cancel()
+        self.closeSignal.emit(self.landmarks)
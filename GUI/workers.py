@@ -0,0 +1,106 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import traceback
+import threading
+
+from PySide6.QtCore import QObject, QRunnable, Signal, QThreadPool, QTimer
+
+# Workers are kept alive until their result has been delivered
+_running = set()
+
+class WorkerSignals(QObject):
+    """Signals sent by a Worker, they are delivered in the GUI thread
+    """
+
+    finished = Signal(object)
+    error = Signal(object)
+    progress = Signal(object)
+
+class Worker(QRunnable):
+    """Runs a function in the QThreadPool and sends back its result with a signal
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super(Worker, self).__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.cancelled = threading.Event()
+        self.setAutoDelete(False)
+
+    def cancel(self):
+        """Ask the function to stop, it is up to the function to check it (see ProgressWorker)
+        """
+
+        self.cancelled.set()
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            print(traceback.format_exc())
+            self.signals.error.emit(e)
+        else:
+            self.signals.finished.emit(result)
+
+class ProgressWorker(Worker):
+    """Worker whose function reports its progress, the function gets a progress callback
+    and a cancelled callback returning True once the worker has been cancelled
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super(ProgressWorker, self).__init__(fn, *args, **kwargs)
+        self.kwargs["progress"] = self.signals.progress.emit
+        self.kwargs["cancelled"] = self.cancelled.is_set
+
+def start(worker : Worker, pool : QThreadPool = None):
+    """Start a worker in the given pool (the global one by default)
+
+    Args:
+        worker (Worker): worker to start
+        pool (QThreadPool, optional): pool to use. Defaults to None.
+
+    Returns:
+        Worker: the started worker
+    """
+
+    _running.add(worker)
+    worker.signals.finished.connect(lambda _: _release(worker))
+    worker.signals.error.connect(lambda _: _release(worker))
+    (pool if pool is not None else QThreadPool.globalInstance()).start(worker)
+    return worker
+
+def _release(worker : Worker):
+    # wait for the other slots of the signal to be called
+    QTimer.singleShot(0, lambda: _running.discard(worker))
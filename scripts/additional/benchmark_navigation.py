@@ -0,0 +1,136 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from scripts import project, navigation
+
+def make_project(path : str, count : int, shells : int, seed : int = 0) -> project.Project:
+    """Synthetic project whose cameras are spread on spheres around the origin and look at it
+
+    Args:
+        path (str): path of the project file (not written)
+        count (int): number of images
+        shells (int): number of spheres of cameras
+        seed (int, optional): seed of the noise on the positions. Defaults to 0.
+
+    Returns:
+        project.Project: project
+    """
+
+    # Fibonacci sphere, above -60 degrees like a specimen on a pin
+    rng = np.random.default_rng(seed)
+    indices = np.arange(count) + 0.5
+    heights = 1 - indices / count * (1 + np.sin(np.radians(60)))
+    angles = np.pi * (1 + 5**0.5) * indices + rng.normal(0, 0.01, count)
+    radii = 1 + (np.arange(count) % shells) * 0.5
+    directions = np.stack([np.sqrt(1 - heights**2) * np.cos(angles), np.sqrt(1 - heights**2) * np.sin(angles), heights], axis=1)
+    centers = directions * radii[:, np.newaxis]
+
+    # z axis of the camera toward the origin
+    forward = -directions
+    right = np.cross(forward, [0, 0, 1])
+    right /= np.maximum(np.linalg.norm(right, axis=1), 1e-12)[:, np.newaxis]
+    down = np.cross(forward, right)
+    extrinsics = np.zeros((count, 4, 4))
+    extrinsics[:, 0:3, 0:3] = np.stack([right, down, forward], axis=1)
+    extrinsics[:, 0:3, 3] = -np.einsum('nij,nj->ni', extrinsics[:, 0:3, 0:3], centers)
+    extrinsics[:, 3, 3] = 1
+    names = [f"image_{i:06d}.jpg" for i in range(count)]
+    cameras = project.CameraSet(names, extrinsics, np.eye(3), np.zeros(5), centers)
+    return project.Project(path, {"commands": {}}, cameras)
+
+def get_milliseconds(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser(description="Benchmark the navigation around the sphere of images : loading of the index and nearest image of each move of the virtual camera")
+    ap.add_argument("-n", "--numbers", required=False, default=[10000, 50000], type=int, nargs="+",
+                    help="numbers of images (default 10000 50000)")
+    ap.add_argument("-s", "--shells", required=False, default=1, type=int,
+                    help="number of shells of images (default 1)")
+    ap.add_argument("-e", "--events", required=False, default=5000, type=int,
+                    help="number of moves of the virtual camera (default 5000)")
+    args = vars(ap.parse_args())
+
+    for count in args["numbers"]:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "benchmark.json")
+            sphere = make_project(path, count, args["shells"])
+            names = sphere.cameras.names
+
+            print(f"{count} images, {args['shells']} shell(s)")
+            (keys, center, longitudes, latitudes), positions_time = get_milliseconds(project.get_image_positions, sphere, names)
+            distances, distances_time = get_milliseconds(navigation.get_distances, sphere.cameras, keys, center)
+            shells, shells_time = get_milliseconds(navigation.get_shells, keys, distances)
+            _, build_time = get_milliseconds(navigation.load_index, path, keys, longitudes, latitudes, shells)
+            index, cache_time = get_milliseconds(navigation.load_index, path, keys, longitudes, latitudes, shells)
+            shell = navigation.get_default_shell(shells)
+            print(f"  positions {positions_time:8.1f} ms")
+            print(f"  shells    {distances_time + shells_time:8.1f} ms ({index.get_nbr_shells()} found)")
+            print(f"  index     {build_time:8.1f} ms (built), {cache_time:.1f} ms (cached), {len(index.candidates)} candidates")
+            print(f"  step      {index.get_step(shell):8g} degree(s)")
+
+            # drag of the virtual camera, one step at a time
+            step = index.get_step(shell)
+            moves = np.random.default_rng(1).integers(-1, 2, size=(args["events"], 2)) * step
+            path_angles = np.cumsum(moves, axis=0)
+            path_angles[:, 0] = (path_angles[:, 0] + 180) % 360 - 180
+            path_angles[:, 1] = np.clip(path_angles[:, 1], -60, 90)
+            latencies = np.empty(len(path_angles))
+            for i, (longitude, latitude) in enumerate(path_angles.tolist()):
+                start = time.perf_counter()
+                nearest = index.get_nearest(shell, longitude, latitude)
+                latencies[i] = time.perf_counter() - start
+
+            # reference : all the images of the shell compared at each move
+            in_shell = np.flatnonzero(shells == shell)
+            directions = navigation.get_unit_vectors(np.radians(path_angles[:, 0]), np.radians(path_angles[:, 1]))
+            start = time.perf_counter()
+            expected = in_shell[np.argmax(directions @ index.vectors[in_shell].T, axis=1)]
+            brute_time = (time.perf_counter() - start) / len(path_angles)
+            found = np.array([index.get_nearest(shell, longitude, latitude) for longitude, latitude in path_angles.tolist()])
+            errors = np.count_nonzero(found != expected)
+
+            print(f"  move      {np.mean(latencies) * 1e6:8.1f} us (mean), {np.percentile(latencies, 99) * 1e6:.1f} us (99%), "
+                  f"{brute_time * 1e6:.1f} us without the index (batched), {errors} errors")
+            print(f"  reachable {len(np.unique(index.tables[shell]))}/{len(in_shell)} images with moves of one degree")
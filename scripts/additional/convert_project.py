@@ -0,0 +1,63 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+from pathlib import Path
+
+from scripts import project
+
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser(description="Convert a project file between the JSON format and the binary format (JSON header + .npz)")
+    ap.add_argument("-i", "--input", required=True,
+                    help="path to input project file (JSON or binary header)")
+    ap.add_argument("-o", "--output", required=True,
+                    help="path to output project file")
+    ap.add_argument("-f", "--format", required=False, default="binary", choices=["binary", "json"],
+                    help="format of the output project")
+    args = vars(ap.parse_args())
+
+    input_path = Path(args["input"])
+    output_path = Path(args["output"])
+
+    sphere = project.load_project(str(input_path))
+    print(f"{input_path} : {len(sphere.cameras)} images ({'binary' if sphere.is_binary() else 'json'})")
+
+    if args["format"] == "binary":
+        project.save_binary(sphere, str(output_path))
+    else:
+        project.save_json(sphere, str(output_path))
+    print(f"Saved {args['format']} project : {output_path}")
@@ -0,0 +1,95 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import os
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules that must not be loaded when the application starts
+HEAVY_MODULES = ["pandas", "cv2", "PIL", "bs4", "lxml", "scipy", "matplotlib"]
+
+def get_import_times(module):
+    """Import a module in a new interpreter with -X importtime
+
+    Args:
+        module (str): module to import
+
+    Returns:
+        list: (cumulative time in us, self time in us, module) for each imported module
+    """
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        sys.exit(result.returncode)
+
+    times = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_time, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative), int(self_time), name.rstrip()))
+    return times
+
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser(description="Report the import time of the start of the application and check that heavy modules are loaded on first use")
+    ap.add_argument("-m", "--module", required=False, default="GUI.main",
+                    help="module imported at start (default GUI.main)")
+    ap.add_argument("-n", "--number", required=False, default=15, type=int,
+                    help="number of modules shown")
+    ap.add_argument("-b", "--budget", required=False, default=None, type=float,
+                    help="maximum import time in ms")
+    args = vars(ap.parse_args())
+
+    times = get_import_times(args["module"])
+    total = next((cumulative for cumulative, _, name in times if name.strip() == args["module"]), 0)
+
+    print(f"{'cumulative [ms]':>16} {'self [ms]':>10}  module")
+    for cumulative, self_time, name in sorted(times, reverse=True)[:args["number"]]:
+        print(f"{cumulative/1000:16.1f} {self_time/1000:10.1f}  {name}")
+    print(f"\nImport of {args['module']} : {total/1000:.1f} ms ({len(times)} modules)")
+
+    loaded = {name.strip().split(".")[0] for _, _, name in times}
+    heavy = [module for module in HEAVY_MODULES if module in loaded]
+    failed = False
+    if len(heavy) != 0:
+        print(f"Regression : modules loaded at start : {', '.join(heavy)}")
+        failed = True
+    if args["budget"] is not None and total/1000 > args["budget"]:
+        print(f"Regression : import time above {args['budget']} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,76 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import argparse
+from pathlib import Path
+
+import numpy as np
+from matplotlib import pyplot as plt
+
+from scripts import project, navigation
+
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser(description="Show the nearest image of every position of the virtual camera (Voronoi cells of the images on the sphere)")
+    ap.add_argument("-i", "--input", required=True,
+                    help="path to input project file")
+    ap.add_argument("-o", "--output", required=False, default=None,
+                    help="path to output image (shown if not given)")
+    ap.add_argument("-s", "--shell", required=False, default=None, type=int,
+                    help="shell of images to show (0 is the nearest to the center), the one with the most images by default")
+    args = vars(ap.parse_args())
+
+    input_path = Path(args["input"])
+    sphere = project.load_project(str(input_path))
+    thumbnails_dir = f'{sphere.directory}/{sphere.header["thumbnails"]}'
+    keys, center, longitudes, latitudes = project.get_image_positions(sphere, os.listdir(thumbnails_dir))
+    shells = navigation.get_shells(keys, navigation.get_distances(sphere.cameras, keys, center))
+    shell = args["shell"] if args["shell"] is not None else navigation.get_default_shell(shells)
+    index = navigation.load_index(str(input_path), keys, longitudes, latitudes, shells)
+    table = index.tables[shell]
+    in_shell = shells == shell
+    cells = len(set(table.flatten().tolist()))
+    print(f"{len(keys)} images in {shells.max() + 1} shell(s), shell {shell} : {cells}/{in_shell.sum()} images reachable by the virtual camera, step {index.get_step(shell)} degree(s)")
+
+    plt.imshow(navigation.get_coverage_map(table), extent=(-180, 180, -90, 90))
+    plt.scatter(np.degrees(longitudes[in_shell]), np.degrees(latitudes[in_shell]), s=4, color="black")
+    plt.xlabel("longitude")
+    plt.ylabel("latitude")
+    plt.title(f"{input_path.name} (shell {shell}) : {cells}/{in_shell.sum()} images reachable")
+    if args["output"] is not None:
+        plt.savefig(args["output"])
+    else:
+        plt.show()
@@ -0,0 +1,189 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from collections import OrderedDict
+
+import cv2 as cv
+import numpy as np
+from scipy.spatial import ConvexHull, QhullError
+
+from scripts import image_cache, navigation
+
+# triangles with an edge longer than this factor of the median edge are holes of the sphere, the nearest image is shown there
+MAX_EDGE_FACTOR = 3.0
+# frames kept by position of the virtual camera
+MAX_FRAMES = 64
+
+def project(points, intrinsics, extrinsics) -> np.ndarray:
+    # sub-pixel projection without distortion (the warps are approximations anyway)
+    homogeneous = np.hstack([points, np.ones((len(points), 1))])
+    pixels = (intrinsics @ extrinsics @ homogeneous.T).T
+    return (pixels[:, 0:2] / pixels[:, 2:3]).astype(np.float32)
+
+class ViewBlender():
+    """Virtual camera between the images of the sphere
+    The directions of the cameras are triangulated on the sphere (convex hull of their unit vectors), a position of the virtual camera
+    blends the 3 images of its triangle with its barycentric coordinates, each image is warped to the virtual camera
+    by the homography of the plane through the center of the sphere facing the virtual camera
+    """
+
+    def __init__(self, names : list, longitudes, latitudes, cameras, intrinsics, size : tuple, center, directory : str) -> None:
+        """
+        Args:
+            names (list): images
+            longitudes (np.ndarray): (N,) longitude of each image (in radian)
+            latitudes (np.ndarray): (N,) latitude of each image (in radian)
+            cameras (project.CameraSet): cameras of the project
+            intrinsics (np.ndarray): intrinsic matrix of the virtual camera
+            size (tuple): width and height of the thumbnails
+            center (np.ndarray): center of the sphere
+            directory (str): directory of the thumbnails
+        """
+
+        self.names = list(names)
+        self.intrinsics = np.asarray(intrinsics, dtype=np.float64)
+        self.size = tuple(size)
+        # the thumbnails of each camera model have their own intrinsic matrix
+        self.thumbnail_intrinsics = np.array([np.asarray(cameras.get_scaled_intrinsics(name, self.size)) for name in self.names])
+        self.center = np.asarray(center, dtype=np.float64).reshape(3)
+        self.directory = directory
+        self.rotations = np.array([np.asarray(cameras.get_extrinsics(name), dtype=np.float64)[0:3, 0:3] for name in self.names])
+        self.extrinsics = np.array([np.asarray(cameras.get_extrinsics(name), dtype=np.float64)[0:3, 0:4] for name in self.names])
+        self.distances = np.linalg.norm(np.array([cameras.get_center(name) for name in self.names]).reshape((-1, 3)) - self.center, axis=1)
+        # position -> (frame, extrinsics of the virtual camera)
+        self.frames = OrderedDict()
+
+        vectors = navigation.get_unit_vectors(longitudes, latitudes)
+        try:
+            hull = ConvexHull(vectors)
+        except (QhullError, ValueError) as e:
+            print(f"Images can't be blended : {e}")
+            self.triangles = np.zeros((0, 3), dtype=int)
+            return
+        self.triangles = hull.simplices
+        self.planes = hull.equations
+        # vertices of a triangle -> barycentric coordinates
+        self.inverses = np.linalg.pinv(vectors[self.triangles].transpose((0, 2, 1)))
+        edges = np.concatenate([np.sum(vectors[self.triangles[:, i]] * vectors[self.triangles[:, (i+1) % 3]], axis=1)[:, np.newaxis] for i in range(3)], axis=1)
+        longest = np.arccos(np.clip(edges.min(axis=1), -1, 1))
+        # the origin must be inside the hull, otherwise the images are on one side of the sphere only
+        self.valid = (longest <= MAX_EDGE_FACTOR * np.median(longest)) & (self.planes[:, 3] < 0)
+
+    def get_weights(self, longitude : float, latitude : float) -> list:
+        """get the images blended at a position of the virtual camera
+
+        Args:
+            longitude (float): longitude (in degrees)
+            latitude (float): latitude (in degrees)
+
+        Returns:
+            list: (index of the image, weight) of the 3 images, empty if the position is in a hole of the sphere
+        """
+
+        if len(self.triangles) == 0:
+            return []
+        direction = navigation.get_unit_vectors(np.radians(longitude), np.radians(latitude))
+        # the ray from the center leaves the hull through the nearest plane
+        face = int(np.argmax((self.planes[:, 0:3] @ direction) / np.maximum(-self.planes[:, 3], 1e-12)))
+        weights = self.inverses[face] @ direction
+        if not self.valid[face] or weights.min() < -1e-6:
+            return []
+        weights = np.clip(weights, 0, None)
+        weights /= weights.sum()
+        return list(zip(self.triangles[face].tolist(), weights.tolist()))
+
+    def get_virtual_extrinsics(self, weights : list, longitude : float, latitude : float) -> np.ndarray:
+        """Virtual camera looking at the center of the sphere, its roll and distance are interpolated from the blended images
+
+        Returns:
+            np.ndarray: (3,4) extrinsic matrix
+        """
+
+        direction = navigation.get_unit_vectors(np.radians(longitude), np.radians(latitude))
+        indices, values = [index for index, _ in weights], np.array([weight for _, weight in weights])
+        C = self.center + direction * float(values @ self.distances[indices])
+        rotation = np.tensordot(values, self.rotations[indices], axes=1)
+        z = -direction
+        x = rotation[0] - (rotation[0] @ z) * z
+        x /= np.linalg.norm(x)
+        rotation = np.stack([x, np.cross(z, x), z])
+        return np.hstack([rotation, (-rotation @ C)[:, np.newaxis]])
+
+    def get_homography(self, index : int, extrinsics : np.ndarray) -> np.ndarray:
+        """Homography from a thumbnail to the virtual camera, induced by the plane through the center of the sphere facing the virtual camera
+
+        Returns:
+            np.ndarray: (3,3) homography
+        """
+
+        rotation = extrinsics[0:3, 0:3]
+        half = 0.2 * self.distances[index]
+        corners = np.array([self.center + half * (sx * rotation[0] + sy * rotation[1]) for sx, sy in ((-1, -1), (1, -1), (1, 1), (-1, 1))])
+        return cv.getPerspectiveTransform(project(corners, self.thumbnail_intrinsics[index], self.extrinsics[index]), project(corners, self.intrinsics, extrinsics))
+
+    def render(self, longitude : int, latitude : int):
+        """Blended image of a position of the virtual camera
+
+        Args:
+            longitude (int): longitude (in degrees)
+            latitude (int): latitude (in degrees)
+
+        Returns:
+            tuple(np.ndarray, np.ndarray): RGB frame and extrinsic matrix of the virtual camera, None if the position is in a hole of the sphere
+        """
+
+        key = (longitude, latitude)
+        if key in self.frames:
+            self.frames.move_to_end(key)
+            return self.frames[key]
+        weights = self.get_weights(longitude, latitude)
+        if len(weights) == 0:
+            return None
+        extrinsics = self.get_virtual_extrinsics(weights, longitude, latitude)
+        blend = None
+        for index, weight in weights:
+            if weight == 0:
+                continue
+            thumbnail = image_cache.shared.get(f"{self.directory}/{self.names[index]}", 1)
+            if thumbnail is None:
+                continue
+            # outside of the image the warped alpha is 0, so the warped colors are premultiplied by the coverage
+            warped = cv.warpPerspective(cv.cvtColor(thumbnail, cv.COLOR_RGB2RGBA), self.get_homography(index, extrinsics), self.size)
+            blend = cv.addWeighted(warped, weight, blend if blend is not None else warped, 1 if blend is not None else 0, 0)
+        if blend is None:
+            return None
+        # the borders of the warped images don't darken the blend
+        frame = cv.divide(blend[:, :, 0:3], cv.cvtColor(blend[:, :, 3], cv.COLOR_GRAY2RGB), scale=255)
+        result = (frame, extrinsics)
+        self.frames[key] = result
+        while len(self.frames) > MAX_FRAMES:
+            self.frames.popitem(last=False)
+        return result
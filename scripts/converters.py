@@ -105,6 +105,24 @@ def get_long_lat(vector):
     longitude = math.atan2(y,x)
     return longitude, latitude
 
+def get_long_lat_array(vectors):
+    """get geographic coordinates from an array of vectors (centered at the origin (0,0,0))
+
+    Args:
+        vectors (np.ndarray): (N,3) vectors
+
+    Returns:
+        np.ndarray: (N,) longitudes
+        np.ndarray: (N,) latitudes
+    """
+
+    vectors = np.asarray(vectors, dtype=np.float64).reshape((-1, 3))
+    C_normed = vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+    x, y, z = C_normed[:, 0], C_normed[:, 1], C_normed[:, 2]
+    latitude = np.arctan2(z, np.sqrt(x**2 + y**2))
+    longitude = np.arctan2(y, x)
+    return longitude, latitude
+
 def get_unit_vector_from_long_lat(longitude, latitude):
     """comput a unit vector (centered at the origin (0,0,0) from geographic coordinates
 
@@ -119,4 +137,21 @@ def get_unit_vector_from_long_lat(longitude, latitude):
     x = math.cos(latitude)*math.cos(longitude)
     y = math.cos(latitude)*math.sin(longitude)
     z = math.sin(latitude)
-    return np.matrix([x,y,z])
\ No newline at end of file
+    return np.matrix([x,y,z])
+
+def get_central_angles(longitudes, latitudes, longitude, latitude):
+    """get the central angles between an array of geographic coordinates and a position (in radian)
+
+    Args:
+        longitudes (np.ndarray): (N,) longitudes
+        latitudes (np.ndarray): (N,) latitudes
+        longitude (float): longitude of the position
+        latitude (float): latitude of the position
+
+    Returns:
+        np.ndarray: (N,) central angles
+    """
+
+    sinus = np.sin(latitudes) * math.sin(latitude)
+    cosinus = np.cos(latitudes) * math.cos(latitude) * np.cos(np.abs(np.asarray(longitudes) - longitude))
+    return np.arccos(np.clip(sinus + cosinus, -1, 1))
@@ -0,0 +1,206 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import numpy as np
+
+from PySide6.QtGui import QColor
+from scripts import helpers, reconstruction
+
+DEFAULT_SAMPLES = 20
+# samples matched on each image for every 3D point of the curve
+OVERSAMPLING = 4
+
+class Curve():
+    """Curve of semi-landmarks, clicked as a polyline on several images
+    and triangulated to equidistant 3D points
+    """
+
+    def __init__(self, id, label, color=QColor('green'), samples=DEFAULT_SAMPLES, polylines=None, points=None) -> None:
+        self.id = id
+        self.label : str = label
+        self.color : QColor = color
+        self.samples : int = samples
+        self.polylines : dict[str, list[helpers.Pose]] = polylines if polylines is not None else dict()
+        self.points : np.ndarray = points
+
+    def get_polyline(self, image) -> list[helpers.Pose]:
+        return self.polylines.get(image, [])
+
+    def set_polyline(self, image, polyline : list[helpers.Pose]):
+        if len(polyline) == 0:
+            self.polylines.pop(image, None)
+        else:
+            self.polylines[image] = list(polyline)
+
+    def to_dict(self) -> dict:
+        """Curve in a JSON serializable form
+
+        Returns:
+            dict: id, label, color, number of samples, polylines and 3D points
+        """
+
+        return {"id": self.id,
+                "label": self.label,
+                "color": self.color.name(),
+                "samples": self.samples,
+                "polylines": {image: [pose.to_array() for pose in polyline] for image, polyline in self.polylines.items()},
+                "points": self.points.tolist() if self.points is not None else None}
+
+    @staticmethod
+    def from_dict(values : dict):
+        """Creates a curve from its JSON serializable form
+
+        Args:
+            values (dict): id, label, color, number of samples, polylines and 3D points
+
+        Returns:
+            Curve: the curve
+        """
+
+        polylines = {image: [helpers.Pose(x, y) for x, y in polyline] for image, polyline in values.get("polylines", {}).items()}
+        points = np.array(values["points"], dtype=np.float64) if values.get("points") is not None else None
+        return Curve(values["id"], values["label"], QColor(values["color"]), values.get("samples", DEFAULT_SAMPLES), polylines, points)
+
+def resample_polyline(points, n : int) -> np.ndarray:
+    """Resample a polyline to n points equidistant along its length
+
+    Args:
+        points (np.ndarray): (M,D) vertices of the polyline
+        n (int): number of points
+
+    Returns:
+        np.ndarray: (n,D) points, from the first vertex to the last one
+    """
+
+    points = np.asarray(points, dtype=np.float64)
+    arc_length = np.concatenate([[0.0], np.cumsum(np.linalg.norm(np.diff(points, axis=0), axis=1))])
+    if arc_length[-1] == 0:
+        return np.repeat(points[0:1], n, axis=0)
+    targets = np.linspace(0.0, arc_length[-1], n)
+    return np.stack([np.interp(targets, arc_length, points[:, d]) for d in range(points.shape[1])], axis=1)
+
+def get_reprojection_errors(proj_mats, points, points3D) -> np.ndarray:
+    """Computes the distance between undistorted pixels and the projection of their 3D points
+
+    Args:
+        proj_mats (np.ndarray): (V,3,4) projection matrices of the images
+        points (np.ndarray): (V,N,2) undistorted pixels
+        points3D (np.ndarray): (N,3) 3D points
+
+    Returns:
+        np.ndarray: (V,N) errors (in pixel)
+    """
+
+    homogeneous = np.hstack([points3D, np.ones((len(points3D), 1))])
+    projections = np.einsum("vij,nj->vni", proj_mats, homogeneous)
+    return np.linalg.norm(projections[:, :, 0:2] / projections[:, :, 2:3] - points, axis=2)
+
+def make_snapshot(cameras, curves : list[Curve]) -> dict:
+    """Copy what is needed to triangulate curves, the snapshot can be used in another thread
+
+    Args:
+        cameras (project.CameraSet): cameras of the project
+        curves (list): curves to triangulate
+
+    Returns:
+        dict: images used with their intrinsics, distortion coefficients and extrinsics, and polylines of each curve
+    """
+
+    snapshot_curves = {curve.id: (curve.samples, tuple((image, tuple(pose.to_array() for pose in polyline)) for image, polyline in curve.polylines.items()))
+                       for curve in curves}
+    images = sorted({image for _, polylines in snapshot_curves.values() for image, _ in polylines})
+    intrinsics, distortion = cameras.gather(images)
+    return {"images": images,
+            "intrinsics": intrinsics,
+            "distortion": distortion,
+            "extrinsics": cameras.extrinsics[cameras.get_rows(images), 0:3, 0:4] if len(images) != 0 else np.zeros((0, 3, 4)),
+            "curves": snapshot_curves}
+
+def triangulate_curve(polylines : tuple, samples : int, views : dict, intrinsics, distortion, extrinsics):
+    """Triangulate a curve
+    The polyline of each image is resampled by arc length so the i-th sample of every image is the same point of the curve,
+    all the samples are triangulated at once and the 3D polyline is resampled to equidistant points
+
+    Args:
+        polylines (tuple): (image, ((x, y), ...)) of the curve
+        samples (int): number of 3D points
+        views (dict): image -> index in intrinsics, distortion and extrinsics
+        intrinsics (np.ndarray): (V,3,3) intrinsic matrix of each image
+        distortion (np.ndarray): (V,8) distortion coefficients of each image (see reconstruction.pad_dist_coeffs)
+        extrinsics (np.ndarray): (V,3,4) extrinsic matrix of each image
+
+    Returns:
+        tuple(np.ndarray, list): (samples,3) points and the mean reprojection error on each image, None and [] if the curve is on less than 2 images
+    """
+
+    polylines = [(image, polyline) for image, polyline in polylines if len(polyline) >= 2]
+    if len(polylines) < 2:
+        return None, []
+
+    nbr_samples = samples * OVERSAMPLING
+    indices = np.array([views[image] for image, _ in polylines])
+    proj_mats = intrinsics[indices] @ extrinsics[indices]
+    # the points of all the polylines are undistorted at once, each with the camera model of its image
+    lengths = [len(polyline) for _, polyline in polylines]
+    observations = np.repeat(indices, lengths)
+    undistorted = reconstruction.undistort_observations(np.concatenate([np.asarray(polyline, dtype=np.float64).reshape((-1, 2)) for _, polyline in polylines]),
+                                                        intrinsics[observations], distortion[observations])
+    points = np.array([resample_polyline(polyline, nbr_samples) for polyline in np.split(undistorted, np.cumsum(lengths)[:-1])])
+
+    # the polylines may not be clicked in the same direction,
+    # each one is matched with the first one in the direction that reprojects best
+    for view in range(1, len(points)):
+        errors = []
+        for candidate in (points[view], points[view][::-1]):
+            pair = np.array([points[0], candidate])
+            points3D = reconstruction.triangulate_points_array(proj_mats[[0, view]], pair)
+            errors.append(get_reprojection_errors(proj_mats[[0, view]], pair, points3D).sum())
+        if errors[1] < errors[0]:
+            points[view] = points[view][::-1]
+
+    points3D = reconstruction.triangulate_points_array(proj_mats, points)
+    errors = get_reprojection_errors(proj_mats, points, points3D).mean(axis=1)
+    return resample_polyline(points3D, samples), errors.tolist()
+
+def triangulate_snapshot(snapshot : dict) -> dict:
+    """Triangulate the curves of a snapshot (see make_snapshot)
+
+    Args:
+        snapshot (dict): snapshot
+
+    Returns:
+        dict: id -> (points, reprojection errors), points is None if the curve can't be triangulated
+    """
+
+    views = {image: i for i, image in enumerate(snapshot["images"])}
+    return {id: triangulate_curve(polylines, samples, views, snapshot["intrinsics"], snapshot["distortion"], snapshot["extrinsics"])
+            for id, (samples, polylines) in snapshot["curves"].items()}
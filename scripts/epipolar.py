@@ -0,0 +1,127 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import numpy as np
+
+from scripts import reconstruction
+
+# number of points of an epipolar curve
+CURVE_POINTS = 100
+
+def get_fundamental_matrices(proj_srcs, proj_dst, centers_src) -> np.ndarray:
+    """Computes the fundamental matrices from several images to one image at once
+    F = [e']x P' P+, with e' the projection of the center of the source camera on the destination image
+
+    Args:
+        proj_srcs (np.ndarray): (M,3,4) projection matrices of the source images
+        proj_dst (np.ndarray): (3,4) projection matrix of the destination image
+        centers_src (np.ndarray): (M,3) centers of the source cameras
+
+    Returns:
+        np.ndarray: (M,3,3) fundamental matrices, x_dst.T @ F @ x_src = 0
+    """
+
+    proj_srcs = np.asarray(proj_srcs, dtype=np.float64)
+    proj_dst = np.asarray(proj_dst, dtype=np.float64)
+    centers_src = np.asarray(centers_src, dtype=np.float64)
+    epipoles = np.hstack([centers_src, np.ones((len(centers_src), 1))]) @ proj_dst.T
+    cross = np.zeros((len(epipoles), 3, 3))
+    cross[:, 0, 1], cross[:, 0, 2] = -epipoles[:, 2], epipoles[:, 1]
+    cross[:, 1, 0], cross[:, 1, 2] = epipoles[:, 2], -epipoles[:, 0]
+    cross[:, 2, 0], cross[:, 2, 1] = -epipoles[:, 1], epipoles[:, 0]
+    return cross @ proj_dst @ np.linalg.pinv(proj_srcs)
+
+class FundamentalCache():
+    """Fundamental matrices of the pairs of images already used
+    """
+
+    def __init__(self) -> None:
+        self.matrices : dict[tuple[str, str], np.ndarray] = dict()
+
+    def clear(self):
+        # the calibration changed
+        self.matrices = dict()
+
+    def get(self, cameras, sources : list, image : str) -> dict:
+        """get the fundamental matrices from images to another one, the missing ones are computed at once
+
+        Args:
+            cameras (project.CameraSet): cameras of the project
+            sources (list): source images
+            image (str): destination image
+
+        Returns:
+            dict: source image -> (3,3) fundamental matrix
+        """
+
+        missing = list({source for source in sources if (source, image) not in self.matrices})
+        if len(missing) != 0:
+            proj_srcs = cameras.get_projection_matrices(missing)
+            proj_dst = cameras.get_projection_matrices([image])[0]
+            centers = cameras.centers[cameras.get_rows(missing)]
+            for source, matrix in zip(missing, get_fundamental_matrices(proj_srcs, proj_dst, centers)):
+                self.matrices[(source, image)] = matrix
+        return {source: self.matrices[(source, image)] for source in sources}
+
+def get_epipolar_curves(fundamentals, points, intrinsics_src, distortion_src, intrinsics, dist_coeffs, width : int, height : int, nbr_points : int = CURVE_POINTS) -> list:
+    """Computes the epipolar curves of pixels on the destination image
+    The lines are computed on undistorted pixels, then distorted into curves
+
+    Args:
+        fundamentals (np.ndarray): (M,3,3) fundamental matrix of the image of each pixel
+        points (np.ndarray): (M,2) pixels on their source images
+        intrinsics_src (np.ndarray): (M,3,3) intrinsic matrix of the source image of each pixel
+        distortion_src (np.ndarray): (M,8) distortion coefficients of the source image of each pixel (see reconstruction.pad_dist_coeffs)
+        intrinsics (np.ndarray): intrinsic matrix of the destination image
+        dist_coeffs (np.ndarray): distortion coefficients of the destination image
+        width (int): width of the destination image
+        height (int): height of the destination image
+        nbr_points (int, optional): number of points of each curve. Defaults to CURVE_POINTS.
+
+    Returns:
+        list: (K,2) points of the curve of each pixel, inside the image
+    """
+
+    undistorted = reconstruction.undistort_observations(points, intrinsics_src, distortion_src)
+    lines = np.einsum("mij,mj->mi", np.asarray(fundamentals), np.hstack([undistorted, np.ones((len(undistorted), 1))]))
+    a, b, c = lines[:, 0:1], lines[:, 1:2], lines[:, 2:3]
+    # lines are sampled along their main direction
+    horizontal = np.abs(b) >= np.abs(a)
+    samples_x = np.linspace(0, width, nbr_points)[None, :]
+    samples_y = np.linspace(0, height, nbr_points)[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = np.where(horizontal, samples_x, -(b * samples_y + c) / a)
+        y = np.where(horizontal, -(a * samples_x + c) / b, samples_y)
+    curves = np.asarray(reconstruction.distort(np.vstack([x.reshape(-1), y.reshape(-1)]), intrinsics, dist_coeffs)).reshape((len(lines), nbr_points, 2))
+
+    inside = (curves[:, :, 0] >= 0) & (curves[:, :, 0] < width) & (curves[:, :, 1] >= 0) & (curves[:, :, 1] < height) & np.isfinite(curves).all(axis=2)
+    return [curve[mask] for curve, mask in zip(curves, inside)]
@@ -28,10 +28,11 @@
 
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
+# annotations are not evaluated, numpy is not loaded at the start of the application
+from __future__ import annotations
 
 from enum import Enum
 from PySide6.QtCore import Qt
-import numpy as np
 
 HEIGHT_COMPONENT = 25
 
@@ -87,6 +88,8 @@ class Pose():
     """Landmark posed on image
     """
 
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
         self.x = float(x)
         self.y = float(y)  
@@ -0,0 +1,93 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import threading
+from collections import OrderedDict
+
+import cv2 as cv
+import numpy as np
+
+# the images are decoded at a quarter of their size
+REDUCTION = 4
+# memory used by the decoded images
+MAX_BYTES = 256 * 1024 * 1024
+
+_READ_FLAGS = {1: cv.IMREAD_COLOR, 2: cv.IMREAD_REDUCED_COLOR_2, 4: cv.IMREAD_REDUCED_COLOR_4, 8: cv.IMREAD_REDUCED_COLOR_8}
+
+class ImageCache():
+    """Decoded images shared by the viewers, the least recently used ones are dropped over the memory limit
+    Can be used from several threads
+    """
+
+    def __init__(self, max_bytes : int = MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.images : OrderedDict[tuple[str, int], np.ndarray] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, path : str, reduction : int = REDUCTION) -> np.ndarray:
+        """get an image, decoded if it isn't in the cache
+
+        Args:
+            path (str): path of the image
+            reduction (int, optional): 1, 2, 4 or 8, the image is decoded at 1/reduction of its size. Defaults to REDUCTION.
+
+        Returns:
+            np.ndarray: RGB image, None if it can't be read
+        """
+
+        key = (path, reduction)
+        with self.lock:
+            if key in self.images:
+                self.images.move_to_end(key)
+                return self.images[key]
+        # decoded outside of the lock, several images can be decoded at once
+        image = cv.imread(path, _READ_FLAGS[reduction])
+        if image is None:
+            return None
+        image = cv.cvtColor(image, cv.COLOR_BGR2RGB)
+        with self.lock:
+            if key not in self.images:
+                self.images[key] = image
+                self.nbytes += image.nbytes
+            while self.nbytes > self.max_bytes and len(self.images) > 1:
+                _, dropped = self.images.popitem(last=False)
+                self.nbytes -= dropped.nbytes
+            return self.images.get(key, image)
+
+    def clear(self):
+        with self.lock:
+            self.images = OrderedDict()
+            self.nbytes = 0
+
+# cache shared by the viewers
+shared = ImageCache()
@@ -0,0 +1,210 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import json
+
+from scripts import project
+
+JOURNAL_EXTENSION = ".journal"
+COMPACT_EVERY = 500 # records
+
+# Operations recorded in the journal
+ADD = "add"
+DELETE = "delete"
+RESET = "reset"
+LABEL = "label"
+COLOR = "color"
+MOVE = "move"
+POSE = "pose"
+POSITION = "position"
+
+class LandmarkJournal():
+    """Append-only journal of the operations on the landmarks of a project
+    Each operation is one JSON line, the journal is compacted in a snapshot saved in the state of the project
+    """
+
+    def __init__(self, path : str, state : project.ProjectState, get_snapshot) -> None:
+        """
+        Args:
+            path (str): path of the journal
+            state (project.ProjectState): state of the project, keeps the snapshot
+            get_snapshot (function): returns the current list of landmarks as dicts
+        """
+
+        self.path = path
+        self.state = state
+        self.get_snapshot = get_snapshot
+        self.seq = 0
+        self.nbr_records = 0
+        self.file = None
+
+    def replay(self):
+        """Rebuild the landmarks from the snapshot and the journal
+
+        Returns:
+            list: landmarks as dicts (in order), None if nothing was ever recorded
+        """
+
+        snapshot = self.state.get("landmarks")
+        records = read_records(self.path)
+        if snapshot is None and len(records) == 0:
+            return None
+
+        landmarks = [dict(landmark) for landmark in snapshot["landmarks"]] if snapshot is not None else []
+        self.seq = snapshot["seq"] if snapshot is not None else 0
+        # the records find their landmark by id, the order is only changed by a move or a delete
+        by_id = {landmark["id"]: landmark for landmark in landmarks}
+        order = [landmark["id"] for landmark in landmarks]
+        for record in records:
+            if record["seq"] <= self.seq:
+                # already in the snapshot (crash during a compaction)
+                continue
+            apply_record(by_id, order, record)
+            self.seq = record["seq"]
+        self.nbr_records = len(records)
+        return [by_id[landmark_id] for landmark_id in order]
+
+    def append(self, op : str, **values):
+        """Record an operation
+
+        Args:
+            op (str): operation
+            values: values of the operation
+        """
+
+        if self.file is None:
+            self.file = open(self.path, "a")
+        self.seq += 1
+        record = {"seq": self.seq, "op": op}
+        record.update(values)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.nbr_records += 1
+        if self.nbr_records >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        """Save the current landmarks as snapshot and empty the journal
+        """
+
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.state.set("landmarks", {"seq": self.seq, "landmarks": self.get_snapshot()})
+        # the snapshot has to be on disk before the journal is emptied
+        self.state.flush()
+        open(self.path, "w").close()
+        self.nbr_records = 0
+
+    def close(self):
+        if self.nbr_records > 0:
+            self.compact()
+        elif self.file is not None:
+            self.file.close()
+            self.file = None
+
+def get_journal_path(path : str) -> str:
+    """get the path of the journal of a project
+
+    Args:
+        path (str): path of the project file
+
+    Returns:
+        str: path of the journal
+    """
+
+    return os.path.splitext(os.path.abspath(path))[0] + JOURNAL_EXTENSION
+
+def read_records(path : str) -> list:
+    """Read the records of a journal, an incomplete last line (crash during a write) is ignored
+
+    Args:
+        path (str): path of the journal
+
+    Returns:
+        list: records
+    """
+
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Journal record ignored : {line}")
+    return records
+
+def apply_record(by_id : dict, order : list, record : dict):
+    """Apply an operation to the landmarks
+
+    Args:
+        by_id (dict): landmarks as dicts by id
+        order (list): ids of the landmarks in order
+        record (dict): record of the journal
+    """
+
+    op = record["op"]
+    if op == ADD:
+        if record["id"] not in by_id:
+            by_id[record["id"]] = {"id": record["id"], "label": record["label"], "color": record["color"],
+                                   "position": record.get("position"), "poses": dict(record.get("poses", {}))}
+            order.append(record["id"])
+        return
+    landmark = by_id.get(record["id"])
+    if landmark is None:
+        print(f"Journal record ignored, unknown landmark : {record}")
+        return
+    match op:
+        case "delete":
+            del by_id[record["id"]]
+            order.remove(record["id"])
+        case "reset":
+            landmark["poses"] = dict()
+            landmark["position"] = None
+        case "label":
+            landmark["label"] = record["label"]
+        case "color":
+            landmark["color"] = record["color"]
+        case "move":
+            order.remove(record["id"])
+            order.insert(record["index"], record["id"])
+        case "pose":
+            landmark["poses"] = dict(landmark["poses"])
+            if record["pose"] is None:
+                landmark["poses"].pop(record["image"], None)
+            else:
+                landmark["poses"][record["image"]] = record["pose"]
+        case "position":
+            landmark["position"] = record["position"]
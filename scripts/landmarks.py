@@ -0,0 +1,427 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import json
+import numpy as np
+
+from scripts import helpers, reconstruction
+
+from PySide6.QtGui import QColor
+
+INITIAL_CAPACITY = 64 # landmarks
+CHUNK_SIZE = 1 << 16 # characters read at once when importing landmarks
+
+class LandmarkStore():
+    """Landmarks of a project
+    Each landmark has a slot in the arrays of the store (id -> slot), the order of the list is kept separately (with id -> row).
+    Positions are kept in a (capacity,3) array (NaN if not triangulated), they are given back as homogeneous points
+    and the poses by image (image -> id -> Pose), so the poses of one image are read at once
+    """
+
+    def __init__(self, capacity : int = INITIAL_CAPACITY) -> None:
+        self.order : list[int] = []
+        self.rows : dict[int, int] = dict()
+        self.slots : dict[int, int] = dict()
+        # lowest slots are used first
+        self.free_slots : list[int] = list(range(capacity - 1, -1, -1))
+        self.ids = np.full(capacity, -1, dtype=np.int64)
+        self.positions = np.full((capacity, 3), np.nan, dtype=np.float64)
+        self.labels : list[str] = [None] * capacity
+        self.colors : list[QColor] = [None] * capacity
+        # image -> id -> Pose
+        self.poses : dict[str, dict[int, helpers.Pose]] = dict()
+        # id -> images with a pose
+        self.images : dict[int, set[str]] = dict()
+        self.max_id = -1
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, id):
+        return id in self.slots
+
+    def __iter__(self):
+        """Landmarks in the order of the list (copies, changes are made through the store)
+        """
+
+        for id in list(self.order):
+            yield self.get(id)
+
+    def get_ids(self) -> list[int]:
+        return list(self.order)
+
+    def get_row(self, id) -> int:
+        return self.rows[id]
+
+    def _update_rows(self, start : int, end : int = None):
+        # rows of the landmarks between start and end, after a change of the list
+        for row in range(start, len(self.order) if end is None else end):
+            self.rows[self.order[row]] = row
+
+    def next_id(self) -> int:
+        return self.max_id + 1
+
+    def get(self, id) -> reconstruction.Landmark:
+        """get a copy of a landmark
+
+        Args:
+            id (int): id of the landmark
+
+        Returns:
+            reconstruction.Landmark: the landmark
+        """
+
+        return reconstruction.Landmark(id, self.get_label(id), self.get_color(id), self.get_position(id), self.get_poses(id))
+
+    def add(self, landmark : reconstruction.Landmark, row : int = None):
+        """Add a landmark
+
+        Args:
+            landmark (reconstruction.Landmark): landmark
+            row (int, optional): place in the list. Defaults to None (at the end).
+        """
+
+        if len(self.free_slots) == 0:
+            self._grow()
+        slot = self.free_slots.pop()
+        id = landmark.id
+        self.slots[id] = slot
+        self.ids[slot] = id
+        self.labels[slot] = landmark.label
+        self.colors[slot] = QColor(landmark.color)
+        self.set_position(id, landmark.position)
+        self.images[id] = set()
+        for image, pose in landmark.poses.items():
+            self.set_pose(id, image, pose)
+        row = row if row is not None else len(self.order)
+        self.order.insert(row, id)
+        self._update_rows(row)
+        self.max_id = max(self.max_id, id)
+
+    def extend(self, landmarks : list[reconstruction.Landmark]):
+        for landmark in landmarks:
+            self.add(landmark)
+
+    def delete(self, id):
+        slot = self.slots.pop(id)
+        row = self.rows.pop(id)
+        del self.order[row]
+        self._update_rows(row)
+        self.ids[slot] = -1
+        self.positions[slot] = np.nan
+        self.labels[slot] = None
+        self.colors[slot] = None
+        for image in self.images.pop(id):
+            self.poses[image].pop(id, None)
+        self.free_slots.append(slot)
+
+    def move(self, id, row : int):
+        old_row = self.rows[id]
+        del self.order[old_row]
+        self.order.insert(row, id)
+        self._update_rows(min(old_row, row), max(old_row, row) + 1)
+
+    def reset(self, id):
+        """Remove the poses and the position of a landmark
+        """
+
+        for image in self.images[id]:
+            self.poses[image].pop(id, None)
+        self.images[id] = set()
+        self.positions[self.slots[id]] = np.nan
+
+    def get_label(self, id) -> str:
+        return self.labels[self.slots[id]]
+
+    def get_labels(self) -> list[str]:
+        return [self.labels[self.slots[id]] for id in self.order]
+
+    def set_label(self, id, label : str):
+        self.labels[self.slots[id]] = label
+
+    def get_color(self, id) -> QColor:
+        return self.colors[self.slots[id]]
+
+    def set_color(self, id, color : QColor):
+        self.colors[self.slots[id]] = QColor(color)
+
+    def get_position(self, id) -> tuple:
+        """get the position of a landmark
+
+        Args:
+            id (int): id of the landmark
+
+        Returns:
+            tuple: homogeneous point (x, y, z, 1), None if not triangulated
+        """
+
+        position = self.positions[self.slots[id]]
+        return tuple(position.tolist()) + (1.0,) if not np.isnan(position[0]) else None
+
+    def set_position(self, id, position):
+        """Set the position of a landmark
+
+        Args:
+            id (int): id of the landmark
+            position (tuple): 3D or homogeneous point (scaled), None if not triangulated
+        """
+
+        self.positions[self.slots[id]] = position[0:3] if position is not None else np.nan
+
+    def get_positions(self, ids : list = None):
+        """get the positions of the triangulated landmarks
+
+        Args:
+            ids (list, optional): landmarks to get. Defaults to None (all, in the order of the list).
+
+        Returns:
+            list: ids of the triangulated landmarks
+            np.ndarray: (N,3) positions
+        """
+
+        ids = self.order if ids is None else ids
+        positions = self.positions[[self.slots[id] for id in ids]]
+        triangulated = ~np.isnan(positions[:, 0])
+        return [id for id, keep in zip(ids, triangulated) if keep], positions[triangulated]
+
+    def get_centroid(self, ids : list):
+        """get the centroid of triangulated landmarks
+
+        Args:
+            ids (list): landmarks used
+
+        Returns:
+            np.ndarray: (3,) centroid, None if none of the landmarks is triangulated
+        """
+
+        _, positions = self.get_positions(list(ids))
+        return positions.mean(axis=0) if len(positions) != 0 else None
+
+    def get_pose(self, id, image) -> helpers.Pose:
+        return self.poses.get(image, {}).get(id)
+
+    def set_pose(self, id, image, pose : helpers.Pose):
+        """Set the pose of a landmark on an image
+
+        Args:
+            id (int): id of the landmark
+            image (str): image
+            pose (helpers.Pose): pose, None removes it
+        """
+
+        if pose is None:
+            self.poses.get(image, {}).pop(id, None)
+            self.images[id].discard(image)
+            return
+        self.poses.setdefault(image, dict())[id] = pose
+        self.images[id].add(image)
+
+    def get_poses(self, id) -> dict[str, helpers.Pose]:
+        return {image: self.poses[image][id] for image in self.images[id]}
+
+    def get_image_poses(self, image) -> dict[int, helpers.Pose]:
+        return dict(self.poses.get(image, {}))
+
+    def to_dicts(self) -> list[dict]:
+        return [landmark.to_dict() for landmark in self]
+
+    @staticmethod
+    def from_dicts(values : list[dict]):
+        """Creates a store from landmarks in their JSON serializable form
+
+        Args:
+            values (list): landmarks as dicts
+
+        Returns:
+            LandmarkStore: the store
+        """
+
+        store = LandmarkStore(max(INITIAL_CAPACITY, len(values)))
+        store.extend(reconstruction.Landmark.from_dict(landmark) for landmark in values)
+        return store
+
+    def _grow(self):
+        capacity = len(self.ids)
+        new_capacity = max(INITIAL_CAPACITY, capacity * 2)
+        self.ids = np.concatenate([self.ids, np.full(new_capacity - capacity, -1, dtype=np.int64)])
+        self.positions = np.concatenate([self.positions, np.full((new_capacity - capacity, 3), np.nan)])
+        self.labels.extend([None] * (new_capacity - capacity))
+        self.colors.extend([None] * (new_capacity - capacity))
+        # lowest slots are used first
+        self.free_slots.extend(range(new_capacity - 1, capacity - 1, -1))
+
+class _JsonStream():
+    """Reads the values of a JSON file one at a time, the file is read by chunks
+    """
+
+    WHITESPACES = " \t\n\r"
+
+    def __init__(self, f, chunk_size : int = CHUNK_SIZE) -> None:
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+
+    def fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """get the next character that is not a whitespace (without consuming it)
+        """
+
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACES:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                raise ValueError("Unexpected end of the JSON file")
+
+    def expect(self, char : str):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' in the JSON file, got '{self.buffer[self.pos]}'")
+        self.pos += 1
+
+    def value(self):
+        """Decode the next value, more of the file is read until the value is complete
+        """
+
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill():
+                    raise
+                continue
+            if isinstance(value, (int, float)) and (end == len(self.buffer) or self.buffer[end] not in self.WHITESPACES + ",]}") and self.fill():
+                # the number may continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def items(self):
+        """Iterate over the items of the object that starts at the current position
+        """
+
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+def iter_landmark_file(path : str, chunk_size : int = CHUNK_SIZE):
+    """Iterate over the landmarks of an exported JSON file without loading the whole file
+
+    Args:
+        path (str): path of the file
+        chunk_size (int, optional): characters read at once. Defaults to CHUNK_SIZE.
+
+    Yields:
+        dict: label, color, position and poses of a landmark
+    """
+
+    with open(path, "r") as f:
+        stream = _JsonStream(f, chunk_size)
+        for key in stream.items():
+            if key != "landmarks":
+                # scale factor, centroid...
+                stream.value()
+                continue
+            for _ in stream.items():
+                yield stream.value()
+
+def get_landmark_files(paths : list) -> list[str]:
+    """get the JSON files to import, folders are replaced by the JSON files they contain
+
+    Args:
+        paths (list): files and folders
+
+    Returns:
+        list: JSON files
+    """
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(f"{path}/{name}" for name in os.listdir(path) if name.lower().endswith(".json")))
+        else:
+            files.append(path)
+    return files
+
+def read_landmark_files(paths : list) -> list[reconstruction.Landmark]:
+    """Read landmarks from several exported JSON files
+    Landmarks with the same label are merged : the poses of the first file are kept and completed by the other files,
+    a landmark completed by other files has no position (it has to be triangulated again)
+
+    Args:
+        paths (list): files and folders
+
+    Returns:
+        list: landmarks (without id), in the order they were read
+    """
+
+    landmarks = dict()
+    for path in get_landmark_files(paths):
+        try:
+            for values in iter_landmark_file(path):
+                label = values["label"]
+                poses = {image: helpers.Pose(pose[0], pose[1]) for image, pose in values.get("poses", {}).items() if pose is not None}
+                if label not in landmarks:
+                    position = tuple(values["position"]) if values.get("position") is not None else None
+                    landmarks[label] = reconstruction.Landmark(None, label, QColor(values["color"]), position, poses)
+                    continue
+                landmark = landmarks[label]
+                merged = [image for image in poses if image not in landmark.poses]
+                for image in merged:
+                    landmark.poses[image] = poses[image]
+                if len(merged) != 0:
+                    # the position of the first file doesn't match the merged poses
+                    landmark.position = None
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Import of {path} failed : {e}")
+    return list(landmarks.values())
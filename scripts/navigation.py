@@ -0,0 +1,364 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import os
+import math
+import itertools
+import numpy as np
+
+from scripts import project, scant
+
+# extension of the index cached next to the project file
+TABLE_EXTENSION = ".navigation.npz"
+# cells of the table (one degree), longitudes -180 -> 179 and latitudes -90 -> 90
+LONGITUDES = 360
+LATITUDES = 181
+# half diagonal of a cell (in radian), the positions of a cell are at most this far from its center
+CELL_RADIUS = np.radians(np.sqrt(0.5))
+# steps of the virtual camera (in degrees), the largest one below half the spacing of the images is used
+STEPS = (1, 0.5, 0.25, 0.2, 0.1, 0.05)
+# relative difference of distance to the center between two shells of images
+SHELL_GAP = 0.1
+
+def get_table_path(path : str) -> str:
+    """get the path of the navigation table of a project
+
+    Args:
+        path (str): path of the project file
+
+    Returns:
+        str: path of the table
+    """
+
+    return os.path.splitext(os.path.abspath(path))[0] + TABLE_EXTENSION
+
+def get_unit_vectors(longitudes, latitudes) -> np.ndarray:
+    """get the unit vectors of geographic coordinates (in radian)
+
+    Returns:
+        np.ndarray: (N,3) vectors
+    """
+
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    return np.stack([np.cos(latitudes) * np.cos(longitudes), np.cos(latitudes) * np.sin(longitudes), np.sin(latitudes)], axis=-1)
+
+def get_cell_vectors() -> np.ndarray:
+    # centers of the cells of the table, row by row
+    longitudes, latitudes = np.meshgrid(np.radians(np.arange(LONGITUDES) - 180), np.radians(np.arange(LATITUDES) - 90))
+    return get_unit_vectors(longitudes.ravel(), latitudes.ravel())
+
+def get_step(tree, count : int) -> float:
+    """get the step of the virtual camera adapted to the density of the images
+
+    Args:
+        tree (scipy.spatial.cKDTree): unit vectors of the images
+        count (int): number of images
+
+    Returns:
+        float: step (in degrees)
+    """
+
+    if count < 2:
+        return STEPS[0]
+    distances, _ = tree.query(tree.data, k=2)
+    spacing = np.degrees(2 * np.arcsin(min(np.median(distances[:, 1]) / 2, 1)))
+    return next((step for step in STEPS if step <= spacing / 2), STEPS[-1])
+
+def build_shell(vectors : np.ndarray):
+    """Computes the nearest image of every cell of the table and the images that can be the nearest of a position inside each cell
+
+    Args:
+        vectors (np.ndarray): (N,3) unit vectors of the images
+
+    Returns:
+        np.ndarray: (LATITUDES, LONGITUDES) index of the nearest image of the center of each cell
+        np.ndarray: (LATITUDES * LONGITUDES + 1,) offsets of the candidates of each cell
+        np.ndarray: candidates of the cells
+        float: step of the virtual camera (in degrees)
+    """
+
+    from scipy.spatial import cKDTree
+
+    tree = cKDTree(vectors)
+    cells = get_cell_vectors()
+    distances, table = tree.query(cells)
+    # an image farther than the nearest one + the diameter of the cell can't be the nearest of any position of the cell
+    angles = 2 * np.arcsin(np.minimum(distances / 2, 1))
+    radii = 2 * np.sin(np.minimum(angles + 2 * CELL_RADIUS, np.pi) / 2) + 1e-9
+    neighbours = tree.query_ball_point(cells, radii, return_sorted=False)
+    lengths = np.fromiter(map(len, neighbours), dtype=np.int64, count=len(neighbours))
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    candidates = np.fromiter(itertools.chain.from_iterable(neighbours), dtype=np.int32, count=int(offsets[-1]))
+    return table.reshape((LATITUDES, LONGITUDES)).astype(np.int32), offsets, candidates, get_step(tree, len(vectors))
+
+class NavigationIndex():
+    """Nearest image of every position of the virtual camera, for each shell of images
+
+    Coarse to fine : the table gives the nearest image of each degree, and a position between two degrees
+    is compared only to the candidates of its cell (the images that can be the nearest inside the cell)
+    """
+
+    def __init__(self, vectors, tables, offsets, candidates, steps) -> None:
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float64).reshape((-1, 3))
+        # (shells, LATITUDES, LONGITUDES) indices among all the images
+        self.tables = np.asarray(tables, dtype=np.int32)
+        # (shells, LATITUDES * LONGITUDES + 1) offsets in candidates
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.candidates = np.asarray(candidates, dtype=np.int32)
+        self.steps = np.asarray(steps, dtype=np.float64)
+
+    def get_nbr_shells(self) -> int:
+        return len(self.tables)
+
+    def get_step(self, shell : int) -> float:
+        return float(self.steps[shell])
+
+    def get_nearest(self, shell : int, longitude : float, latitude : float) -> int:
+        """get the nearest image of a position of the virtual camera
+
+        Args:
+            shell (int): shell of images
+            longitude (float): longitude (in degrees)
+            latitude (float): latitude (in degrees)
+
+        Returns:
+            int: index of the image
+        """
+
+        latitude = min(max(latitude, -90), 90)
+        cell = (int(round(latitude)) + 90) * LONGITUDES + (int(round(longitude)) + 180) % LONGITUDES
+        start, end = self.offsets[shell, cell], self.offsets[shell, cell + 1]
+        if end - start == 1 or (longitude == int(longitude) and latitude == int(latitude)):
+            # one candidate or the center of the cell
+            return int(self.tables[shell].flat[cell])
+        candidates = self.candidates[start:end]
+        long, lat = math.radians(longitude), math.radians(latitude)
+        direction = np.array([math.cos(lat) * math.cos(long), math.cos(lat) * math.sin(long), math.sin(lat)])
+        return int(candidates[np.argmax(self.vectors[candidates] @ direction)])
+
+    def to_arrays(self) -> dict:
+        return {"vectors": self.vectors, "tables": self.tables, "offsets": self.offsets, "candidates": self.candidates, "steps": self.steps}
+
+def get_previous_shell(indices : np.ndarray, previous_shells : np.ndarray, changed : np.ndarray) -> int:
+    """get the shell of a previous index that has exactly the same images as a shell
+
+    Args:
+        indices (np.ndarray): images of the shell
+        previous_shells (np.ndarray): (M,) shell of each image of the previous index
+        changed (np.ndarray): (N,) True for the images added or moved since the previous index
+
+    Returns:
+        int: shell of the previous index, None if the shell has to be built
+    """
+
+    if len(indices) == 0 or indices[-1] >= len(previous_shells) or changed[indices].any():
+        return None
+    shell = previous_shells[indices[0]]
+    if np.all(previous_shells[indices] == shell) and np.count_nonzero(previous_shells == shell) == len(indices):
+        return int(shell)
+    return None
+
+def build_index(longitudes, latitudes, shells, previous : NavigationIndex = None, previous_shells=None, changed=()) -> NavigationIndex:
+    """Computes the navigation index of each shell
+    With a previous index, the shells whose images didn't change are copied from it
+
+    Args:
+        longitudes (np.ndarray): (N,) longitude of each image (in radian)
+        latitudes (np.ndarray): (N,) latitude of each image (in radian)
+        shells (np.ndarray): (N,) shell of each image
+        previous (NavigationIndex, optional): index of the M first images. Defaults to None (all the shells are built).
+        previous_shells (np.ndarray, optional): (M,) shell of each image of the previous index. Defaults to None.
+        changed (list, optional): indices of the images moved since the previous index. Defaults to ().
+
+    Returns:
+        NavigationIndex: index
+    """
+
+    vectors = get_unit_vectors(longitudes, latitudes).reshape((-1, 3))
+    shells = np.asarray(shells)
+    if previous is not None:
+        previous_shells = np.asarray(previous_shells)
+        moved = np.zeros(len(shells), dtype=bool)
+        moved[list(changed)] = True
+    nbr_shells = int(shells.max()) + 1 if len(shells) != 0 else 0
+    tables = np.empty((nbr_shells, LATITUDES, LONGITUDES), dtype=np.int32)
+    offsets = np.empty((nbr_shells, LATITUDES * LONGITUDES + 1), dtype=np.int64)
+    candidates = []
+    steps = np.empty(nbr_shells, dtype=np.float64)
+    total = 0
+    for shell in range(nbr_shells):
+        # indices among the images of the shell -> among all the images
+        indices = np.flatnonzero(shells == shell).astype(np.int32)
+        old = get_previous_shell(indices, previous_shells, moved) if previous is not None else None
+        if old is not None:
+            start, end = previous.offsets[old, 0], previous.offsets[old, -1]
+            tables[shell] = previous.tables[old]
+            offsets[shell] = previous.offsets[old] - start + total
+            candidates.append(previous.candidates[start:end])
+            steps[shell] = previous.steps[old]
+            total += end - start
+            continue
+        table, shell_offsets, shell_candidates, steps[shell] = build_shell(vectors[indices])
+        tables[shell] = indices[table]
+        offsets[shell] = shell_offsets + total
+        candidates.append(indices[shell_candidates])
+        total += len(shell_candidates)
+    candidates = np.concatenate(candidates) if len(candidates) != 0 else np.zeros(0, dtype=np.int32)
+    return NavigationIndex(vectors, tables, offsets, candidates, steps)
+
+def get_distances(cameras, names : list, center) -> np.ndarray:
+    """get the distances of the cameras to the center of the sphere
+
+    Args:
+        cameras (project.CameraSet): cameras of the project
+        names (list): images
+        center (np.ndarray): center of the sphere
+
+    Returns:
+        np.ndarray: (N,) distances
+    """
+
+    rows = np.array([cameras.index[name] for name in names], dtype=int)
+    return np.linalg.norm(cameras.centers[rows] - np.asarray(center, dtype=np.float64).reshape(3), axis=1)
+
+def get_shells(names : list, distances) -> np.ndarray:
+    """Split the images in shells, the images of a shell are at the same distance of the center (or at the same focus step of scAnt)
+
+    Args:
+        names (list): images
+        distances (np.ndarray): (N,) distance of each image to the center of the sphere
+
+    Returns:
+        np.ndarray: (N,) shell of each image, 0 is the nearest shell to the center
+    """
+
+    distances = np.asarray(distances, dtype=np.float64)
+    if len(names) == 0:
+        return np.zeros(0, dtype=np.int64)
+    parsed = [scant.parse_name(name) for name in names] if scant.parse_name(names[0]) is not None else [None]
+    if all(values is not None for values in parsed) and len({values[2] for values in parsed}) > 1:
+        _, labels = np.unique([values[2] for values in parsed], return_inverse=True)
+    else:
+        # a gap in the sorted distances separates two shells
+        order = np.argsort(distances)
+        gaps = np.diff(distances[order]) > SHELL_GAP * np.median(distances)
+        labels = np.empty(len(names), dtype=np.int64)
+        labels[order] = np.concatenate([[0], np.cumsum(gaps)])
+    # shells sorted by distance
+    means = np.array([distances[labels == label].mean() for label in range(labels.max() + 1)])
+    return np.argsort(np.argsort(means))[labels]
+
+def get_default_shell(shells) -> int:
+    # the shell with the most images
+    return int(np.argmax(np.bincount(shells))) if len(shells) != 0 else 0
+
+def load_index(path : str, names : list, longitudes, latitudes, shells) -> NavigationIndex:
+    """get the navigation index of a project, from its cache if the images didn't change
+
+    Args:
+        path (str): path of the project file
+        names (list): images, in the order of the index
+        longitudes (np.ndarray): (N,) longitude of each image (in radian)
+        latitudes (np.ndarray): (N,) latitude of each image (in radian)
+        shells (np.ndarray): (N,) shell of each image
+
+    Returns:
+        NavigationIndex: index (see build_index)
+    """
+
+    table_path = get_table_path(path)
+    names = np.array(names, dtype=str)
+    long_lat = np.stack([np.asarray(longitudes, dtype=np.float64), np.asarray(latitudes, dtype=np.float64)], axis=1)
+    shells = np.asarray(shells, dtype=np.int64)
+    if os.path.exists(table_path):
+        try:
+            with np.load(table_path) as cached:
+                if np.array_equal(cached["names"], names) and np.array_equal(cached["long_lat"], long_lat) and np.array_equal(cached["shells"], shells):
+                    return NavigationIndex(cached["vectors"], cached["tables"], cached["offsets"], cached["candidates"], cached["steps"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Navigation index not read : {e}")
+    index = build_index(long_lat[:, 0], long_lat[:, 1], shells)
+    save_index(path, names, long_lat[:, 0], long_lat[:, 1], shells, index)
+    return index
+
+def save_index(path : str, names : list, longitudes, latitudes, shells, index : NavigationIndex):
+    """Cache the navigation index next to the project file (see load_index)
+
+    Args:
+        path (str): path of the project file
+        names (list): images, in the order of the index
+        longitudes (np.ndarray): (N,) longitude of each image (in radian)
+        latitudes (np.ndarray): (N,) latitude of each image (in radian)
+        shells (np.ndarray): (N,) shell of each image
+        index (NavigationIndex): index of the images
+    """
+
+    long_lat = np.stack([np.asarray(longitudes, dtype=np.float64), np.asarray(latitudes, dtype=np.float64)], axis=1)
+    try:
+        project.atomic_savez(get_table_path(path), names=np.array(names, dtype=str), long_lat=long_lat, shells=np.asarray(shells, dtype=np.int64), **index.to_arrays())
+    except OSError as e:
+        print(f"Navigation index not saved : {e}")
+
+def get_closest(longitudes, latitudes, long : float, lat : float, count : int) -> np.ndarray:
+    """get the images the closest to a position, in order
+
+    Args:
+        longitudes (np.ndarray): (N,) longitude of each image (in radian)
+        latitudes (np.ndarray): (N,) latitude of each image (in radian)
+        long (float): longitude of the position (in degrees)
+        lat (float): latitude of the position (in degrees)
+        count (int): number of images
+
+    Returns:
+        np.ndarray: indices of the count closest images
+    """
+
+    cosines = get_unit_vectors(longitudes, latitudes).reshape((-1, 3)) @ get_unit_vectors(np.radians(long), np.radians(lat))
+    return np.argsort(-cosines, kind="stable")[:count]
+
+def get_coverage_map(table : np.ndarray) -> np.ndarray:
+    """Voronoi cells of the images on the sphere, to check the coverage of a sphere of images
+
+    Args:
+        table (np.ndarray): navigation table
+
+    Returns:
+        np.ndarray: (LATITUDES, LONGITUDES, 3) RGB image, north up, one color by image and the borders of the cells in black
+    """
+
+    colors = np.random.default_rng(0).integers(64, 256, size=(int(table.max()) + 1, 3), dtype=np.uint8)
+    coverage = colors[table]
+    borders = np.zeros(table.shape, dtype=bool)
+    borders[:, 1:] |= table[:, 1:] != table[:, :-1]
+    borders[1:, :] |= table[1:, :] != table[:-1, :]
+    coverage[borders] = 0
+    return coverage[::-1]
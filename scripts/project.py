@@ -0,0 +1,719 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import json
+import tempfile
+import threading
+import traceback
+import numpy as np
+
+from scripts import converters, reconstruction
+
+BINARY_FORMAT = "sphaeroptica-binary"
+BINARY_VERSION = 2
+ARRAYS_EXTENSION = ".npz"
+STATE_EXTENSION = ".state"
+SAVE_DELAY = 1.0 # s
+# camera model of the images without one, given by the "intrinsics" of the project
+DEFAULT_CAMERA = "default"
+
+class CameraSet():
+    """Calibration of the images of a project, the extrinsics are kept in one contiguous array
+    Each image references a camera model (intrinsic matrix, distortion coefficients and size of the images),
+    the first model is the one of the "intrinsics" of the project
+    """
+
+    def __init__(self, names, extrinsics, intrinsics, dist_coeffs, centers=None, models=None, camera_index=None, sizes=None) -> None:
+        self.names : list[str] = [str(name) for name in names]
+        self.index : dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.extrinsics = np.ascontiguousarray(extrinsics, dtype=np.float64).reshape((-1, 4, 4))
+        # (M,3,3) and (M,K) for M camera models
+        self.intrinsics = np.asarray(intrinsics, dtype=np.float64).reshape((-1, 3, 3))
+        self.dist_coeffs = stack_dist_coeffs(dist_coeffs, len(self.intrinsics))
+        self.models : list[str] = [str(model) for model in models] if models is not None else [DEFAULT_CAMERA]
+        # (M,2) width and height of the images of each model, 0 if unknown
+        self.sizes = np.asarray(sizes, dtype=np.int64).reshape((-1, 2)) if sizes is not None else np.zeros((len(self.models), 2), dtype=np.int64)
+        # (N,) camera model of each image
+        self.camera_index = np.asarray(camera_index, dtype=np.int32).reshape(-1) if camera_index is not None else np.zeros(len(self.names), dtype=np.int32)
+        self.centers = np.ascontiguousarray(centers, dtype=np.float64).reshape((-1, 3)) if centers is not None else get_camera_centers(self.extrinsics)
+        self.modified = False
+        self.clear_caches()
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, image):
+        return image in self.index
+
+    def clear_caches(self):
+        # values derived from the camera models, computed when first used
+        self.distortion = None
+        self.projections = None
+        # (model, box) -> scale factors and intrinsic matrix of the resized images
+        self.scales : dict[tuple, tuple] = dict()
+        self.scaled_intrinsics : dict[tuple, np.ndarray] = dict()
+
+    def get_camera(self, image=None) -> int:
+        """get the camera model of an image
+
+        Args:
+            image (str, optional): image. Defaults to None (the model of the project).
+
+        Returns:
+            int: index of the model
+        """
+
+        return int(self.camera_index[self.index[image]]) if image is not None else 0
+
+    def get_camera_name(self, image=None) -> str:
+        return self.models[self.get_camera(image)]
+
+    def get_intrinsics(self, image=None) -> np.matrix:
+        return np.asmatrix(self.intrinsics[self.get_camera(image)])
+
+    def get_dist_coeffs(self, image=None) -> np.matrix:
+        return np.asmatrix(self.dist_coeffs[self.get_camera(image)])
+
+    def get_size(self, image=None) -> tuple:
+        return tuple(int(x) for x in self.sizes[self.get_camera(image)])
+
+    def get_rows(self, images) -> np.ndarray:
+        return np.array([self.index[image] for image in images], dtype=int)
+
+    def get_distortion(self) -> np.ndarray:
+        """get the distortion coefficients of every model, padded to the 8 coefficients of OpenCV
+
+        Returns:
+            np.ndarray: (M,8) coefficients
+        """
+
+        if self.distortion is None:
+            self.distortion = reconstruction.pad_dist_coeffs(self.dist_coeffs)
+        return self.distortion
+
+    def gather(self, images):
+        """get the camera model of each image at once
+
+        Args:
+            images (list): images, an image can be repeated (one by observation)
+
+        Returns:
+            np.ndarray: (V,3,3) intrinsic matrices
+            np.ndarray: (V,8) distortion coefficients (see get_distortion)
+        """
+
+        models = self.camera_index[self.get_rows(images)]
+        return self.intrinsics[models], self.get_distortion()[models]
+
+    def get_projection_matrices(self, images) -> np.ndarray:
+        """get the projection matrices (intrinsics @ extrinsics) of images
+
+        Args:
+            images (list): images
+
+        Returns:
+            np.ndarray: (V,3,4) projection matrices
+        """
+
+        if self.projections is None:
+            self.projections = np.einsum("nij,njk->nik", self.intrinsics[self.camera_index], self.extrinsics[:, 0:3, :])
+        return self.projections[self.get_rows(images)]
+
+    def get_scale(self, image, box : tuple) -> tuple:
+        """get the scale factors of an image resized to fit in a box (its thumbnail for example)
+
+        Args:
+            image (str): image
+            box (tuple): maximum width and height of the resized image
+
+        Returns:
+            tuple(float, float): horizontal and vertical factors
+        """
+
+        model = self.get_camera(image)
+        key = (model, int(box[0]), int(box[1]))
+        if key not in self.scales:
+            width, height = self.sizes[model] if self.sizes[model].all() else self.sizes[0]
+            if width == 0 or height == 0:
+                # unknown size, the images fill the box
+                width, height = box
+            scale = min(box[0] / width, box[1] / height)
+            self.scales[key] = (round(width * scale) / width, round(height * scale) / height)
+        return self.scales[key]
+
+    def get_scaled_intrinsics(self, image, box : tuple) -> np.matrix:
+        """get the intrinsic matrix of an image resized to fit in a box (see get_scale)
+
+        Args:
+            image (str): image, None for the model of the project
+            box (tuple): maximum width and height of the resized image
+
+        Returns:
+            np.matrix: intrinsic matrix of the resized image
+        """
+
+        model = self.get_camera(image)
+        key = (model, int(box[0]), int(box[1]))
+        if key not in self.scaled_intrinsics:
+            factor, second_factor = self.get_scale(image, box)
+            factor_mat = np.array([[factor, 0, 0],[0, second_factor, 0],[0,0,1]])
+            self.scaled_intrinsics[key] = factor_mat @ self.intrinsics[model]
+        return np.asmatrix(self.scaled_intrinsics[key])
+
+    def get_matrix(self, image) -> list:
+        return self.extrinsics[self.index[image]].tolist()
+
+    def get_extrinsics(self, image) -> np.matrix:
+        """get the extrinsic matrix (3x4) of an image
+
+        Args:
+            image (str): image
+
+        Returns:
+            np.matrix: extrinsic matrix
+        """
+
+        return np.asmatrix(self.extrinsics[self.index[image], 0:3, 0:4])
+
+    def get_center(self, image) -> np.ndarray:
+        return self.centers[self.index[image]]
+
+    def add_model(self, name : str, intrinsics, dist_coeffs, size : tuple = (0, 0)) -> int:
+        """Add or update a camera model
+
+        Args:
+            name (str): name of the model
+            intrinsics (np.ndarray): intrinsic matrix
+            dist_coeffs (np.ndarray): distortion coefficients
+            size (tuple, optional): width and height of its images. Defaults to (0, 0) (unknown).
+
+        Returns:
+            int: index of the model
+        """
+
+        dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).reshape((1, -1))
+        if name in self.models:
+            model = self.models.index(name)
+        else:
+            model = len(self.models)
+            self.models.append(name)
+            self.intrinsics = np.concatenate([self.intrinsics, np.zeros((1, 3, 3))])
+            self.sizes = np.concatenate([self.sizes, np.zeros((1, 2), dtype=np.int64)])
+        self.dist_coeffs = stack_dist_coeffs(list(self.dist_coeffs[0:model]) + [dist_coeffs[0]] + list(self.dist_coeffs[model+1:]), len(self.models))
+        self.intrinsics[model] = np.asarray(intrinsics, dtype=np.float64).reshape((3, 3))
+        self.sizes[model] = size
+        self.modified = True
+        self.clear_caches()
+        return model
+
+    def set_extrinsics(self, image, matrix, camera : str = None):
+        """Add or update the extrinsic matrix of an image
+
+        Args:
+            image (str): image
+            matrix (list): 4x4 extrinsic matrix
+            camera (str, optional): camera model of the image. Defaults to None (unchanged, the model of the project for a new image).
+        """
+
+        matrix = np.asarray(matrix, dtype=np.float64).reshape((1, 4, 4))
+        center = get_camera_centers(matrix)
+        if image in self.index:
+            self.extrinsics[self.index[image]] = matrix[0]
+            self.centers[self.index[image]] = center[0]
+        else:
+            self.index[image] = len(self.names)
+            self.names.append(image)
+            self.extrinsics = np.concatenate([self.extrinsics, matrix])
+            self.centers = np.concatenate([self.centers, center])
+            self.camera_index = np.concatenate([self.camera_index, np.zeros(1, dtype=np.int32)])
+        if camera is not None:
+            self.camera_index[self.index[image]] = self.models.index(camera)
+        self.projections = None
+        self.modified = True
+
+    def to_dict(self) -> dict:
+        """Extrinsics in the format of the JSON project file
+
+        Returns:
+            dict: image -> {"matrix": 4x4 list, "camera": model if it isn't the model of the project}
+        """
+
+        matrices = self.extrinsics.tolist()
+        extrinsics = {name: {"matrix": matrices[i]} for i, name in enumerate(self.names)}
+        for i in np.flatnonzero(self.camera_index).tolist():
+            extrinsics[self.names[i]]["camera"] = self.models[self.camera_index[i]]
+        return extrinsics
+
+    def models_to_dict(self) -> dict:
+        """Camera models other than the one of the project, in the format of the JSON project file
+
+        Returns:
+            dict: model -> {"width", "height", "camera matrix", "distortion matrix"}
+        """
+
+        return {self.models[model]: {"width": int(self.sizes[model][0]),
+                                     "height": int(self.sizes[model][1]),
+                                     "camera matrix": {"shape": [3, 3], "matrix": self.intrinsics[model].tolist()},
+                                     "distortion matrix": {"shape": [self.dist_coeffs.shape[1], 1], "matrix": self.dist_coeffs[model:model+1].tolist()}}
+                for model in range(1, len(self.models))}
+
+def stack_dist_coeffs(dist_coeffs, count : int) -> np.ndarray:
+    """Stack the distortion coefficients of camera models, padded with zeros to the same length
+
+    Args:
+        dist_coeffs (list): distortion coefficients of each model (or one array)
+        count (int): number of models
+
+    Returns:
+        np.ndarray: (count, K) coefficients
+    """
+
+    if count > 1 and isinstance(dist_coeffs, (list, tuple)):
+        rows = [np.asarray(coeffs, dtype=np.float64).reshape(-1) for coeffs in dist_coeffs]
+    else:
+        rows = list(np.asarray(dist_coeffs, dtype=np.float64).reshape((count, -1)))
+    length = max(len(row) for row in rows) if len(rows) != 0 else 0
+    return np.array([np.concatenate([row, np.zeros(length - len(row))]) for row in rows]).reshape((count, length))
+
+class Project():
+    """Project file, small values (commands, thumbnails...) are kept in the header
+    and the calibration in a CameraSet
+    """
+
+    def __init__(self, path : str, header : dict, cameras : CameraSet, sphere_center=None, long_lat=None, sphere_names=None) -> None:
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.file_name = os.path.basename(path)
+        self.header = header
+        self.cameras = cameras
+        # precomputed values of the binary format, the sphere is fitted on the images of sphere_names
+        self.sphere_center = sphere_center
+        self.long_lat = long_lat
+        self.sphere_names = sphere_names
+        # small values changed by the user, saved next to the project file
+        self.state = ProjectState(get_state_path(path))
+
+    def get_path(self):
+        return f"{self.directory}/{self.file_name}"
+
+    def is_binary(self):
+        return self.header.get("format") == BINARY_FORMAT
+
+    def get_arrays_path(self):
+        return f"{self.directory}/{self.header['arrays']}"
+
+    def get_thumbnail_names(self) -> list:
+        thumbnails_dir = f"{self.directory}/{self.header['thumbnails']}"
+        return os.listdir(thumbnails_dir) if os.path.isdir(thumbnails_dir) else []
+
+    def get_commands(self) -> dict:
+        return self.state.get("commands", self.header["commands"])
+
+    def set_command(self, key, angles):
+        """Set the angles of a shortcut view, only the state file is written
+
+        Args:
+            key (str): name of the shortcut
+            angles (tuple(int, int)): longitude and latitude
+        """
+
+        commands = dict(self.get_commands())
+        commands[key] = list(angles)
+        self.state.set("commands", commands)
+
+    def get_setting(self, key, default=None):
+        return self.state.get("settings", {}).get(key, default)
+
+    def set_setting(self, key, value):
+        settings = dict(self.state.get("settings", {}))
+        settings[key] = value
+        self.state.set("settings", settings)
+
+    def get_curves(self) -> list:
+        return self.state.get("curves", [])
+
+    def set_curves(self, curves : list):
+        """Keep the curves of semi-landmarks in the state file
+
+        Args:
+            curves (list): curves as dicts (see curves.Curve.to_dict)
+        """
+
+        self.state.set("curves", curves)
+
+    def close(self):
+        """Write the pending changes of the state file
+        """
+
+        self.state.flush()
+
+    def save(self):
+        """Save the project in its own format
+        The arrays of a binary project are only written if the calibration changed
+        """
+
+        if self.is_binary():
+            save_binary(self, self.get_path(), write_arrays=self.cameras.modified or not os.path.exists(self.get_arrays_path()))
+        else:
+            save_json(self, self.get_path())
+        self.cameras.modified = False
+
+class DebouncedWriter():
+    """Writes a JSON file atomically in a background thread, once no change happened for a delay
+    """
+
+    def __init__(self, path : str, delay : float = SAVE_DELAY) -> None:
+        self.path = path
+        self.delay = delay
+        self.data = None
+        self.timer = None
+        self.lock = threading.Lock()
+        # only one write at a time, so an older state never replaces a newer one
+        self.write_lock = threading.Lock()
+
+    def schedule(self, data):
+        """Write data after the delay, replaces the data not yet written
+
+        Args:
+            data (object): JSON serializable data, its values are replaced and never mutated afterwards
+                as they are written from another thread
+        """
+
+        with self.lock:
+            self.data = data
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.write)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def write(self):
+        with self.write_lock:
+            with self.lock:
+                data, self.data = self.data, None
+                self.timer = None
+            if data is None:
+                return
+            try:
+                atomic_write_json(self.path, data)
+            except Exception:
+                print(f"Could not save {self.path}")
+                print(traceback.format_exc())
+
+    def flush(self):
+        """Write the pending data now
+        """
+
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+        self.write()
+
+class ProjectState():
+    """Small mutable values of a project (commands, settings...) kept in a sidecar file
+    so the calibration is never rewritten for a change in the interface
+    """
+
+    def __init__(self, path : str) -> None:
+        self.path = path
+        self.values = dict()
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    self.values = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                print(f"State file ignored : {path}")
+        self.writer = DebouncedWriter(path)
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        # the values are always replaced by new objects, a shallow copy is enough
+        self.values[key] = value
+        self.writer.schedule(dict(self.values))
+
+    def flush(self):
+        self.writer.flush()
+
+def get_state_path(path : str) -> str:
+    """get the path of the state file of a project
+
+    Args:
+        path (str): path of the project file
+
+    Returns:
+        str: path of the state file
+    """
+
+    return os.path.splitext(os.path.abspath(path))[0] + STATE_EXTENSION
+
+def atomic_write_json(path : str, data, indent=None):
+    """Write a JSON file in a temporary file and rename it
+    A crash during the write never leaves a corrupted file
+
+    Args:
+        path (str): path of the file
+        data (object): JSON serializable data
+        indent (int, optional): indentation. Defaults to None.
+    """
+
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=indent)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def atomic_savez(path : str, **arrays):
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix=".tmp", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def get_camera_centers(extrinsics : np.ndarray) -> np.ndarray:
+    """get world coordinates of the cameras (- R_t @ T) for a stack of extrinsic matrices
+
+    Args:
+        extrinsics (np.ndarray): (N,4,4) or (N,3,4) extrinsic matrices
+
+    Returns:
+        np.ndarray: (N,3) camera centers
+    """
+
+    rotations = extrinsics[:, 0:3, 0:3]
+    trans = extrinsics[:, 0:3, 3]
+    return -np.einsum('nji,nj->ni', rotations, trans)
+
+def is_binary_header(header : dict) -> bool:
+    return header.get("format") == BINARY_FORMAT
+
+def load_project(path : str) -> Project:
+    """Load a project file, either a legacy JSON file or a binary project (JSON header + arrays)
+
+    Args:
+        path (str): path of the project file
+
+    Returns:
+        Project: the project
+    """
+
+    with open(path, "r") as f:
+        header = json.load(f)
+
+    if is_binary_header(header):
+        return _load_binary(path, header)
+    return from_json_dict(path, header)
+
+def from_json_dict(path : str, calib : dict) -> Project:
+    """Creates a project from the content of a legacy JSON project file
+
+    Args:
+        path (str): path of the project file
+        calib (dict): content of the JSON project file
+
+    Returns:
+        Project: the project
+    """
+
+    header = {key: value for key, value in calib.items() if key != "extrinsics"}
+    intrinsics = header["intrinsics"]
+    extrinsics = calib["extrinsics"]
+    names = list(extrinsics.keys())
+    matrices = np.array([extrinsics[name]["matrix"] for name in names], dtype=np.float64).reshape((-1, 4, 4))
+    # the images of other cameras reference their model
+    models = [(DEFAULT_CAMERA, intrinsics)] + list(header.get("cameras", {}).items())
+    index = {name: i for i, (name, _) in enumerate(models)}
+    camera_index = [index[extrinsics[name].get("camera", DEFAULT_CAMERA)] for name in names]
+    cameras = CameraSet(names, matrices, [model["camera matrix"]["matrix"] for _, model in models], [model["distortion matrix"]["matrix"] for _, model in models],
+                        models=[name for name, _ in models], camera_index=camera_index, sizes=[(model.get("width", 0), model.get("height", 0)) for _, model in models])
+    return Project(path, header, cameras)
+
+def _load_binary(path : str, header : dict) -> Project:
+    arrays_path = f"{os.path.dirname(os.path.abspath(path))}/{header['arrays']}"
+    with np.load(arrays_path, allow_pickle=False) as arrays:
+        # version 1 has one camera model
+        models = header.get("cameras", [])
+        cameras = CameraSet(arrays["names"], arrays["extrinsics"], arrays["camera_matrix"], arrays["dist_coeffs"], arrays["centers"],
+                            models=[DEFAULT_CAMERA] + [model["name"] for model in models],
+                            camera_index=arrays["camera_index"] if "camera_index" in arrays.files else None,
+                            sizes=[(header["intrinsics"].get("width", 0), header["intrinsics"].get("height", 0))] + [(model["width"], model["height"]) for model in models])
+        sphere_center = arrays["sphere_center"] if "sphere_center" in arrays.files else None
+        long_lat = arrays["long_lat"] if "long_lat" in arrays.files else None
+        sphere_names = arrays["sphere_names"].tolist() if "sphere_names" in arrays.files else None
+    return Project(path, header, cameras, sphere_center, long_lat, sphere_names)
+
+def to_json_dict(project : Project) -> dict:
+    """get the legacy JSON project file of a project
+
+    Args:
+        project (Project): project
+
+    Returns:
+        dict: content of a JSON project file
+    """
+
+    calib = {key: value for key, value in project.header.items() if key not in ("format", "version", "arrays")}
+    calib["commands"] = project.get_commands()
+    calib["intrinsics"] = dict(calib["intrinsics"])
+    calib["intrinsics"]["camera matrix"] = {"shape": [3, 3],
+                                            "matrix": project.cameras.intrinsics[0].tolist()}
+    calib["intrinsics"]["distortion matrix"] = {"shape": [project.cameras.dist_coeffs.shape[1], 1],
+                                                "matrix": project.cameras.dist_coeffs[0:1].tolist()}
+    calib.pop("cameras", None)
+    if len(project.cameras.models) > 1:
+        calib["cameras"] = project.cameras.models_to_dict()
+    calib["extrinsics"] = project.cameras.to_dict()
+    return calib
+
+def save_json(project : Project, path : str):
+    """Save the project as a legacy JSON file
+
+    Args:
+        project (Project): project
+        path (str): path of the JSON file
+    """
+
+    atomic_write_json(path, to_json_dict(project))
+
+def save_binary(project : Project, path : str, write_arrays=True):
+    """Save the project as a JSON header and a .npz file next to it
+
+    Args:
+        project (Project): project
+        path (str): path of the header
+        write_arrays (bool, optional): write the arrays. Defaults to True.
+    """
+
+    cameras = project.cameras
+    header = {key: value for key, value in project.header.items() if key != "extrinsics"}
+    header["commands"] = project.get_commands()
+    header["format"] = BINARY_FORMAT
+    header["version"] = BINARY_VERSION
+    header["arrays"] = os.path.splitext(os.path.basename(path))[0] + ARRAYS_EXTENSION
+    # the matrices are in the arrays
+    header["intrinsics"] = {key: value for key, value in header["intrinsics"].items() if key not in ("camera matrix", "distortion matrix")}
+    header.pop("cameras", None)
+    if len(cameras.models) > 1:
+        header["cameras"] = [{"name": cameras.models[model], "width": int(cameras.sizes[model][0]), "height": int(cameras.sizes[model][1])}
+                             for model in range(1, len(cameras.models))]
+
+    if write_arrays:
+        # the same images as get_image_positions : the calibrated images with a thumbnail
+        keys = sorted(name for name in project.get_thumbnail_names() if name in cameras)
+        sphere = dict()
+        if len(keys) != 0:
+            sphere_center, long_lat = get_sphere_coordinates(cameras.centers, cameras.get_rows(keys))
+            sphere = {"sphere_center": sphere_center, "long_lat": long_lat, "sphere_names": np.array(keys, dtype=str)}
+        atomic_savez(f"{os.path.dirname(os.path.abspath(path))}/{header['arrays']}",
+                      names=np.array(cameras.names, dtype=str),
+                      extrinsics=cameras.extrinsics,
+                      camera_matrix=cameras.intrinsics,
+                      dist_coeffs=cameras.dist_coeffs,
+                      camera_index=cameras.camera_index,
+                      centers=cameras.centers,
+                      **sphere)
+        project.sphere_center, project.long_lat = sphere.get("sphere_center"), sphere.get("long_lat")
+        project.sphere_names = keys if len(keys) != 0 else None
+
+    atomic_write_json(path, header, indent=1)
+    project.header = header
+
+def get_sphere_coordinates(centers : np.ndarray, rows : np.ndarray):
+    """Fit the sphere of cameras and get their geographic coordinates
+
+    Args:
+        centers (np.ndarray): (N,3) camera centers
+        rows (np.ndarray): cameras the sphere is fitted on
+
+    Returns:
+        np.ndarray: (3,) center of the sphere
+        np.ndarray: (N,2) longitude and latitude of each camera
+    """
+
+    fitted = centers[rows]
+    _, sphere_center = reconstruction.sphereFit(fitted[:, 0], fitted[:, 1], fitted[:, 2])
+    sphere_center = np.asarray(sphere_center, dtype=np.float64).reshape(3)
+    longitude, latitude = converters.get_long_lat_array(centers - sphere_center)
+    return sphere_center, np.stack([longitude, latitude], axis=1)
+
+def get_image_positions(project : Project, file_names : list):
+    """get the geographic coordinates of calibrated images, used to navigate around the sphere
+
+    Args:
+        project (Project): project
+        file_names (list): images (thumbnails) available
+
+    Returns:
+        list: calibrated images (sorted)
+        np.ndarray: (3,1) center of the sphere
+        np.ndarray: longitude of each image (in radian)
+        np.ndarray: latitude of each image (in radian)
+    """
+
+    cameras = project.cameras
+    keys = sorted(file_name for file_name in file_names if file_name in cameras)
+    rows = np.array([cameras.index[file_name] for file_name in keys], dtype=int)
+
+    if has_sphere_coordinates(project, keys):
+        # precomputed in the binary project, on the same images
+        long_lat = project.long_lat[rows]
+        return keys, project.sphere_center.reshape((3,1)), long_lat[:, 0], long_lat[:, 1]
+
+    #Compute an approximately estimated center of the sphere of images
+    center, long_lat = get_sphere_coordinates(cameras.centers[rows], np.arange(len(keys)))
+    return keys, center.reshape((3,1)), long_lat[:, 0], long_lat[:, 1]
+
+def has_sphere_coordinates(project : Project, keys : list) -> bool:
+    """Check if the sphere precomputed in a binary project was fitted on the given images
+
+    Args:
+        project (Project): project
+        keys (list): calibrated images with a thumbnail (sorted)
+
+    Returns:
+        bool: True if the precomputed center and coordinates can be used
+    """
+
+    return project.sphere_names is not None and list(project.sphere_names) == keys and len(project.long_lat) == len(project.cameras)
@@ -0,0 +1,82 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+from scripts import reconstruction
+
+class ProjectionCache():
+    """Projections of the triangulated landmarks on the images already shown
+    A landmark is projected once by image, until its position changes
+    """
+
+    def __init__(self) -> None:
+        # image -> id -> (x,y), None if the landmark isn't triangulated
+        self.pixels : dict[str, dict[int, tuple]] = dict()
+
+    def clear(self):
+        # the landmarks or the calibration changed
+        self.pixels = dict()
+
+    def invalidate(self, ids : list):
+        """Forget the projections of landmarks whose position changed
+
+        Args:
+            ids (list): ids of the landmarks
+        """
+
+        for pixels in self.pixels.values():
+            for id in ids:
+                pixels.pop(id, None)
+
+    def get(self, cameras, intrinsics, image : str, landmarks) -> dict:
+        """get the projections of the landmarks on an image, the missing ones are computed at once
+
+        Args:
+            cameras (project.CameraSet): cameras of the project
+            intrinsics (np.ndarray): intrinsic matrix of the image (the one of the thumbnails for example)
+            image (str): image
+            landmarks (landmarks.LandmarkStore): landmarks of the project
+
+        Returns:
+            dict: id -> (x,y) of the triangulated landmarks
+        """
+
+        pixels = self.pixels.setdefault(image, dict())
+        ids = landmarks.get_ids()
+        missing = [id for id in ids if id not in pixels]
+        if len(missing) != 0:
+            for id in missing:
+                pixels[id] = None
+            triangulated, positions = landmarks.get_positions(missing)
+            if len(triangulated) != 0:
+                projected = reconstruction.project_points_array(positions, intrinsics, cameras.get_extrinsics(image), cameras.get_dist_coeffs(image))
+                for id, pixel in zip(triangulated, projected.tolist()):
+                    pixels[id] = tuple(pixel)
+        return {id: pixels[id] for id in ids if pixels[id] is not None}
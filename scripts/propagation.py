@@ -0,0 +1,179 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import cv2 as cv
+import numpy as np
+
+from scripts import helpers, reconstruction, converters
+
+# number of neighbouring images a pose is propagated to
+NEIGHBOURS = 4
+# size of the window of the Lucas-Kanade tracker and number of levels of its pyramid
+WINDOW = 31
+LEVELS = 4
+# margin read around the poses on each image (in pixel)
+MARGIN = 400
+# forward-backward error (in pixel) giving a confidence of 1/e
+FB_SIGMA = 2.0
+# under that confidence, a propagated pose is not suggested
+MIN_CONFIDENCE = 0.5
+
+def get_nearest_images(cameras, center, image, k : int = NEIGHBOURS) -> list:
+    """get the images whose camera is the closest to the camera of an image on the sphere
+
+    Args:
+        cameras (project.CameraSet): cameras of the project
+        center (np.ndarray): center of the sphere
+        image (str): image
+        k (int, optional): number of images. Defaults to NEIGHBOURS.
+
+    Returns:
+        list: the k nearest images, nearest first
+    """
+
+    directions = cameras.centers - np.asarray(center).reshape((1, 3))
+    longitudes, latitudes = converters.get_long_lat_array(directions)
+    index = cameras.index[image]
+    angles = converters.get_central_angles(longitudes, latitudes, longitudes[index], latitudes[index])
+    angles[index] = np.inf
+    nearest = np.argsort(angles)[:k]
+    return [cameras.names[i] for i in nearest if np.isfinite(angles[i])]
+
+def transfer_poses(points, intrinsics, dist_coeffs, ext_src, ext_dst, center, intrinsics_dst=None, dist_coeffs_dst=None) -> np.ndarray:
+    """Guess where pixels of an image are on another one,
+    the points are supposed on the plane facing the source camera through the center of the sphere
+
+    Args:
+        points (np.ndarray): (N,2) pixels on the source image
+        intrinsics (np.ndarray): intrinsic matrix
+        dist_coeffs (np.ndarray): distortion coefficients
+        ext_src (np.ndarray): extrinsic matrix of the source image
+        ext_dst (np.ndarray): extrinsic matrix of the destination image
+        center (np.ndarray): center of the sphere
+        intrinsics_dst (np.ndarray, optional): intrinsic matrix of the destination image. Defaults to None (the one of the source image).
+        dist_coeffs_dst (np.ndarray, optional): distortion coefficients of the destination image. Defaults to None (the ones of the source image).
+
+    Returns:
+        np.ndarray: (N,2) pixels on the destination image
+    """
+
+    ext_src = np.asarray(ext_src)
+    undistorted = reconstruction.undistort_points_array(points, intrinsics, dist_coeffs)
+    rays = np.linalg.inv(np.asarray(intrinsics)) @ np.vstack([undistorted.T, np.ones(len(undistorted))])
+    # depth of the center of the sphere in the source camera
+    depth = (ext_src[0:3, 0:3] @ np.asarray(center).reshape(3) + ext_src[0:3, 3])[2]
+    points3D = ext_src[0:3, 0:3].T @ (rays * depth - ext_src[0:3, 3:4])
+    if intrinsics_dst is None:
+        intrinsics_dst, dist_coeffs_dst = intrinsics, dist_coeffs
+    return reconstruction.project_points_array(points3D.T, intrinsics_dst, ext_dst, dist_coeffs_dst)
+
+def make_jobs(cameras, center, directory : str, image : str, poses : dict, targets : dict) -> list:
+    """Prepare the tracking of poses of an image into other images, one job by image
+
+    Args:
+        cameras (project.CameraSet): cameras of the project
+        center (np.ndarray): center of the sphere
+        directory (str): directory of the images
+        image (str): image of the poses
+        poses (dict): id -> helpers.Pose on the image
+        targets (dict): image -> ids of the landmarks to track into it
+
+    Returns:
+        list: jobs, see track_poses
+    """
+
+    intrinsics = cameras.get_intrinsics(image)
+    dist_coeffs = cameras.get_dist_coeffs(image)
+    jobs = []
+    for target, ids in targets.items():
+        points = np.array([poses[id].to_array() for id in ids])
+        guesses = transfer_poses(points, intrinsics, dist_coeffs, cameras.get_extrinsics(image), cameras.get_extrinsics(target), center,
+                                 cameras.get_intrinsics(target), cameras.get_dist_coeffs(target))
+        jobs.append({"source": f"{directory}/{image}",
+                     "target": f"{directory}/{target}",
+                     "image": target,
+                     "ids": list(ids),
+                     "points": points,
+                     "guesses": guesses})
+    return jobs
+
+def _get_window(points, size, shape):
+    # region of the image of the given size around the points
+    top_left = np.floor(points.min(axis=0)).astype(int) - MARGIN
+    top_left = np.clip(top_left, 0, np.maximum([shape[1] - size[0], shape[0] - size[1]], 0))
+    return top_left, top_left + size
+
+def track_poses(job : dict) -> dict:
+    """Track poses into another image with a pyramidal Lucas-Kanade tracker
+    The tracker starts from the guess of each pose and is run back to measure its confidence
+
+    Args:
+        job (dict): source and target images, ids, (N,2) points on the source and their guesses on the target
+
+    Returns:
+        dict: id -> (helpers.Pose, confidence between 0 and 1) of the poses tracked into the target image
+    """
+
+    source = cv.imread(job["source"], cv.IMREAD_GRAYSCALE)
+    target = cv.imread(job["target"], cv.IMREAD_GRAYSCALE)
+    if source is None or target is None:
+        return dict()
+    points = np.asarray(job["points"], dtype=np.float32)
+    guesses = np.asarray(job["guesses"], dtype=np.float32)
+
+    # only the regions around the poses are tracked, the pyramid does the coarse search
+    # both regions have the same size, as the levels of the pyramids have to match
+    size = np.ceil(np.maximum(np.ptp(points, axis=0), np.ptp(guesses, axis=0))).astype(int) + 2*MARGIN
+    size = np.minimum(size, [min(source.shape[1], target.shape[1]), min(source.shape[0], target.shape[0])])
+    src_min, src_max = _get_window(points, size, source.shape)
+    dst_min, dst_max = _get_window(guesses, size, target.shape)
+    source = np.ascontiguousarray(source[src_min[1]:src_max[1], src_min[0]:src_max[0]])
+    target = np.ascontiguousarray(target[dst_min[1]:dst_max[1], dst_min[0]:dst_max[0]])
+    p0 = (points - src_min).reshape((-1, 1, 2)).astype(np.float32)
+    p1 = (guesses - dst_min).reshape((-1, 1, 2)).astype(np.float32)
+
+    params = {"winSize": (WINDOW, WINDOW),
+              "maxLevel": LEVELS,
+              "criteria": (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 30, 0.01),
+              "flags": cv.OPTFLOW_USE_INITIAL_FLOW}
+    tracked, status, _ = cv.calcOpticalFlowPyrLK(source, target, p0, p1.copy(), **params)
+    back, back_status, _ = cv.calcOpticalFlowPyrLK(target, source, tracked, p0.copy(), **params)
+
+    errors = np.linalg.norm((back - p0).reshape((-1, 2)), axis=1)
+    confidences = status.reshape(-1) * back_status.reshape(-1) * np.exp(-errors / FB_SIGMA)
+    tracked = tracked.reshape((-1, 2)) + dst_min
+
+    results = dict()
+    for id, (x, y), confidence in zip(job["ids"], tracked.tolist(), confidences.tolist()):
+        if confidence > 0:
+            results[id] = (helpers.Pose(x, y), confidence)
+    return results
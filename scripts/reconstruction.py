@@ -90,6 +90,34 @@ class Landmark():
                 "color": self.color,
                 "position": helpers.Pose(rep_point.item(0),rep_point.item(1)) if rep_point is not None else None }
 
+    def to_dict(self) -> dict:
+        """Landmark in a JSON serializable form
+
+        Returns:
+            dict: id, label, color, position and poses
+        """
+
+        return {"id": self.id,
+                "label": self.label,
+                "color": self.color.name(),
+                "position": [float(x) for x in self.position] if self.position is not None else None,
+                "poses": {image: pose.to_array() for image, pose in self.poses.items() if pose is not None}}
+
+    @staticmethod
+    def from_dict(values : dict):
+        """Creates a landmark from its JSON serializable form
+
+        Args:
+            values (dict): id, label, color, position and poses
+
+        Returns:
+            Landmark: the landmark
+        """
+
+        position = tuple(values["position"]) if values.get("position") is not None else None
+        poses = {image: helpers.Pose(pose[0], pose[1]) for image, pose in values.get("poses", {}).items()}
+        return Landmark(values["id"], values["label"], QColor(values["color"]), position, poses)
+
     def __eq__(self, other):
         if isinstance(other, Landmark):
             return self.id == other.id
@@ -221,6 +249,25 @@ def project_points(point3D, intrinsics, extrinsics, dist_coeffs=np.matrix([0 for
     pos = distort(pos, intrinsics, dist_coeffs)
     return pos.reshape(2,1)
 
+def project_points_array(points3D, intrinsics, extrinsics, dist_coeffs=np.matrix([0 for x in range(OPENCV_DISTORT_VALUES)])):
+    """project several 3D points to the 2D image plane at once (see project_points)
+
+    Args:
+        points3D (np.ndarray): (N,3) coordinates of the points
+        intrinsics (np.ndarray): intrinsic matrix
+        extrinsics (np.ndarray): extrinsic matrix
+        dist_coeffs (np.ndarray, optional): distortion coefficients. Defaults to np.matrix([0 for x in range(OPENCV_DISTORT_VALUES)]).
+
+    Returns:
+        np.ndarray: (N,2) pixels of the reprojections, not rounded (the images can be thumbnails)
+    """
+
+    points3D = np.asarray(points3D, dtype=np.float64).reshape((-1, 3))
+    homogeneous = np.hstack([points3D, np.ones((len(points3D), 1))])
+    points = np.asarray(intrinsics @ extrinsics @ homogeneous.T)
+    pixels = points[0:2] / points[2]
+    return np.asarray(distort(pixels, intrinsics, dist_coeffs)).reshape((-1, 2))
+
 # Since distort() is non-linear, need a non linear solver
 # fast solver from opencv
 def undistort_iter(point, intrinsics, dist_coeffs, nbr_iter=500):
@@ -259,6 +306,140 @@ def undistort_iter(point, intrinsics, dist_coeffs, nbr_iter=500):
     
     return denormalize_pixel([x, y], intrinsics).reshape(2,1)
 
+def undistort_points_array(points, intrinsics, dist_coeffs, nbr_iter=500):
+    """undistort several pixels at once (see undistort_iter)
+
+    Args:
+        points (np.ndarray): (N,2) distorted pixels
+        intrinsics (np.ndarray): intrinsic matrix
+        dist_coeffs (np.ndarray): distortion coefficients
+        nbr_iter (int, optional): number of maximum iteration of the solver. Defaults to 500.
+
+    Returns:
+        np.ndarray: (N,2) undistorted pixels
+    """
+
+    points = np.asarray(points, dtype=np.float64).reshape((-1, 2))
+    k1,k2,p1,p2,k3,k4,k5,k6 = [x[0] for x in np.concatenate([dist_coeffs, np.matrix([0 for x in range(OPENCV_DISTORT_VALUES - dist_coeffs.shape[1])])], axis=1).reshape((8,1)).tolist()]
+
+    x, y = normalize_pixel(points.T, intrinsics)
+    x0 = x
+    y0 = y
+    for _ in range(nbr_iter):
+        r2 = x ** 2 + y ** 2
+        k_inv = (1 + k4 * r2 + k5 * r2**2 + k6 * r2**3) / (1 + k1 * r2 + k2 * r2**2 + k3 * r2**3)
+        delta_x = 2 * p1 * x*y + p2 * (r2 + 2 * x**2)
+        delta_y = p1 * (r2 + 2 * y**2) + 2 * p2 * x*y
+        xant = x
+        yant = y
+        x = (x0 - delta_x) * k_inv
+        y = (y0 - delta_y) * k_inv
+        if np.all((xant - x)**2+ (yant - y)**2 == 0):
+            break
+
+    return denormalize_pixel([x, y], intrinsics).T
+
+def pad_dist_coeffs(dist_coeffs) -> np.ndarray:
+    """Pad distortion coefficients with zeros to the 8 coefficients of OpenCV
+
+    Args:
+        dist_coeffs (np.ndarray): (M,K) distortion coefficients of M camera models
+
+    Returns:
+        np.ndarray: (M,8) k1, k2, p1, p2, k3, k4, k5, k6 of each model
+    """
+
+    dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64)
+    dist_coeffs = dist_coeffs.reshape((-1, dist_coeffs.shape[-1] if dist_coeffs.ndim != 0 else 1))
+    padded = np.zeros((len(dist_coeffs), OPENCV_DISTORT_VALUES))
+    padded[:, 0:min(dist_coeffs.shape[1], OPENCV_DISTORT_VALUES)] = dist_coeffs[:, 0:OPENCV_DISTORT_VALUES]
+    return padded
+
+def undistort_observations(points, intrinsics, distortion, nbr_iter=500):
+    """undistort pixels of several images at once, each pixel with the camera model of its image (see undistort_iter)
+
+    Args:
+        points (np.ndarray): (N,2) distorted pixels
+        intrinsics (np.ndarray): (N,3,3) intrinsic matrix of each pixel
+        distortion (np.ndarray): (N,8) distortion coefficients of each pixel (see pad_dist_coeffs)
+        nbr_iter (int, optional): number of maximum iteration of the solver. Defaults to 500.
+
+    Returns:
+        np.ndarray: (N,2) undistorted pixels
+    """
+
+    points = np.asarray(points, dtype=np.float64).reshape((-1, 2))
+    intrinsics = np.asarray(intrinsics, dtype=np.float64)
+    k1, k2, p1, p2, k3, k4, k5, k6 = np.asarray(distortion, dtype=np.float64).T
+    fx, fy, cx, cy = intrinsics[:, 0, 0], intrinsics[:, 1, 1], intrinsics[:, 0, 2], intrinsics[:, 1, 2]
+
+    x0 = x = (points[:, 0] - cx) / fx
+    y0 = y = (points[:, 1] - cy) / fy
+    for _ in range(nbr_iter):
+        r2 = x ** 2 + y ** 2
+        k_inv = (1 + k4 * r2 + k5 * r2**2 + k6 * r2**3) / (1 + k1 * r2 + k2 * r2**2 + k3 * r2**3)
+        delta_x = 2 * p1 * x*y + p2 * (r2 + 2 * x**2)
+        delta_y = p1 * (r2 + 2 * y**2) + 2 * p2 * x*y
+        xant = x
+        yant = y
+        x = (x0 - delta_x) * k_inv
+        y = (y0 - delta_y) * k_inv
+        if np.all((xant - x)**2+ (yant - y)**2 == 0):
+            break
+
+    return np.stack([x * fx + cx, y * fy + cy], axis=1)
+
+def project_observations(points3D, intrinsics, extrinsics, distortion):
+    """project 3D points on several images at once, each point with the camera of its image (see project_points_array)
+
+    Args:
+        points3D (np.ndarray): (N,3) coordinates of the points
+        intrinsics (np.ndarray): (N,3,3) intrinsic matrix of each point
+        extrinsics (np.ndarray): (N,3,4) extrinsic matrix of each point
+        distortion (np.ndarray): (N,8) distortion coefficients of each point (see pad_dist_coeffs)
+
+    Returns:
+        np.ndarray: (N,2) pixels of the reprojections
+    """
+
+    points3D = np.asarray(points3D, dtype=np.float64).reshape((-1, 3))
+    intrinsics = np.asarray(intrinsics, dtype=np.float64)
+    homogeneous = np.hstack([points3D, np.ones((len(points3D), 1))])
+    points = np.einsum("nij,njk,nk->ni", intrinsics, np.asarray(extrinsics, dtype=np.float64)[:, 0:3, 0:4], homogeneous)
+    pixels = points[:, 0:2] / points[:, 2:3]
+
+    k1, k2, p1, p2, k3, k4, k5, k6 = np.asarray(distortion, dtype=np.float64).T
+    fx, fy, cx, cy = intrinsics[:, 0, 0], intrinsics[:, 1, 1], intrinsics[:, 0, 2], intrinsics[:, 1, 2]
+    x_u = (pixels[:, 0] - cx) / fx
+    y_u = (pixels[:, 1] - cy) / fy
+    r2 = x_u ** 2 + y_u ** 2
+    x = (x_u * (1+k1*r2 + k2*(r2**2) + k3*(r2**3))/(1+k4*r2+k5*(r2**2) + k6*(r2**3))) + 2*p1*x_u*y_u + p2*(r2+2*(x_u**2))
+    y = (y_u * (1+k1*r2 + k2*(r2**2) + k3*(r2**3))/(1+k4*r2+k5*(r2**2) + k6*(r2**3))) + 2*p2*x_u*y_u + p1*(r2+2*(y_u**2))
+    return np.stack([x * fx + cx, y * fy + cy], axis=1)
+
+def triangulate_points_array(proj_mats, points):
+    """Triangulate several points seen on the same images at once (see triangulate_point)
+
+    Args:
+        proj_mats (np.ndarray): (V,3,4) projection matrices of the images
+        points (np.ndarray): (V,N,2) undistorted pixels of the N points on each image
+
+    Returns:
+        np.ndarray: (N,3) 3D locations of the points
+    """
+
+    proj_mats = np.asarray(proj_mats, dtype=np.float64)
+    points = np.asarray(points, dtype=np.float64)
+    # (N,V,2,4) rows of the linear system of each point, as in triangulate_point
+    rows_y = points[:, :, 1, None] * proj_mats[:, None, 2, :] - proj_mats[:, None, 1, :]
+    rows_x = proj_mats[:, None, 0, :] - points[:, :, 0, None] * proj_mats[:, None, 2, :]
+    A = np.stack([rows_y, rows_x], axis=2).transpose((1, 0, 2, 3)).reshape((points.shape[1], -1, 4))
+
+    _, _, Vh = np.linalg.svd(A, full_matrices=False)
+    X = Vh[:, -1, :]
+
+    return X[:, 0:3] / X[:, 3:4]
+
 # Non Linear from Amy Tabb
 def distort(point, intrinsics, dist_coeffs):
     """Non linear algorithm of lens distortion (explained by Amy Tabb)
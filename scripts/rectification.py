@@ -0,0 +1,210 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+import cv2 as cv
+import numpy as np
+
+from scripts import project, reconstruction
+
+# folder of the project where the rectification maps are cached
+FOLDER = "rectification"
+# the rectified images are at most that wide
+RECTIFIED_WIDTH = 2048
+# rows of a tile rectified at once
+TILE_HEIGHT = 256
+
+class Rectification():
+    """Rectification of a pair of images, the epipolar lines of the rectified images are their rows
+    """
+
+    def __init__(self, images, rotations, projections, maps_x, maps_y, size) -> None:
+        self.images : list[str] = list(images)
+        self.rotations : list[np.ndarray] = list(rotations)
+        self.projections : list[np.ndarray] = list(projections)
+        # (height, width) float32 position on the original image of each rectified pixel
+        self.maps_x : list[np.ndarray] = list(maps_x)
+        self.maps_y : list[np.ndarray] = list(maps_y)
+        self.size : tuple[int, int] = tuple(int(x) for x in size)
+        # the epipolar lines are columns if the cameras are above each other
+        self.vertical : bool = abs(self.projections[1][1, 3]) > abs(self.projections[1][0, 3])
+
+    def to_rectified(self, index : int, points, intrinsics, dist_coeffs) -> np.ndarray:
+        """Position of pixels of an original image on its rectified image
+
+        Args:
+            index (int): index of the image in the pair
+            points (np.ndarray): (N,2) pixels on the original image
+            intrinsics (np.ndarray): intrinsic matrix of the image
+            dist_coeffs (np.ndarray): distortion coefficients of the image
+
+        Returns:
+            np.ndarray: (N,2) pixels on the rectified image
+        """
+
+        points = np.asarray(points, dtype=np.float64).reshape((-1, 1, 2))
+        return cv.undistortPoints(points, np.asarray(intrinsics), np.asarray(dist_coeffs), R=self.rotations[index], P=self.projections[index]).reshape((-1, 2))
+
+    def from_rectified(self, index : int, x : float, y : float) -> tuple:
+        """Position on the original image of a pixel of a rectified image (bilinear interpolation of the maps)
+
+        Args:
+            index (int): index of the image in the pair
+            x (float): x on the rectified image
+            y (float): y on the rectified image
+
+        Returns:
+            tuple(float, float): x and y on the original image
+        """
+
+        map_x = np.array([[x]], dtype=np.float32)
+        map_y = np.array([[y]], dtype=np.float32)
+        original_x = cv.remap(self.maps_x[index], map_x, map_y, cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+        original_y = cv.remap(self.maps_y[index], map_x, map_y, cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+        return float(original_x[0, 0]), float(original_y[0, 0])
+
+def get_pair_path(directory : str, images : list) -> str:
+    names = [os.path.splitext(image)[0] for image in images]
+    return f"{directory}/{FOLDER}/{names[0]}__{names[1]}.npz"
+
+def compute_rectification(images : list, intrinsics, dist_coeffs, extrinsics : list, width : int, height : int, center) -> Rectification:
+    """Computes the rectification of a pair of images (stereoRectify of OpenCV)
+    The rectified images are shifted so the center of the sphere is in their middle
+
+    Args:
+        images (list): the 2 images
+        intrinsics (list): intrinsic matrix of each image
+        dist_coeffs (list): distortion coefficients of each image
+        extrinsics (list): extrinsic matrix of each image
+        width (int): width of the first image
+        height (int): height of the first image
+        center (np.ndarray): center of the sphere
+
+    Returns:
+        Rectification: rectification of the pair
+    """
+
+    intrinsics = [np.asarray(matrix, dtype=np.float64) for matrix in intrinsics]
+    dist_coeffs = [np.asarray(coeffs, dtype=np.float64) for coeffs in dist_coeffs]
+    ext_1, ext_2 = [np.asarray(matrix, dtype=np.float64) for matrix in extrinsics]
+    # pose of the second camera relative to the first one
+    rotation = ext_2[0:3, 0:3] @ ext_1[0:3, 0:3].T
+    translation = ext_2[0:3, 3] - rotation @ ext_1[0:3, 3]
+    scale = min(1.0, RECTIFIED_WIDTH / width)
+    size = (int(width*scale), int(height*scale))
+    R1, R2, P1, P2, _, _, _ = cv.stereoRectify(intrinsics[0], dist_coeffs[0], intrinsics[1], dist_coeffs[1], (width, height), rotation, translation,
+                                               flags=0, alpha=0, newImageSize=size)
+
+    # same scale as the original images, whatever the rotation of the rectification
+    for P in (P1, P2):
+        P[0:2, :] *= scale * intrinsics[0][0, 0] / P[0, 0]
+
+    # the cameras converge on the object, which can be far from the middle of the rectified images
+    shifts = []
+    for K, D, ext, R, P in ((intrinsics[0], dist_coeffs[0], ext_1, R1, P1), (intrinsics[1], dist_coeffs[1], ext_2, R2, P2)):
+        pixel = reconstruction.project_points_array([np.asarray(center).reshape(3)], K, ext, D)
+        rectified = cv.undistortPoints(pixel.reshape((1, 1, 2)), K, D, R=R, P=P).reshape(2)
+        shifts.append(np.array([size[0]/2, size[1]/2]) - rectified)
+    # the shift along the epipolar lines can differ, not across them
+    across = 0 if abs(P2[1, 3]) > abs(P2[0, 3]) else 1
+    common = (shifts[0][across] + shifts[1][across]) / 2
+    for P, shift in ((P1, shifts[0]), (P2, shifts[1])):
+        shift[across] = common
+        P[0, 2] += shift[0]
+        P[1, 2] += shift[1]
+    maps_x, maps_y = [], []
+    for K, D, R, P in ((intrinsics[0], dist_coeffs[0], R1, P1), (intrinsics[1], dist_coeffs[1], R2, P2)):
+        map_x, map_y = cv.initUndistortRectifyMap(K, D, R, P, size, cv.CV_32FC1)
+        maps_x.append(map_x)
+        maps_y.append(map_y)
+    return Rectification(images, (R1, R2), (P1, P2), maps_x, maps_y, size)
+
+def load_rectification(directory : str, images : list, intrinsics, dist_coeffs, extrinsics : list, width : int, height : int, center) -> Rectification:
+    """get the rectification of a pair of images, from the cache of the project if the calibration didn't change
+
+    Args:
+        directory (str): directory of the project
+        images (list): the 2 images
+        intrinsics (list): intrinsic matrix of each image
+        dist_coeffs (list): distortion coefficients of each image
+        extrinsics (list): extrinsic matrix of each image
+        width (int): width of the first image
+        height (int): height of the first image
+        center (np.ndarray): center of the sphere
+
+    Returns:
+        Rectification: rectification of the pair
+    """
+
+    path = get_pair_path(directory, images)
+    extrinsics = [np.asarray(matrix, dtype=np.float64) for matrix in extrinsics]
+    calibration = np.concatenate([np.asarray(matrix, dtype=np.float64).ravel() for matrix in intrinsics] + [np.asarray(coeffs, dtype=np.float64).ravel() for coeffs in dist_coeffs]
+                                 + [matrix.ravel() for matrix in extrinsics] + [np.asarray(center, dtype=np.float64).ravel()])
+    if os.path.exists(path):
+        try:
+            with np.load(path) as arrays:
+                if arrays["calibration"].shape == calibration.shape and np.allclose(arrays["calibration"], calibration):
+                    return Rectification(images, arrays["rotations"], arrays["projections"], arrays["maps_x"], arrays["maps_y"], tuple(arrays["size"]))
+        except (OSError, ValueError, KeyError):
+            print(f"Rectification cache ignored : {path}")
+
+    rectification = compute_rectification(images, intrinsics, dist_coeffs, extrinsics, width, height, center)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        project.atomic_savez(path, calibration=calibration, rotations=np.array(rectification.rotations), projections=np.array(rectification.projections),
+                             maps_x=np.array(rectification.maps_x), maps_y=np.array(rectification.maps_y), size=np.array(rectification.size))
+    except OSError:
+        print(f"Could not cache the rectification : {path}")
+    return rectification
+
+def rectify_tiles(rectification : Rectification, directory : str, progress=None, cancelled=None):
+    """Rectify the 2 images of a pair by tiles of rows, each tile is sent as soon as it is ready
+
+    Args:
+        rectification (Rectification): rectification of the pair
+        directory (str): directory of the images
+        progress (function, optional): gets (index of the image, first row, RGB tile) of each tile
+        cancelled (function, optional): returns True if the rectification is not needed anymore
+    """
+
+    for index, image in enumerate(rectification.images):
+        img = cv.imread(f"{directory}/{image}", cv.IMREAD_COLOR)
+        if img is None:
+            continue
+        img = cv.cvtColor(img, cv.COLOR_BGR2RGB)
+        for top in range(0, rectification.size[1], TILE_HEIGHT):
+            if cancelled is not None and cancelled():
+                return
+            bottom = min(top + TILE_HEIGHT, rectification.size[1])
+            tile = cv.remap(img, rectification.maps_x[index][top:bottom], rectification.maps_y[index][top:bottom], cv.INTER_LINEAR)
+            if progress is not None:
+                progress((index, top, np.ascontiguousarray(tile)))
@@ -0,0 +1,178 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import cv2 as cv
+import numpy as np
+
+# refinement of a click
+NONE = "None"
+CORNER = "Corner"
+CENTROID = "Blob centroid"
+SADDLE = "Saddle point"
+METHODS = [NONE, CORNER, CENTROID, SADDLE]
+
+# half size of the window around the click (in pixel of the full image)
+RADIUS = 12
+
+def get_window(gray : np.ndarray, x : float, y : float, radius : int = RADIUS):
+    """get the window around a pixel
+
+    Args:
+        gray (np.ndarray): grayscale image
+        x (float): x of the pixel
+        y (float): y of the pixel
+        radius (int, optional): half size of the window. Defaults to RADIUS.
+
+    Returns:
+        tuple(np.ndarray, int, int): window (float32) and position of its top left corner in the image
+    """
+
+    left = int(np.clip(round(x) - radius, 0, max(gray.shape[1] - 2*radius - 1, 0)))
+    top = int(np.clip(round(y) - radius, 0, max(gray.shape[0] - 2*radius - 1, 0)))
+    return gray[top:top + 2*radius + 1, left:left + 2*radius + 1].astype(np.float32), left, top
+
+def refine_corner(gray : np.ndarray, x : float, y : float, radius : int = RADIUS):
+    """Refine a click on a corner (cornerSubPix of OpenCV)
+    The quality is the ratio of the eigenvalues of the structure tensor of the window, 1 for a sharp corner, 0 for an edge
+
+    Returns:
+        tuple(float, float, float): x, y and quality
+    """
+
+    window, left, top = get_window(gray, x, y, radius)
+    point = np.array([[[x - left, y - top]]], dtype=np.float32)
+    half = max(radius // 2, 2)
+    cv.cornerSubPix(window, point, (half, half), (-1, -1), (cv.TERM_CRITERIA_EPS | cv.TERM_CRITERIA_COUNT, 40, 0.001))
+    gx = cv.Sobel(window, cv.CV_32F, 1, 0)
+    gy = cv.Sobel(window, cv.CV_32F, 0, 1)
+    eigenvalues = np.linalg.eigvalsh(np.array([[np.sum(gx*gx), np.sum(gx*gy)], [np.sum(gx*gy), np.sum(gy*gy)]]))
+    quality = float(eigenvalues[0] / eigenvalues[1]) if eigenvalues[1] > 0 else 0.0
+    return float(point[0, 0, 0] + left), float(point[0, 0, 1] + top), quality
+
+def refine_centroid(gray : np.ndarray, x : float, y : float, radius : int = RADIUS):
+    """Refine a click on a blob to the centroid of the blob, weighted by its contrast
+    The blob is the connected region of the window on the side of the Otsu threshold of the clicked pixel
+    The quality is the contrast between the blob and the rest of the window (between 0 and 1)
+
+    Returns:
+        tuple(float, float, float): x, y and quality
+    """
+
+    window, left, top = get_window(gray, x, y, radius)
+    window_8 = np.clip(window, 0, 255).astype(np.uint8)
+    threshold, binary = cv.threshold(window_8, 0, 255, cv.THRESH_BINARY + cv.THRESH_OTSU)
+    click_x, click_y = int(np.clip(round(x) - left, 0, window.shape[1] - 1)), int(np.clip(round(y) - top, 0, window.shape[0] - 1))
+    if binary[click_y, click_x] == 0:
+        # dark blob
+        binary = 255 - binary
+    _, labels = cv.connectedComponents(binary)
+    blob = labels == labels[click_y, click_x]
+    if blob.all():
+        return x, y, 0.0
+    weights = np.abs(window - threshold) * blob
+    ys, xs = np.mgrid[0:window.shape[0], 0:window.shape[1]]
+    total = weights.sum()
+    if total == 0:
+        return x, y, 0.0
+    quality = float(abs(window[blob].mean() - window[~blob].mean()) / 255)
+    return float((xs * weights).sum() / total + left), float((ys * weights).sum() / total + top), quality
+
+def refine_saddle(gray : np.ndarray, x : float, y : float, radius : int = RADIUS):
+    """Refine a click on a saddle point (crossing of a checkerboard, X junction...)
+    A quadratic surface is fitted on the smoothed window, the saddle point is where its gradient is null
+    The quality is the ratio of the absolute curvatures, 1 for a symmetric saddle, 0 if it isn't a saddle
+
+    Returns:
+        tuple(float, float, float): x, y and quality
+    """
+
+    for _ in range(2):
+        # the window is centered again on the saddle point found
+        window, left, top = get_window(gray, x, y, radius)
+        window = cv.GaussianBlur(window, (0, 0), radius / 4)
+        ys, xs = np.mgrid[0:window.shape[0], 0:window.shape[1]].astype(np.float64)
+        xs, ys = xs.ravel() - radius, ys.ravel() - radius
+        A = np.stack([xs*xs, xs*ys, ys*ys, xs, ys, np.ones_like(xs)], axis=1)
+        a, b, c, d, e, _ = np.linalg.lstsq(A, window.ravel().astype(np.float64), rcond=None)[0]
+        hessian = np.array([[2*a, b], [b, 2*c]])
+        eigenvalues = np.linalg.eigvalsh(hessian)
+        if eigenvalues[0] * eigenvalues[1] >= 0:
+            # not a saddle point
+            return x, y, 0.0
+        offset = np.linalg.solve(hessian, [-d, -e])
+        if np.any(np.abs(offset) > radius):
+            return x, y, 0.0
+        x, y = float(left + radius + offset[0]), float(top + radius + offset[1])
+    quality = float(np.min(np.abs(eigenvalues)) / np.max(np.abs(eigenvalues)))
+    return x, y, quality
+
+def refine(gray : np.ndarray, x : float, y : float, method : str = NONE, radius : int = RADIUS):
+    """Refine a click to sub-pixel precision
+
+    Args:
+        gray (np.ndarray): grayscale full image
+        x (float): x of the click on the full image
+        y (float): y of the click on the full image
+        method (str, optional): one of METHODS. Defaults to NONE.
+        radius (int, optional): half size of the window. Defaults to RADIUS.
+
+    Returns:
+        tuple(float, float, float): x, y and quality (between 0 and 1), the quality is None if not refined
+    """
+
+    match method:
+        case "Corner":
+            return refine_corner(gray, x, y, radius)
+        case "Blob centroid":
+            return refine_centroid(gray, x, y, radius)
+        case "Saddle point":
+            return refine_saddle(gray, x, y, radius)
+    return x, y, None
+
+def refine_file(path : str, x : float, y : float, method : str, radius : int = RADIUS):
+    """Refine a pose on an image that isn't decoded yet (see refine)
+
+    Args:
+        path (str): path of the full image
+        x (float): x of the pose on the full image
+        y (float): y of the pose on the full image
+        method (str): one of METHODS
+        radius (int, optional): half size of the window. Defaults to RADIUS.
+
+    Returns:
+        tuple(float, float, float): x, y and quality (between 0 and 1), the quality is None if not refined
+    """
+
+    gray = cv.imread(path, cv.IMREAD_GRAYSCALE)
+    if gray is None:
+        return x, y, None
+    return refine(gray, x, y, method, radius)
@@ -0,0 +1,173 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+import numpy as np
+
+# scAnt names the images by the positions of its stepper motors, _x_<pitch>_y_<yaw>_step_<focus>_
+FILE_PATTERN = re.compile(r"_x_(?P<x>-?\d+)_y_(?P<y>-?\d+)_step_(?P<step>-?\d+)_")
+
+def parse_name(name : str):
+    """get the positions of the stepper motors from the name of an image
+
+    Args:
+        name (str): name of the image
+
+    Returns:
+        tuple(int, int, int): x, y and step, None if the name doesn't come from scAnt
+    """
+
+    match = FILE_PATTERN.search(name)
+    if match is None:
+        return None
+    return int(match["x"]), int(match["y"]), int(match["step"])
+
+class GridIndex():
+    """Images of a scAnt acquisition on the grid of positions of the rig (pitch rows x yaw columns)
+    The yaw axis is assumed to turn around the specimen, the axes and their directions are checked against the calibration (see reconcile)
+    """
+
+    def __init__(self, names : list, positions : list) -> None:
+        """
+        Args:
+            names (list): images
+            positions (list): (x, y) stepper positions of each image
+        """
+
+        self.names = list(names)
+        positions = np.array(positions, dtype=np.int64).reshape((-1, 2))
+        # scAnt tilts with the x axis and turns with the y axis
+        self.pitch_axis, self.yaw_axis = 0, 1
+        self.values = [np.unique(positions[:, axis]) for axis in range(2)]
+        # index of each image on each axis
+        self.cells = np.stack([np.searchsorted(self.values[axis], positions[:, axis]) for axis in range(2)], axis=1)
+        self.grid = np.full((len(self.values[0]), len(self.values[1])), -1, dtype=np.int64)
+        # several images at one position (other focus steps) : the first one is kept
+        for index in range(len(self.names) - 1, -1, -1):
+            self.grid[tuple(self.cells[index])] = index
+        self.rows = {name: index for index, name in enumerate(self.names)}
+        # +1 if the latitude (longitude) increases with the index of the pitch (yaw) axis
+        self.pitch_sign, self.yaw_sign = 1, 1
+        self.wraps = True
+
+    @classmethod
+    def from_names(cls, names : list):
+        """Index the images named by scAnt
+
+        Args:
+            names (list): images
+
+        Returns:
+            GridIndex: index, None if some images weren't named by scAnt
+        """
+
+        parsed = [parse_name(name) for name in names]
+        if len(names) == 0 or any(values is None for values in parsed):
+            return None
+        return cls(names, [values[0:2] for values in parsed])
+
+    def reconcile(self, longitudes, latitudes):
+        """Use the calibration to find the pitch and yaw axes, their directions and whether the yaw goes all around
+
+        Args:
+            longitudes (np.ndarray): (N,) longitude of each image (in radian), in the order of the names
+            latitudes (np.ndarray): (N,) latitude of each image (in radian)
+        """
+
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        # the latitude follows the pitch axis, not the yaw axis
+        spreads = []
+        for axis in range(2):
+            means = np.array([latitudes[self.cells[:, axis] == index].mean() for index in range(len(self.values[axis]))])
+            spreads.append(np.ptp(means) if len(means) > 1 else 0.0)
+        self.pitch_axis = int(np.argmax(spreads))
+        self.yaw_axis = 1 - self.pitch_axis
+        pitch = self.cells[:, self.pitch_axis]
+        if np.ptp(pitch) > 0:
+            self.pitch_sign = 1 if np.corrcoef(pitch, latitudes)[0, 1] >= 0 else -1
+
+        # longitude turned by one yaw position, between images of the same pitch
+        steps = []
+        grid = self.get_grid()
+        for row in range(grid.shape[0]):
+            indices = grid[row][grid[row] >= 0]
+            if len(indices) > 1:
+                differences = np.diff(longitudes[indices])
+                steps.extend(np.arctan2(np.sin(differences), np.cos(differences)).tolist())
+        if len(steps) != 0:
+            step = float(np.median(steps))
+            self.yaw_sign = 1 if step >= 0 else -1
+            # the yaw positions go all around the specimen
+            self.wraps = abs(step) * len(self.values[self.yaw_axis]) >= 2 * np.pi - 1.5 * abs(step)
+
+    def get_grid(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: (pitch positions, yaw positions) index of the image at each position of the rig, -1 if there is none
+        """
+
+        return self.grid if self.pitch_axis == 0 else self.grid.T
+
+    def get_cell(self, name : str) -> tuple:
+        """
+        Returns:
+            tuple(int, int): pitch and yaw indices of an image, None if it isn't indexed
+        """
+
+        if name not in self.rows:
+            return None
+        cell = self.cells[self.rows[name]]
+        return int(cell[self.pitch_axis]), int(cell[self.yaw_axis])
+
+    def get_neighbour(self, name : str, d_long : int, d_lat : int) -> str:
+        """get the image one (or several) rig positions away
+
+        Args:
+            name (str): image
+            d_long (int): yaw positions to move, in the direction of the longitude
+            d_lat (int): pitch positions to move, in the direction of the latitude
+
+        Returns:
+            str: image, None if there is no image there
+        """
+
+        cell = self.get_cell(name)
+        if cell is None:
+            return None
+        grid = self.get_grid()
+        row = cell[0] + d_lat * self.pitch_sign
+        column = cell[1] + d_long * self.yaw_sign
+        if self.wraps:
+            column %= grid.shape[1]
+        if not (0 <= row < grid.shape[0] and 0 <= column < grid.shape[1]) or grid[row, column] < 0:
+            return None
+        return self.names[grid[row, column]]
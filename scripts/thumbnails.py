@@ -0,0 +1,89 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import os
+
+# PIL is imported when a thumbnail is needed, it is not loaded at the start of the application
+
+DEFAULT_THUMBNAIL_SIZE = 1000
+
+def get_thumbnail_path(directory, thumbnails, image):
+    """get the path of the thumbnail of an image
+
+    Args:
+        directory (str): data folder of the project
+        thumbnails (str): name of the thumbnails folder
+        image (str): file name of the image
+
+    Returns:
+        str: path of the thumbnail
+    """
+
+    return f'{directory}/{thumbnails}/{image}'
+
+def get_thumbnail_size(path):
+    """get the dimensions of an existing thumbnail
+
+    Args:
+        path (str): path of the thumbnail
+
+    Returns:
+        tuple(int, int): width and height of the thumbnail
+    """
+
+    from PIL import Image
+
+    with Image.open(path) as im:
+        return im.width, im.height
+
+def make_thumbnail(directory, thumbnails, image, size):
+    """Creates the thumbnail of an image of the data folder
+
+    Args:
+        directory (str): data folder of the project
+        thumbnails (str): name of the thumbnails folder
+        image (str): file name of the image
+        size (tuple(int, int)): maximum width and height of the thumbnail
+
+    Returns:
+        str: file name of the image
+    """
+
+    from PIL import Image
+
+    if not os.path.exists(f'{directory}/{thumbnails}'):
+        os.makedirs(f'{directory}/{thumbnails}', exist_ok=True)
+    with Image.open(f'{directory}/{image}') as im_basic:
+        im_basic.thumbnail(size, Image.LANCZOS)
+        im_basic.save(get_thumbnail_path(directory, thumbnails, image))
+        print(f"Saved thumbnail : {image} : {im_basic.width}:{im_basic.height}")
+    return image
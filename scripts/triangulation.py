@@ -0,0 +1,98 @@
+# Sphaeroptica - 3D Viewer on calibrated
+
+# Copyright (C) 2023 Yann Pollet, Royal Belgian Institute of Natural Sciences
+
+#
+
+# This program is free software: you can redistribute it and/or
+
+# modify it under the terms of the GNU General Public License as
+
+# published by the Free Software Foundation, either version 3 of the
+
+# License, or (at your option) any later version.
+
+# 
+
+# This program is distributed in the hope that it will be useful, but
+
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+
+# General Public License for more details.
+
+#
+
+# You should have received a copy of the GNU General Public License
+
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+
+import numpy as np
+
+from scripts import helpers, reconstruction
+
+def make_snapshot(cameras, poses_by_landmark : dict) -> dict:
+    """Copy what is needed to triangulate landmarks, the snapshot can be used in another thread
+
+    Args:
+        cameras (project.CameraSet): cameras of the project
+        poses_by_landmark (dict): id -> (image -> helpers.Pose)
+
+    Returns:
+        dict: images used with their intrinsics, distortion coefficients and extrinsics, and poses of each landmark
+    """
+
+    landmarks = {id: tuple((image, (pose.x, pose.y)) for image, pose in poses.items() if pose is not None)
+                 for id, poses in poses_by_landmark.items()}
+    images = sorted({image for poses in landmarks.values() for image, _ in poses})
+    intrinsics, distortion = cameras.gather(images)
+    return {"images": images,
+            "intrinsics": intrinsics,
+            "distortion": distortion,
+            "extrinsics": cameras.extrinsics[cameras.get_rows(images), 0:3, 0:4] if len(images) != 0 else np.zeros((0, 3, 4)),
+            "landmarks": landmarks}
+
+def triangulate_snapshot(snapshot : dict) -> dict:
+    """Triangulate the landmarks of a snapshot (see make_snapshot)
+    The poses of all the landmarks are undistorted and reprojected at once, each with the camera model of its image
+
+    Args:
+        snapshot (dict): snapshot
+
+    Returns:
+        dict: id -> (position, reprojection errors), position is None if the landmark can't be triangulated
+    """
+
+    results = {id: (None, []) for id in snapshot["landmarks"]}
+    # We need at least 2 landmarks to triangulate
+    landmarks = [(id, poses) for id, poses in snapshot["landmarks"].items() if len(poses) >= 2]
+    if len(landmarks) == 0:
+        return results
+    views = {image: i for i, image in enumerate(snapshot["images"])}
+    observations = np.array([views[image] for _, poses in landmarks for image, _ in poses])
+    points = np.array([pose for _, poses in landmarks for _, pose in poses], dtype=np.float64)
+    intrinsics = snapshot["intrinsics"][observations]
+    distortion = snapshot["distortion"][observations]
+    extrinsics = snapshot["extrinsics"][observations]
+
+    #  For each landmark, we need to compute the undistorted position on the image
+    undistorted = reconstruction.undistort_observations(points, intrinsics, distortion)
+    proj_mats = intrinsics @ extrinsics
+    positions = []
+    start = 0
+    for id, poses in landmarks:
+        proj_points = [helpers.ProjPoint(np.asmatrix(proj_mats[i]), undistorted[i].reshape((2,1))) for i in range(start, start + len(poses))]
+        # Triangulation computation with all the undistorted landmarks
+        positions.append(reconstruction.triangulate_point(proj_points))
+        start += len(poses)
+
+    # reprojection error of each pose
+    lengths = [len(poses) for _, poses in landmarks]
+    positions3D = np.repeat(np.array(positions)[:, 0:3], lengths, axis=0)
+    errors = np.linalg.norm(points - reconstruction.project_observations(positions3D, intrinsics, extrinsics, distortion), axis=1)
+    for (id, _), position, landmark_errors in zip(landmarks, positions, np.split(errors, np.cumsum(lengths)[:-1])):
+        results[id] = (tuple(position), landmark_errors.tolist())
+    return results